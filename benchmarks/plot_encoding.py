@@ -0,0 +1,64 @@
+"""Measures the size and render time of each kind of plot for several encoding settings.
+
+The settings are combinations of image format, DPI and PNG compression level.
+
+Run from the repository root with `python -m benchmarks.plot_encoding`.
+"""
+
+import argparse
+import time
+
+from tle import constants
+from tle.util import graph_common as gc
+from tle.util import plot_worker
+
+from benchmarks.plot_specs import make_specs
+
+# (format, dpi, PNG compression level)
+_SETTINGS = [
+    ('png', 100, 6),
+    ('png', 100, 1),
+    ('png', 100, 9),
+    ('webp', 100, None),
+    ('png', 150, 6),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='number of times every kind of plot is rendered per setting, the '
+                             'fastest is reported')
+    args = parser.parse_args()
+    gc.apply_style()
+    specs = make_specs()
+    # Draw once beforehand, the first plots load fonts and such.
+    for _, spec in specs:
+        plot_worker.render(spec, 'png')
+
+    for image_format, dpi, compression in _SETTINGS:
+        constants.PLOT_FORMAT = image_format
+        if gc.image_format() != image_format:
+            print(f'{image_format}: not supported by Pillow or matplotlib here, skipped')
+            continue
+        constants.PLOT_DPI = dpi
+        constants.PLOT_PNG_COMPRESSION = compression
+        size_by_name = {}
+        time_by_name = {}
+        for _ in range(args.rounds):
+            for name, spec in specs:
+                begin = time.perf_counter()
+                size_by_name[name] = len(plot_worker.render(spec, image_format))
+                elapsed = time.perf_counter() - begin
+                time_by_name[name] = min(elapsed, time_by_name.get(name, elapsed))
+        setting = f'{image_format}, {dpi}dpi' + (f', level {compression}'
+                                                 if compression is not None else '')
+        print(f'{setting}: {sum(size_by_name.values()) / 1024:.0f}KiB, '
+              f'{sum(time_by_name.values()):.2f}s for {len(specs)} plots')
+        for name in size_by_name:
+            print(f'    {name:<12}{size_by_name[name] / 1024:5.0f}KiB '
+                  f'{time_by_name[name] * 1000:6.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Measures the throughput of rendering plots in the worker processes.
+
+Renders every kind of plot a number of times, all at once, once through the render workers and
+once on the event loop one after another, which is how plots were drawn before. How long the
+event loop was blocked is measured too, the workers keep it free even when there are fewer CPUs
+than workers.
+
+Run from the repository root with `python -m benchmarks.plot_render`.
+"""
+
+import argparse
+import asyncio
+import time
+
+from tle.util import graph_common as gc
+from tle.util import plot_worker
+
+from benchmarks.plot_specs import make_specs
+
+# Interval at which the event loop is checked for being blocked, in seconds.
+_TICK = 0.01
+
+
+async def render_all(specs):
+    return await asyncio.gather(*(gc.render(spec) for spec in specs))
+
+
+async def render_in_loop(specs):
+    for spec in specs:
+        plot_worker.render(spec, 'png')
+        await asyncio.sleep(0)
+
+
+async def measure(coro):
+    """Runs coro and returns the time it took and the longest the event loop was blocked
+    meanwhile, in seconds."""
+    longest_stall = 0
+    done = False
+
+    async def tick():
+        nonlocal longest_stall
+        while not done:
+            begin = time.perf_counter()
+            await asyncio.sleep(_TICK)
+            longest_stall = max(longest_stall, time.perf_counter() - begin - _TICK)
+
+    ticker = asyncio.create_task(tick())
+    begin = time.perf_counter()
+    await coro
+    elapsed = time.perf_counter() - begin
+    done = True
+    await ticker
+    return elapsed, longest_stall
+
+
+async def run(rounds):
+    specs = [spec for _, spec in make_specs()]
+    begin = time.perf_counter()
+    await render_all(specs)
+    # The workers also import this script, so this is not the start up time of workers of the
+    # bot.
+    print(f'warm-up with {len(specs)} plots: {time.perf_counter() - begin:.2f}s')
+
+    specs = specs * rounds
+    for name, coro in ((f'in {gc.constants.PLOT_WORKERS} workers', render_all(specs)),
+                       ('on the event loop', render_in_loop(specs))):
+        elapsed, longest_stall = await measure(coro)
+        print(f'{len(specs)} plots {name}: {elapsed:.2f}s, {len(specs) / elapsed:.1f} plots/s, '
+              f'event loop blocked for up to {longest_stall * 1000:.0f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=4,
+                        help='number of times every kind of plot is rendered')
+    args = parser.parse_args()
+    gc.apply_style()
+    asyncio.run(run(args.rounds))
+
+
+if __name__ == '__main__':
+    main()
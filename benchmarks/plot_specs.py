@@ -0,0 +1,82 @@
+"""Plot specs like the ones the plot commands build, for the plot benchmarks."""
+
+import datetime as dt
+
+import pandas as pd
+from matplotlib import rcParams
+
+from tle.util import codeforces_api as cf
+from tle.util import graph_common as gc
+
+
+def make_specs():
+    """Returns (name, spec) pairs of one spec for each kind of plot."""
+    times = [dt.datetime(2020, 1, 1) + dt.timedelta(days=30 * i) for i in range(20)]
+    specs = []
+
+    spec = gc.PlotSpec()
+    spec.set_prop_cycle(gc.rating_color_cycler)
+    spec.plot(times, [1200 + 30 * i for i in range(20)], linestyle='-', marker='o',
+              markersize=3, markerfacecolor='white', markeredgewidth=0.5)
+    spec.rating_bg(cf.RATED_RANKS)
+    spec.autofmt_xdate()
+    spec.legend([gc.StrWrap('_handle (1770)')], loc='upper left')
+    spec.set_ylim(1000, 2000)
+    specs.append(('rating', spec))
+
+    spec = gc.PlotSpec()
+    spec.set_xlabel('Time')
+    spec.hist([[], times], stacked=True, label=['contest', 'practice'], bins=10)
+    spec.legend(title='handle: 20', title_fontsize=rcParams['legend.fontsize'])
+    spec.date_xaxis()
+    spec.autofmt_xdate()
+    specs.append(('hist', spec))
+
+    spec = gc.PlotSpec()
+    spec.plot([800, 900, 1500, 2400], [5, 8, 20, 50])
+    spec.scatter([800, 900], [3, 4], s=3)
+    spec.set_ylim(0, 55)
+    spec.round_xticks(100)
+    specs.append(('speed', spec))
+
+    spec = gc.PlotSpec(figsize=(15, 5), axes_rc={'xtick.bottom': True})
+    spec.seaborn('barplot', x=['India', 'China', 'Russia'], y=[10, 5, 3])
+    spec.label_bars(horizontalalignment='center', color='#30304f', fontsize='x-small')
+    spec.rotate_xticklabels(40, ha='right')
+    spec.spine_colored_xticks(length=4)
+    specs.append(('country', spec))
+
+    data = pd.DataFrame([['India', 1500], ['India', 1900], ['China', 2100]],
+                        columns=['Country', 'Rating'])
+    spec = gc.PlotSpec()
+    spec.seaborn('swarmplot', x='Country', y='Rating', hue='Rating', data=data,
+                 order=['India', 'China'],
+                 palette={1500: '#00ff00', 1900: '#aa00aa', 2100: '#ffaa00'})
+    spec.remove_legend()
+    specs.append(('swarm', spec))
+
+    spec = gc.PlotSpec(figsize=(12, 8))
+    spec.set_title('Round')
+    spec.scatter([1, 2, 3], [10, -5, 3], s=20, c=['red', 'blue', 'green'])
+    spec.annotate('handle', xy=(2, -5), xytext=(0, 0), textcoords='offset points')
+    spec.plot(2, -5, marker='o', markersize=5, color='black')
+    specs.append(('visualrank', spec))
+
+    spec = gc.PlotSpec()
+    spec.scatter(times[:3], [1200, 1300, 1400], zorder=10, s=14, marker='o', color='tab:blue',
+                 label='Easiest unsolved')
+    spec.vlines(times[:3], [1200, 1300, 1400], [1500, 1600, 1700], color='#00000022')
+    spec.legend(title='handle: 1500', loc='upper left')
+    spec.set_legend_zorder(20)
+    spec.rating_bg(cf.RATED_RANKS)
+    spec.autofmt_xdate()
+    spec.clamp_ylim(1100, 1650)
+    specs.append(('extreme', spec))
+
+    spec = gc.PlotSpec(figsize=(15, 5))
+    spec.tick_params(axis='x', labelrotation=45)
+    spec.bar([0, 100], [3, 4], 90, color=['#808080', '#008000'], linewidth=0,
+             tick_label=['0', '100'])
+    spec.margins(x=0)
+    specs.append(('distrib', spec))
+    return specs
@@ -0,0 +1,78 @@
+"""Compares the ProblemIndex query of gimme with the scan over all problems it replaced.
+
+Run from the repository root with `python -m benchmarks.problem_index`.
+"""
+
+import argparse
+import random
+import timeit
+
+# Imported first, as the bot does, since the cache modules import each other.
+from tle.util import codeforces_common
+from tle.util import codeforces_api as cf
+from tle.util.problem_index import ProblemIndex
+
+_TAGS = ['implementation', 'math', 'greedy', 'dp', 'data structures', 'brute force',
+         'constructive algorithms', 'graphs', 'sortings', 'binary search', 'dfs and similar',
+         'trees', 'strings', 'number theory', 'combinatorics', '*special']
+
+
+def make_problems(num_problems, num_contests, rng):
+    contests = {contest_id: cf.Contest(contest_id, f'Round {contest_id}', 1000 * contest_id, 7200,
+                                       'CF', 'FINISHED', None)
+                for contest_id in range(1, num_contests + 1)}
+    problems = []
+    for i in range(num_problems):
+        contest_id = rng.randrange(1, num_contests + 1)
+        tags = rng.sample(_TAGS, rng.randrange(1, 4))
+        problems.append(cf.Problem(contest_id, None, chr(ord('A') + i % 7), f'Problem {i}',
+                                   'PROGRAMMING', None, rng.randrange(8, 36) * 100, tags))
+    return problems, contests
+
+
+def scan(problems, contests, rating, solved, tags):
+    """The scan gimme did before the index."""
+    found = [prob for prob in problems if prob.rating == rating and prob.name not in solved]
+    if tags:
+        found = [prob for prob in found if prob.tag_matches(tags)]
+    found.sort(key=lambda problem: contests[problem.contestId].startTimeSeconds)
+    return found
+
+
+def query(index, rating, solved_mask, tags):
+    """The query gimme does with the index."""
+    mask = index.rating_mask(rating) & ~solved_mask
+    if tags:
+        mask &= index.tags_mask(tags)
+    return index.problems_in(mask)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--problems', type=int, default=9000)
+    parser.add_argument('--contests', type=int, default=1500)
+    parser.add_argument('--solved', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    problems, contests = make_problems(args.problems, args.contests, rng)
+    ordinal_by_name = {problem.name: i for i, problem in enumerate(problems)}
+    index = ProblemIndex(problems, contests, ordinal_by_name)
+    solved = {problem.name for problem in rng.sample(problems, args.solved)}
+    # The bot keeps the solved mask of a handle with its submissions, so it is built once.
+    solved_mask = index.names_mask(solved)
+
+    for rating, tags in ((1500, []), (1500, ['dp']), (2000, ['graphs', 'trees'])):
+        expected = scan(problems, contests, rating, solved, tags)
+        assert query(index, rating, solved_mask, tags) == expected
+        scan_time = timeit.timeit(lambda: scan(problems, contests, rating, solved, tags),
+                                  number=args.repeat) / args.repeat
+        query_time = timeit.timeit(lambda: query(index, rating, solved_mask, tags),
+                                   number=args.repeat) / args.repeat
+        print(f'rating {rating}, tags {tags}: {len(expected)} problems, '
+              f'scan {scan_time * 1e6:.0f}us, index {query_time * 1e6:.0f}us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Measures the memory a Ranklist retains, next to the parsed standings rows it is built from.
+
+The rows are what Ranklist kept before it stored the standings column-wise. Run from the
+repository root with `python -m benchmarks.ranklist_memory`.
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+# Imported first, as the bot does, since the cache modules import each other.
+from tle.util import codeforces_common
+from tle.util import codeforces_api as cf
+from tle.util.ranklist import Ranklist
+
+
+def make_standings(num_rows, num_problems, rng):
+    rows = []
+    for i in range(num_rows):
+        # Fresh strings, like the ones parsed from a response.
+        party = cf.Party(contestId=1, members=[cf.Member(''.join(['user', str(i)]))],
+                         participantType='CONTESTANT', teamId=None, teamName=None, ghost=False,
+                         room=rng.randrange(1, 200), startTimeSeconds=1000)
+        results = []
+        for _ in range(num_problems):
+            solved = rng.random() < 0.4
+            results.append(cf.ProblemResult(
+                points=float(rng.randrange(1, 7) * 250) if solved else 0.0,
+                penalty=None, rejectedAttemptCount=rng.randrange(3),
+                type='FINAL', bestSubmissionTimeSeconds=rng.randrange(7200) if solved else None))
+        points = sum(result.points for result in results)
+        rows.append(cf.RanklistRow(party=party, rank=i + 1, points=points,
+                                   penalty=rng.randrange(500), problemResults=results))
+    return rows
+
+
+def traced_size():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=30000)
+    parser.add_argument('--problems', type=int, default=7)
+    args = parser.parse_args()
+
+    contest = cf.Contest(1, 'Round 1', 0, 7200, 'CF', 'FINISHED', None)
+    problems = [cf.Problem(1, None, chr(ord('A') + j), f'Problem {j}', 'PROGRAMMING', None,
+                           None, []) for j in range(args.problems)]
+    tracemalloc.start()
+    base = traced_size()
+    standings = make_standings(args.rows, args.problems, random.Random(0))
+    rows_size = traced_size() - base
+
+    ranklist = Ranklist(contest, problems, standings, time.time(), is_rated=False)
+    del standings
+    ranklist_size = traced_size() - base
+    tracemalloc.stop()
+
+    # Timed apart, tracing slows it down.
+    standings = make_standings(args.rows, args.problems, random.Random(0))
+    begin = time.perf_counter()
+    ranklist = Ranklist(contest, problems, standings, time.time(), is_rated=False)
+    build_time = time.perf_counter() - begin
+
+    handles = [f'user{i}' for i in range(0, args.rows, max(1, args.rows // 1000))]
+    begin = time.perf_counter()
+    for handle in handles:
+        ranklist.get_standing_row(handle)
+    lookup_time = (time.perf_counter() - begin) / len(handles)
+
+    print(f'{args.rows} rows of {args.problems} problems')
+    print(f'standings rows: {rows_size / 2**20:.1f}MB')
+    print(f'Ranklist:       {ranklist_size / 2**20:.1f}MB, built in {build_time:.2f}s, '
+          f'{lookup_time * 1e6:.0f}us per get_standing_row')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Compares predicting the deltas of a group virtual contest with predicting a live contest.
+
+A virtual contest is predicted by building the calculator for the contestants once and working
+out each virtual participant's delta from it, a live contest by building the calculator once.
+Run from the repository root with `python -m benchmarks.virtual_prediction`.
+"""
+
+import argparse
+import random
+import time
+
+from tle.util.ranklist.rating_calculator import CodeforcesRatingCalculator
+
+
+def make_standings(num_rows, rng):
+    rows = []
+    for i in range(num_rows):
+        solved = min(7, max(0, int(rng.gauss(2.5, 1.6))))
+        penalty = rng.randrange(0, 600) if solved else 0
+        rating = max(1, min(3800, int(rng.gauss(1500, 450))))
+        rows.append((f'user{i}', float(solved), penalty, rating))
+    return rows
+
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - begin)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--contestants', type=int, default=25000)
+    parser.add_argument('--virtual', type=int, default=10,
+                        help='number of virtual participants')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    standings = make_standings(args.contestants, rng)
+    virtual = [(rng.randrange(len(standings) + 1), *row[1:])
+               for row in make_standings(args.virtual, rng)]
+
+    def predict_virtual():
+        calculator = CodeforcesRatingCalculator(standings)
+        return [calculator.delta_with_contestant(*participant) for participant in virtual]
+
+    def predict_each_in_full():
+        return [CodeforcesRatingCalculator(
+                    standings[:index] + [('virtual', points, penalty, rating)] +
+                    standings[index:]).calculate_rating_changes()['virtual']
+                for index, points, penalty, rating in virtual]
+
+    assert predict_virtual() == predict_each_in_full()
+    predict_time = best_of(args.repeat, lambda: CodeforcesRatingCalculator(standings))
+    virtual_time = best_of(args.repeat, predict_virtual)
+    full_time = best_of(1, predict_each_in_full)
+    print(f'{args.contestants} contestants, {args.virtual} virtual participants')
+    print(f'one prediction:                         {predict_time * 1000:.0f}ms')
+    print(f'virtual contest:                        {virtual_time * 1000:.0f}ms')
+    print(f'virtual contest, full calculation each: {full_time * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import json
+import os
+
+import pytest
+
+from tle.util.ranklist.rating_calculator import CodeforcesRatingCalculator
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture
+def standings():
+    """Standings of a contest with ties, and the deltas the calculator gave for them when it
+    processed one contestant at a time."""
+    with open(os.path.join(FIXTURES_DIR, 'standings.json')) as f:
+        data = json.load(f)
+    return [tuple(row) for row in data['standings']], data['deltas']
+
+
+def test_deltas_match_stored(standings):
+    rows, expected = standings
+    deltas = CodeforcesRatingCalculator(rows).calculate_rating_changes()
+    assert deltas == expected
+    assert all(type(delta) is int for delta in deltas.values())
+
+
+def test_empty_standings():
+    assert CodeforcesRatingCalculator([]).calculate_rating_changes() == {}
+
+
+@pytest.mark.parametrize('index', [0, 57, 401])
+def test_delta_with_contestant_matches_full_standings(standings, index):
+    rows, _ = standings
+    others = rows[:index] + rows[index + 1:]
+    party, points, penalty, rating = rows[index]
+    delta = CodeforcesRatingCalculator(others).delta_with_contestant(index, points, penalty,
+                                                                     rating)
+    assert delta == CodeforcesRatingCalculator(rows).calculate_rating_changes()[party]
+    assert type(delta) is int
+
+
+def test_delta_with_contestant_alone():
+    calc = CodeforcesRatingCalculator([])
+    assert calc.delta_with_contestant(0, 1.0, 10, 1500) == \
+        CodeforcesRatingCalculator([('a', 1.0, 10, 1500)]).calculate_rating_changes()['a']
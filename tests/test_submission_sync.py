@@ -0,0 +1,73 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('firebase_admin')
+
+from tle.util import codeforces_common  # noqa: F401, the cache modules import each other.
+from tle.util import codeforces_api as cf
+from tle.util.cache_system2 import SubmissionCache
+from tle.util.db.submission_db_conn import SubmissionDbConn
+
+
+def make_submission(id_, verdict, creation_time, index='A'):
+    problem = cf.Problem(1500, None, index, f'Problem {index}', 'PROGRAMMING', None, None, [])
+    author = cf.Party(1500, [cf.Member('tourist')], 'CONTESTANT', None, None, False, None,
+                      creation_time)
+    return cf.Submission(id_, 1500, problem, author, 'C++17', verdict, creation_time, 60)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    conn = SubmissionDbConn(str(tmp_path / 'submissions.db'))
+    cache_master = SimpleNamespace(submission_conn=conn,
+                                   problem_cache=SimpleNamespace(
+                                       ordinal_by_name={'Problem A': 0, 'Problem B': 1}))
+    yield SubmissionCache(cache_master)
+    conn.close()
+
+
+def test_recent_verdict_is_refetched(cache, monkeypatch):
+    now = int(time.time())
+    old = make_submission(1, 'OK', now - 30 * 24 * 60 * 60)
+    status = [make_submission(3, 'OK', now - 30 * 60), make_submission(2, 'OK', now - 60 * 60),
+              old]
+
+    async def user_status(*, handle, from_=None, count=None):
+        start = 0 if from_ is None else from_ - 1
+        return status[start:] if count is None else status[start:start + count]
+    monkeypatch.setattr(cf.user, 'status', user_status)
+    monkeypatch.setattr(cache, '_SYNC_BATCH_SIZE', 1)
+
+    conn = cache.cache_master.submission_conn
+    asyncio.run(cache._sync('tourist'))
+    assert [sub.verdict for sub in conn.fetch_submissions('tourist')] == ['OK', 'OK', 'OK']
+
+    # Hacked after the contest.
+    status[1] = status[1]._replace(verdict='CHALLENGED')
+    asyncio.run(cache._sync('tourist'))
+    assert [sub.verdict for sub in conn.fetch_submissions('tourist')] == ['OK', 'CHALLENGED', 'OK']
+
+
+def test_masks_follow_verdict_changes(cache, monkeypatch):
+    now = int(time.time())
+    status = [make_submission(1, 'OK', now - 60 * 60, 'A')]
+
+    async def user_status(*, handle, from_=None, count=None):
+        return status
+    monkeypatch.setattr(cf.user, 'status', user_status)
+
+    masks = asyncio.run(cache.get_problem_masks('tourist'))
+    assert (masks.solved, masks.tried) == (0b01, 0b01)
+
+    # Nothing saved changed, the new submission is added to the cached masks.
+    status.insert(0, make_submission(2, 'OK', now - 30 * 60, 'B'))
+    asyncio.run(cache._sync('tourist'))
+    assert cache.masks_by_handle['tourist'][1].solved == 0b11
+
+    # Hacked after the contest, the masks are built again.
+    status[1] = status[1]._replace(verdict='CHALLENGED')
+    masks = asyncio.run(cache.get_problem_masks('tourist'))
+    assert (masks.solved, masks.tried) == (0b10, 0b11)
@@ -13,27 +13,24 @@ from json import loads
 from os import environ
 import firebase_admin
 from firebase_admin import credentials
-from firebase_admin import storage
 from .keep_alive import keep_alive
 
 STORAGE_BUCKET = str(environ.get('STORAGE_BUCKET'))
-bucket = None
 
 if STORAGE_BUCKET!='None':
     cred = credentials.Certificate(loads(base64.b64decode(environ.get('FIREBASE_ADMIN_JSON')).decode('UTF-8')))
     firebase_admin.initialize_app(cred, {
         'storageBucket': STORAGE_BUCKET
     })
-    bucket = storage.bucket()
 
-import seaborn as sns
 from disnake.ext import commands
-from matplotlib import pyplot as plt
 
 from tle import constants
 from tle.util import codeforces_common as cf_common
 from tle.util import discord_common, font_downloader
+from tle.util import graph_common
 from tle.util import clist_api
+from tle.util.db import backup
 
 
 def setup():
@@ -41,22 +38,6 @@ def setup():
     for path in constants.ALL_DIRS:
         os.makedirs(path, exist_ok=True)
     
-    # Update the user.db file from firebase
-    if bucket!=None:
-        try:
-            user = bucket.blob('tle.db')
-            user.download_to_filename(constants.USER_DB_FILE_PATH)
-        except:
-            # File is not present in Firebase Storage
-            pass
-
-        try:
-            cache = bucket.blob('tle_cache.db')
-            cache.download_to_filename(constants.CACHE_DB_FILE_PATH)
-        except:
-            # File is not present in Firebase Storage
-            pass
-
     # logging to console and file on daily interval
     logging.basicConfig(format='{asctime}:{levelname}:{name}:{message}', style='{',
                         datefmt='%d-%m-%Y %H:%M:%S', level=logging.INFO,
@@ -64,15 +45,16 @@ def setup():
                                   TimedRotatingFileHandler(constants.LOG_FILE_PATH, when='D',
                                                            backupCount=3, utc=True)])
 
+    # Restore the databases from their backups
+    for db_file, blob_name in ((constants.USER_DB_FILE_PATH, 'tle.db'),
+                               (constants.CACHE_DB_FILE_PATH, 'tle_cache.db')):
+        try:
+            backup.restore(db_file, blob_name)
+        except Exception:
+            logging.exception(f'Could not restore {db_file} from backup')
+
     # matplotlib and seaborn
-    plt.rcParams['figure.figsize'] = 7.0, 3.5
-    sns.set()
-    options = {
-        'axes.edgecolor': '#A0A0C5',
-        'axes.spines.top': False,
-        'axes.spines.right': False,
-    }
-    sns.set_style('darkgrid', options)
+    graph_common.apply_style()
 
     # Download fonts if necessary
     font_downloader.maybe_download()
@@ -105,7 +87,7 @@ def main():
     # on_ready event handler rather than an on_ready listener.
     @discord_common.on_ready_event_once(bot)
     async def init():
-        clist_api.cache()
+        await clist_api.cache()
         await cf_common.initialize(args.nodb)
         asyncio.create_task(discord_common.presence(bot))
 
@@ -13,21 +13,17 @@ import math
 import disnake
 import numpy as np
 import pandas as pd
-import seaborn as sns
 import io
 
 from tle.cogs.handles import ATCODER_RATED_RANKS, CODECHEF_RATED_RANKS, _CLIST_RESOURCE_SHORT_FORMS, _SUPPORTED_CLIST_RESOURCES
-from collections import defaultdict, namedtuple
+from collections import defaultdict, namedtuple, OrderedDict
 from typing import List
 from disnake.ext import commands
-from matplotlib import pyplot as plt
-from matplotlib import patches as patches
-from matplotlib import lines as mlines
-from matplotlib import dates as mdates
-from matplotlib.ticker import MultipleLocator
+from matplotlib import rcParams
 
 from tle import constants
 from tle.util import db
+from tle.util import events
 from tle.util import tasks
 from tle.util import table
 from tle.util import paginator
@@ -52,7 +48,7 @@ def nice_sub_type(types):
                 'PRACTICE':'Practice: {}'}
     return [nice_map[t] for t in types]
 
-def _plot_rating(resp, mark='o', resource='codeforces.com'):
+def _plot_rating(spec, resp, mark='o', resource='codeforces.com'):
 
     for rating_changes in resp:
         ratings, times = [], []
@@ -60,22 +56,22 @@ def _plot_rating(resp, mark='o', resource='codeforces.com'):
             ratings.append(rating_change.newRating)
             times.append(dt.datetime.fromtimestamp(rating_change.ratingUpdateTimeSeconds))
 
-        plt.plot(times,
-                 ratings,
-                 linestyle='-',
-                 marker=mark,
-                 markersize=3,
-                 markerfacecolor='white',
-                 markeredgewidth=0.5)
+        spec.plot(times,
+                  ratings,
+                  linestyle='-',
+                  marker=mark,
+                  markersize=3,
+                  markerfacecolor='white',
+                  markeredgewidth=0.5)
     if resource=='codechef.com':
-        gc.plot_rating_bg(CODECHEF_RATED_RANKS)
+        spec.rating_bg(CODECHEF_RATED_RANKS)
     elif resource=='atcoder.jp':
-        gc.plot_rating_bg(ATCODER_RATED_RANKS)
+        spec.rating_bg(ATCODER_RATED_RANKS)
     else:
-        gc.plot_rating_bg(cf.RATED_RANKS)
-    plt.gcf().autofmt_xdate()
+        spec.rating_bg(cf.RATED_RANKS)
+    spec.autofmt_xdate()
 
-def _plot_perf(resp, mark='o', resource='codeforces.com'):
+def _plot_perf(spec, resp, mark='o', resource='codeforces.com'):
 
     for rating_changes in resp:
         ratings, times = [], []
@@ -83,20 +79,20 @@ def _plot_perf(resp, mark='o', resource='codeforces.com'):
             ratings.append(rating_change.oldRating)
             times.append(dt.datetime.fromtimestamp(rating_change.ratingUpdateTimeSeconds))
 
-        plt.plot(times,
-                 ratings,
-                 linestyle='-',
-                 marker=mark,
-                 markersize=3,
-                 markerfacecolor='white',
-                 markeredgewidth=0.5)
+        spec.plot(times,
+                  ratings,
+                  linestyle='-',
+                  marker=mark,
+                  markersize=3,
+                  markerfacecolor='white',
+                  markeredgewidth=0.5)
     if resource=='codechef.com':
-        gc.plot_rating_bg(CODECHEF_RATED_RANKS)
+        spec.rating_bg(CODECHEF_RATED_RANKS)
     elif resource=='atcoder.jp':
-        gc.plot_rating_bg(ATCODER_RATED_RANKS)
+        spec.rating_bg(ATCODER_RATED_RANKS)
     else:
-        gc.plot_rating_bg(cf.RATED_RANKS)
-    plt.gcf().autofmt_xdate()    
+        spec.rating_bg(cf.RATED_RANKS)
+    spec.autofmt_xdate()
 
 def _classify_submissions(submissions):
     solved_by_type = {sub_type: [] for sub_type in cf.Party.PARTICIPANT_TYPES}
@@ -105,11 +101,11 @@ def _classify_submissions(submissions):
     return solved_by_type
 
 
-def _plot_scatter(regular, practice, virtual, point_size):
+def _plot_scatter(spec, regular, practice, virtual, point_size):
     for contest in [practice, regular, virtual]:
         if contest:
             times, ratings = zip(*contest)
-            plt.scatter(times, ratings, zorder=10, s=point_size)
+            spec.scatter(times, ratings, zorder=10, s=point_size)
 
 
 def _running_mean(x, bin_size):
@@ -144,7 +140,7 @@ def _get_extremes(contest, problemset, submissions):
     return min_unsolved, max_solved
 
 
-def _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolved, legend):
+def _plot_extreme(spec, handle, rating, packed_contest_subs_problemset, solved, unsolved, legend):
     extremes = [
         (dt.datetime.fromtimestamp(contest.end_time), _get_extremes(contest, problemset, subs))
         for contest, problemset, subs in packed_contest_subs_problemset
@@ -170,7 +166,7 @@ def _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolv
     outlinecolor = '#00000022'
 
     def scatter_outline(*args, **kwargs):
-        plt.scatter(*args, **kwargs)
+        spec.scatter(*args, **kwargs)
         kwargs['zorder'] -= 1
         kwargs['color'] = outlinecolor
         if kwargs['marker'] == '*':
@@ -183,9 +179,8 @@ def _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolv
             del kwargs['alpha']
         if 'label' in kwargs:
             del kwargs['label']
-        plt.scatter(*args, **kwargs)
+        spec.scatter(*args, **kwargs)
 
-    plt.clf()
     time_scatter, plot_min, plot_max = zip(*regular)
     if unsolved:
         scatter_outline(time_scatter, plot_min, zorder=10,
@@ -196,10 +191,8 @@ def _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolv
                         s=14, marker='o', color=solvedcolor,
                         label='Hardest solved')
 
-    ax = plt.gca()
     if solved and unsolved:
-        for t, mn, mx in regular:
-            ax.add_line(mlines.Line2D((t, t), (mn, mx), color=linecolor))
+        spec.vlines(time_scatter, plot_min, plot_max, color=linecolor)
 
     if fullsolves:
         scatter_outline(*zip(*fullsolves), zorder=15,
@@ -211,13 +204,14 @@ def _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolv
                         color=unsolvedcolor)
 
     if legend:
-        plt.legend(title=f'{handle}: {rating}', title_fontsize=plt.rcParams['legend.fontsize'],
-                   loc='upper left').set_zorder(20)
-    gc.plot_rating_bg(cf.RATED_RANKS)
-    plt.gcf().autofmt_xdate()
+        spec.legend(title=f'{handle}: {rating}', title_fontsize=rcParams['legend.fontsize'],
+                    loc='upper left')
+        spec.set_legend_zorder(20)
+    spec.rating_bg(cf.RATED_RANKS)
+    spec.autofmt_xdate()
 
 
-def _plot_average(practice, bin_size, label: str = ''):
+def _plot_average(spec, practice, bin_size, label: str = ''):
     if len(practice) > bin_size:
         sub_times, ratings = map(list, zip(*practice))
 
@@ -226,17 +220,20 @@ def _plot_average(practice, bin_size, label: str = ''):
         mean_sub_times = [dt.datetime.fromtimestamp(timestamp) for timestamp in mean_sub_timestamps]
         mean_ratings = _running_mean(ratings, bin_size)
 
-        plt.plot(mean_sub_times,
-                 mean_ratings,
-                 linestyle='-',
-                 marker='',
-                 markerfacecolor='white',
-                 markeredgewidth=0.5,
-                 label=label)
+        spec.plot(mean_sub_times,
+                  mean_ratings,
+                  linestyle='-',
+                  marker='',
+                  markerfacecolor='white',
+                  markeredgewidth=0.5,
+                  label=label)
 
 _CONTESTS_PER_PAGE = 5
 _CONTEST_PAGINATE_WAIT_TIME = 5 * 60
 _STANDINGS_PER_PAGE = 15
+_RANKLIST_PAGES_CACHE_SIZE = 100
+# Plots may use submissions loaded this many seconds ago instead of syncing them again.
+_SUBMISSIONS_MAX_AGE = 60
 _STANDINGS_PAGINATE_WAIT_TIME = 2 * 60
 _FINISHED_CONTESTS_LIMIT = 5
 _WATCHING_RATED_VC_WAIT_TIME = 5 * 60  # seconds
@@ -312,13 +309,13 @@ def _get_embed_fields_from_contests(contests):
     return fields
 
 
-def _get_ongoing_vc_participants():
+async def _get_ongoing_vc_participants():
     """ Returns a set containing the `member_id`s of users who are registered in an ongoing vc.
     """
-    ongoing_vc_ids = cf_common.user_db.get_ongoing_rated_vc_ids()
+    ongoing_vc_ids = await cf_common.user_db.aio.get_ongoing_rated_vc_ids()
     ongoing_vc_participants = set()
     for vc_id in ongoing_vc_ids:
-        vc_participants = set(cf_common.user_db.get_rated_vc_user_ids(vc_id))
+        vc_participants = set(await cf_common.user_db.aio.get_rated_vc_user_ids(vc_id))
         ongoing_vc_participants |= vc_participants
     return ongoing_vc_participants
 
@@ -395,6 +392,9 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         self.finished_contests = None
         self.start_time_map = defaultdict(list)
         self.task_map = defaultdict(list)
+        # Rendered ranklist pages by (contest id, ranklist fetch time, lowercase handles, vc),
+        # least recently used first.
+        self.ranklist_pages = OrderedDict()
 
         self.font = ImageFont.truetype(constants.NOTO_SANS_CJK_BOLD_FONT_PATH, size=26)
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -402,7 +402,14 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
     @commands.Cog.listener()
     @discord_common.once
     async def on_ready(self):
-        pass
+        cf_common.event_sys.add_listener(self._on_ranklist_update)
+
+    @events.listener_spec(name='RanklistUpdateListener',
+                          event_cls=events.RanklistUpdate)
+    async def _on_ranklist_update(self, event):
+        contest_ids = set(event.contest_ids)
+        for key in [key for key in self.ranklist_pages if key[0] in contest_ids]:
+            del self.ranklist_pages[key]
 
     @commands.slash_command(description='List solved CodeForces problems')
     async def stalk(self, inter, handles: str = None, args: str = "", since: str = None, before: str = None):
@@ -432,7 +439,8 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         args = filt.parse(args)
         handles = args or ('!' + str(inter.author),)
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        submissions = [await cf.user.status(handle=handle) for handle in handles]
+        submissions = await cf_common.cache2.submission_cache.get_submissions_many(
+            handles, max_age=_SUBMISSIONS_MAX_AGE)
         submissions = [sub for subs in submissions for sub in subs]
         submissions = filt.filter_subs(submissions)
 
@@ -467,16 +475,18 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
     async def leaderboard(self, inter):
         await inter.response.send_message('This may take a while...')
         handles = {handle for discord_id, handle
-                            in cf_common.user_db.get_handles_for_guild(inter.guild.id)}
+                            in await cf_common.user_db.aio.get_handles_for_guild(inter.guild.id)}
         date = dt.datetime.now()-dt.timedelta(days=7)
         filt = cf_common.SubFilter(False)
         filt.parse('');
         filt.dlo = date.timestamp()
         rows = []
         i = 1
-        for handle in handles:
-            user = cf_common.user_db.fetch_cf_user(handle)
-            submissions = await cf.user.status(handle=handle)
+        handles = list(handles)
+        all_submissions = await cf_common.cache2.submission_cache.get_submissions_many(
+            handles, max_age=_SUBMISSIONS_MAX_AGE)
+        for handle, submissions in zip(handles, all_submissions):
+            user = await cf_common.user_db.aio.fetch_cf_user(handle)
             submissions = filt.filter_subs(submissions)
             points = 0
             problemCount = 0
@@ -549,12 +559,13 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         handles = handles or ['!' + str(inter.author)]
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
+        resp = await cf_common.cache2.submission_cache.get_submissions_many(
+            handles, max_age=_SUBMISSIONS_MAX_AGE)
         all_solved_subs = [filt.filter_subs(submissions) for submissions in resp]
 
-        plt.clf()
-        plt.xlabel('Rating')
-        plt.ylabel('Minutes spent')
+        spec = gc.PlotSpec()
+        spec.set_xlabel('Rating')
+        spec.set_ylabel('Minutes spent')
 
         max_time = 0  # for ylim
 
@@ -599,20 +610,18 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
             ys = [time_by_rating[rating] for rating in xs]
 
             max_time = max(max_time, max(ys, default=0))
-            plt.plot(xs, ys)
+            spec.plot(xs, ys)
             if add_scatter:
-                plt.scatter(*zip(*scatter_points), s=point_size)
+                spec.scatter(*zip(*scatter_points), s=point_size)
 
         labels = [gc.StrWrap(handle) for handle in handles]
-        plt.legend(labels)
-        plt.ylim(0, max_time + 5)
+        spec.legend(labels)
+        spec.set_ylim(0, max_time + 5)
 
         # make xticks divisible by 100
-        ticks = plt.gca().get_xticks()
-        base = ticks[1] - ticks[0]
-        plt.gca().get_xaxis().set_major_locator(MultipleLocator(base = max(base // 100 * 100, 100)))
+        spec.round_xticks(100)
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Plot of average time spent on a problem')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -674,7 +683,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 resp.append(filtered_changes)
         else:
             handles = []
-            account_id = cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
+            account_id = await cf_common.user_db.aio.get_account_id(inter.author.id, inter.guild.id, resource)
             if account_id!=None:
                 resp = [await clist.fetch_rating_changes([account_id])]
                 handles.append(inter.author.display_name)
@@ -698,13 +707,13 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if peak:
             resp = [max_prefix(user) for user in resp]
 
-        plt.clf()
-        plt.axes().set_prop_cycle(gc.rating_color_cycler)
-        _plot_rating(resp, resource=resource)
+        spec = gc.PlotSpec()
+        spec.set_prop_cycle(gc.rating_color_cycler)
+        _plot_rating(spec, resp, resource=resource)
         current_ratings = [rating_changes[-1].newRating if rating_changes else 'Unrated' for rating_changes in resp]
         handles = [rating_changes[-1].handle for rating_changes in resp]
         labels = [gc.StrWrap(f'{handle} ({rating})') for handle, rating in zip(handles, current_ratings)]
-        plt.legend(labels, loc='upper left')
+        spec.legend(labels, loc='upper left')
 
         if not zoom:
             min_rating = 1100
@@ -713,9 +722,9 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 for rating in rating_changes:
                     min_rating = min(min_rating, rating.newRating)
                     max_rating = max(max_rating, rating.newRating)
-            plt.ylim(min_rating - 100, max_rating + 200)
+            spec.set_ylim(min_rating - 100, max_rating + 200)
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Rating graph on '+resource)
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -760,7 +769,8 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if resource=='codeforces.com':
             handles = args or ('!' + str(inter.author),)
             handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-            resp = [await cf.user.rating(handle=handle) for handle in handles]
+            resp = [await cf_common.cache2.user_cache.get_rating_changes(handle)
+                    for handle in handles]
             if not any(resp):
                 handles_str = ', '.join(f'`{handle}`' for handle in handles)
                 if len(handles) == 1:
@@ -785,7 +795,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                     resp.append(data[key])
             else:
                 handles = []
-                account_id = cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
+                account_id = await cf_common.user_db.aio.get_account_id(inter.author.id, inter.guild.id, resource)
                 if account_id!=None:
                     resp = [await clist.fetch_rating_changes([account_id])]
                     handles.append(inter.author.display_name)
@@ -809,14 +819,14 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if peak:
             resp = [max_prefix(user) for user in resp]
 
-        plt.clf()
-        plt.axes().set_prop_cycle(gc.rating_color_cycler)
-        _plot_rating(resp, resource=resource)
+        spec = gc.PlotSpec()
+        spec.set_prop_cycle(gc.rating_color_cycler)
+        _plot_rating(spec, resp, resource=resource)
         current_ratings = [rating_changes[-1].newRating if rating_changes else 'Unrated' for rating_changes in resp]
         if resource!='codeforces.com':
             handles = [rating_changes[-1].handle for rating_changes in resp]
         labels = [gc.StrWrap(f'{handle} ({rating})') for handle, rating in zip(handles, current_ratings)]
-        plt.legend(labels, loc='upper left')
+        spec.legend(labels, loc='upper left')
 
         if not zoom:
             min_rating = 1100
@@ -825,9 +835,9 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 for rating in rating_changes:
                     min_rating = min(min_rating, rating.newRating)
                     max_rating = max(max_rating, rating.newRating)
-            plt.ylim(min_rating - 100, max_rating + 200)
+            spec.set_ylim(min_rating - 100, max_rating + 200)
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Rating graph on '+resource)
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -872,7 +882,8 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if resource=='codeforces.com':
             handles = args or ('!' + str(inter.author),)
             handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-            resp = [await cf.user.rating(handle=handle) for handle in handles]
+            resp = [await cf_common.cache2.user_cache.get_rating_changes(handle)
+                    for handle in handles]
             if not any(resp):
                 handles_str = ', '.join(f'`{handle}`' for handle in handles)
                 if len(handles) == 1:
@@ -897,7 +908,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                     resp.append(data[key])
             else:
                 handles = []
-                account_id = cf_common.user_db.get_account_id(inter.author.id, inter.guild.id, resource)
+                account_id = await cf_common.user_db.aio.get_account_id(inter.author.id, inter.guild.id, resource)
                 if account_id!=None:
                     resp = [await clist.fetch_rating_changes([account_id],  resource=='atcoder.jp')]
                     handles.append(inter.author.display_name)
@@ -918,11 +929,11 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 message = f'None of the given users {handles_str} are rated'
             raise ActivitiesCogError(message)
 
-        plt.clf()
-        plt.axes().set_prop_cycle(gc.rating_color_cycler)
-        _plot_perf(resp, resource=resource)
+        spec = gc.PlotSpec()
+        spec.set_prop_cycle(gc.rating_color_cycler)
+        _plot_perf(spec, resp, resource=resource)
         labels = [gc.StrWrap(f'{handle} ({rating})') for handle, rating in zip(handles, current_ratings)]
-        plt.legend(labels, loc='upper left')
+        spec.legend(labels, loc='upper left')
 
         if not zoom:
             min_rating = 1100
@@ -931,9 +942,9 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 for rating in rating_changes:
                     min_rating = min(min_rating, rating.oldRating)
                     max_rating = max(max_rating, rating.oldRating)
-            plt.ylim(min_rating - 100, max_rating + 200)
+            spec.set_ylim(min_rating - 100, max_rating + 200)
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Performance graph on '+resource)
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -964,27 +975,31 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         handles = args or ('!' + str(inter.author),)
         handle, = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        ratingchanges = await cf.user.rating(handle=handle)
+        ratingchanges = await cf_common.cache2.user_cache.get_rating_changes(handle)
         if not ratingchanges:
             raise ActivitiesCogError(f'User {handle} is not rated')
 
         contest_ids = [change.contestId for change in ratingchanges]
         subs_by_contest_id = {contest_id: [] for contest_id in contest_ids}
-        for sub in await cf.user.status(handle=handle):
+        submissions = await cf_common.cache2.submission_cache.get_submissions(
+            handle, max_age=_SUBMISSIONS_MAX_AGE)
+        for sub in submissions:
             if sub.contestId in subs_by_contest_id:
                 subs_by_contest_id[sub.contestId].append(sub)
 
         packed_contest_subs_problemset = [
             (cf_common.cache2.contest_cache.get_contest(contest_id),
-             cf_common.cache2.problemset_cache.get_problemset(contest_id),
+             await cf_common.cache2.problemset_cache.get_problemset(contest_id),
              subs_by_contest_id[contest_id])
             for contest_id in contest_ids
         ]
 
         rating = max(ratingchanges, key=lambda change: change.ratingUpdateTimeSeconds).newRating
-        _plot_extreme(handle, rating, packed_contest_subs_problemset, solved, unsolved, legend)
+        spec = gc.PlotSpec()
+        _plot_extreme(spec, handle, rating, packed_contest_subs_problemset, solved, unsolved,
+                      legend)
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Codeforces extremes graph')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1016,15 +1031,16 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         args = filt.parse(args)
         handles = args or ('!' + str(inter.author),)
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
+        resp = await cf_common.cache2.submission_cache.get_submissions_many(
+            handles, max_age=_SUBMISSIONS_MAX_AGE)
         all_solved_subs = [filt.filter_subs(submissions) for submissions in resp]
 
         if not any(all_solved_subs):
             raise ActivitiesCogError(f'There are no problems within the specified parameters.')
 
-        plt.clf()
-        plt.xlabel('Problem rating')
-        plt.ylabel('Number solved')
+        spec = gc.PlotSpec()
+        spec.set_xlabel('Problem rating')
+        spec.set_ylabel('Number solved')
         if len(handles) == 1:
             # Display solved problem separately by type for a single user.
             handle, solved_by_type = handles[0], _classify_submissions(all_solved_subs[0])
@@ -1037,10 +1053,10 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
             step = 100
             # shift the range to center the text
             hist_bins = list(range(filt.rlo - step // 2, filt.rhi + step // 2 + 1, step))
-            plt.hist(all_ratings, stacked=True, bins=hist_bins, label=labels)
+            spec.hist(all_ratings, stacked=True, bins=hist_bins, label=labels)
             total = sum(map(len, all_ratings))
-            plt.legend(title=f'{handle}: {total}', title_fontsize=plt.rcParams['legend.fontsize'],
-                       loc='upper right')
+            spec.legend(title=f'{handle}: {total}', title_fontsize=rcParams['legend.fontsize'],
+                        loc='upper right')
 
         else:
             all_ratings = [[sub.problem.rating for sub in solved_subs]
@@ -1050,10 +1066,10 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
             step = 200 if filt.rhi - filt.rlo > 3000 // len(handles) else 100
             hist_bins = list(range(filt.rlo - step // 2, filt.rhi + step // 2 + 1, step))
-            plt.hist(all_ratings, bins=hist_bins)
-            plt.legend(labels, loc='upper right')
+            spec.hist(all_ratings, bins=hist_bins)
+            spec.legend(labels, loc='upper right')
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Histogram of problems solved on Codeforces')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1096,15 +1112,16 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         handles = handles or ['!' + str(inter.author)]
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
+        resp = await cf_common.cache2.submission_cache.get_submissions_many(
+            handles, max_age=_SUBMISSIONS_MAX_AGE)
         all_solved_subs = [filt.filter_subs(submissions) for submissions in resp]
 
         if not any(all_solved_subs):
             raise ActivitiesCogError(f'There are no problems within the specified parameters.')
 
-        plt.clf()
-        plt.xlabel('Time')
-        plt.ylabel('Number solved')
+        spec = gc.PlotSpec()
+        spec.set_xlabel('Time')
+        spec.set_ylabel('Number solved')
         if len(handles) == 1:
             handle, solved_by_type = handles[0], _classify_submissions(all_solved_subs[0])
             all_times = [[dt.datetime.fromtimestamp(sub.creationTimeSeconds) for sub in solved_by_type[sub_type]]
@@ -1116,7 +1133,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
             dlo = min(itertools.chain.from_iterable(all_times)).date()
             dhi = min(dt.datetime.today() + dt.timedelta(days=1), dt.datetime.fromtimestamp(filt.dhi)).date()
             phase_cnt = math.ceil((dhi - dlo) / phase_time)
-            plt.hist(
+            spec.hist(
                 all_times,
                 stacked=True,
                 label=labels,
@@ -1124,7 +1141,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 bins=min(40, phase_cnt))
 
             total = sum(map(len, all_times))
-            plt.legend(title=f'{handle}: {total}', title_fontsize=plt.rcParams['legend.fontsize'])
+            spec.legend(title=f'{handle}: {total}', title_fontsize=rcParams['legend.fontsize'])
         else:
             all_times = [[dt.datetime.fromtimestamp(sub.creationTimeSeconds) for sub in solved_subs]
                          for solved_subs in all_solved_subs]
@@ -1138,21 +1155,19 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
             dlo = min(itertools.chain.from_iterable(all_times)).date()
             dhi = min(dt.datetime.today() + dt.timedelta(days=1), dt.datetime.fromtimestamp(filt.dhi)).date()
             phase_cnt = math.ceil((dhi - dlo) / phase_time)
-            plt.hist(
+            spec.hist(
                 all_times,
                 range=(dhi - phase_cnt * phase_time, dhi),
                 bins=min(40 // len(handles), phase_cnt))
-            plt.legend(labels)
+            spec.legend(labels)
 
         # NOTE: In case of nested list, matplotlib decides type using 1st sublist,
         # it assumes float when 1st sublist is empty.
         # Hence explicitly assigning locator and formatter is must here.
-        locator = mdates.AutoDateLocator()
-        plt.gca().xaxis.set_major_locator(locator)
-        plt.gca().xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
+        spec.date_xaxis()
 
-        plt.gcf().autofmt_xdate()
-        discord_file = gc.get_current_figure_as_file()
+        spec.autofmt_xdate()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Histogram of number of solved problems over time')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1183,30 +1198,31 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         args = filt.parse(args)
         handles = args or ('!' + str(inter.author),)
         handles = await cf_common.resolve_handles(inter, self.member_converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
+        resp = await cf_common.cache2.submission_cache.get_submissions_many(
+            handles, max_age=_SUBMISSIONS_MAX_AGE)
         all_solved_subs = [filt.filter_subs(submissions) for submissions in resp]
 
         if not any(all_solved_subs):
             raise ActivitiesCogError(f'There are no problems within the specified parameters.')
 
-        plt.clf()
-        plt.xlabel('Time')
-        plt.ylabel('Cumulative solve count')
+        spec = gc.PlotSpec()
+        spec.set_xlabel('Time')
+        spec.set_ylabel('Cumulative solve count')
 
         all_times = [[dt.datetime.fromtimestamp(sub.creationTimeSeconds) for sub in solved_subs]
                      for solved_subs in all_solved_subs]
         for times in all_times:
             cumulative_solve_count = list(range(1, len(times)+1)) + [len(times)]
             timestretched = times + [min(dt.datetime.now(), dt.datetime.fromtimestamp(filt.dhi))]
-            plt.plot(timestretched, cumulative_solve_count)
+            spec.plot(timestretched, cumulative_solve_count)
 
         labels = [gc.StrWrap(f'{handle}: {len(times)}')
                   for handle, times in zip(handles, all_times)]
 
-        plt.legend(labels)
+        spec.legend(labels)
 
-        plt.gcf().autofmt_xdate()
-        discord_file = gc.get_current_figure_as_file()
+        spec.autofmt_xdate()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Curve of number of solved problems over time')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1254,9 +1270,10 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         handle = handle or '!' + str(inter.author)
         handle, = await cf_common.resolve_handles(inter, self.member_converter, (handle,))
-        rating_resp = [await cf.user.rating(handle=handle)]
+        rating_resp = [await cf_common.cache2.user_cache.get_rating_changes(handle)]
         rating_resp = [filt.filter_rating_changes(rating_changes) for rating_changes in rating_resp]
-        submissions = filt.filter_subs(await cf.user.status(handle=handle))
+        submissions = filt.filter_subs(await cf_common.cache2.submission_cache.get_submissions(
+            handle, max_age=_SUBMISSIONS_MAX_AGE))
 
         def extract_time_and_rating(submissions):
             return [(dt.datetime.fromtimestamp(sub.creationTimeSeconds), sub.problem.rating)
@@ -1271,8 +1288,8 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         practice = extract_time_and_rating(solved_by_type['PRACTICE'])
         virtual = extract_time_and_rating(solved_by_type['VIRTUAL'])
 
-        plt.clf()
-        _plot_scatter(regular, practice, virtual, point_size)
+        spec = gc.PlotSpec()
+        _plot_scatter(spec, regular, practice, virtual, point_size)
         labels = []
         if practice:
             labels.append('Practice')
@@ -1281,15 +1298,14 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if virtual:
             labels.append('Virtual')
         if legend:
-            plt.legend(labels, loc='upper left')
-        _plot_average(practice, bin_size)
-        _plot_rating(rating_resp, mark='')
+            spec.legend(labels, loc='upper left')
+        _plot_average(spec, practice, bin_size)
+        _plot_rating(spec, rating_resp, mark='')
 
         # zoom
-        ymin, ymax = plt.gca().get_ylim()
-        plt.ylim(max(ymin, filt.rlo - 100), min(ymax, filt.rhi + 100))
+        spec.clamp_ylim(filt.rlo - 100, filt.rhi + 100)
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title=f'Rating vs solved problem rating for {handle}')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1300,7 +1316,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         """Plots rating distribution of users in this server"""
         await inter.response.defer()
 
-        res = cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
+        res = await cf_common.user_db.aio.get_cf_users_for_guild(inter.guild.id)
         ratings = [cf_user.rating for user_id, cf_user in res
                    if cf_user.rating is not None]
 
@@ -1338,17 +1354,15 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         colors = colors[l:r+1]
         height = height[l:r+1]
 
-        plt.clf()
-        fig = plt.figure(figsize=(15, 5))
+        spec = gc.PlotSpec(figsize=(15, 5))
 
-        plt.xticks(rotation=45)
-        plt.xlim(l * binsize - binsize//2, r * binsize + binsize//2)
-        plt.bar(x, height, binsize*0.9, color=colors, linewidth=0, tick_label=label, log=False)
-        plt.xlabel('Rating')
-        plt.ylabel('Number of users')
+        spec.tick_params(axis='x', labelrotation=45)
+        spec.set_xlim(l * binsize - binsize//2, r * binsize + binsize//2)
+        spec.bar(x, height, binsize*0.9, color=colors, linewidth=0, tick_label=label, log=False)
+        spec.set_xlabel('Rating')
+        spec.set_ylabel('Number of users')
 
-        discord_file = gc.get_current_figure_as_file()
-        plt.close(fig)
+        discord_file = await gc.render_file(spec)
 
         embed = discord_common.cf_color_embed(title=title)
         discord_common.attach_image(embed, discord_file)
@@ -1369,18 +1383,18 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         # shift the [-300, 500] gitgud range to center the text
         hist_bins = list(range(-300 - 50, 500 + 50 + 1, 100))
-        deltas = [[x[0] for x in cf_common.user_db.howgud(member.id)] for member in member]
+        deltas = [[x[0] for x in await cf_common.user_db.aio.howgud(member.id)] for member in member]
         labels = [gc.StrWrap(f'{member.display_name}: {len(delta)}')
                   for member, delta in zip(member, deltas)]
 
-        plt.clf()
-        plt.margins(x=0)
-        plt.hist(deltas, bins=hist_bins, rwidth=1)
-        plt.xlabel('Problem delta')
-        plt.ylabel('Number solved')
-        plt.legend(labels, prop=gc.fontprop)
+        spec = gc.PlotSpec()
+        spec.margins(x=0)
+        spec.hist(deltas, bins=hist_bins, rwidth=1)
+        spec.set_xlabel('Problem delta')
+        spec.set_ylabel('Number solved')
+        spec.legend(labels, prop=gc.fontprop)
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Histogram of gudgitting')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
@@ -1403,31 +1417,23 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if len(countries) > 8:
             raise ActivitiesCogError(f'At most 8 countries may be specified.')
 
-        users = cf_common.user_db.get_cf_users_for_guild(inter.guild.id)
+        users = await cf_common.user_db.aio.get_cf_users_for_guild(inter.guild.id)
         counter = collections.Counter(user.country for _, user in users if user.country)
 
         if not countries:
             # list because seaborn complains for tuple.
             countries, counts = map(list, zip(*counter.most_common()))
-            plt.clf()
-            fig = plt.figure(figsize=(15, 5))
-            with sns.axes_style(rc={'xtick.bottom': True}):
-                sns.barplot(x=countries, y=counts)
+            spec = gc.PlotSpec(figsize=(15, 5), axes_rc={'xtick.bottom': True})
+            spec.seaborn('barplot', x=countries, y=counts)
 
             # Show counts on top of bars.
-            ax = plt.gca()
-            for p in ax.patches:
-                x = p.get_x() + p.get_width() / 2
-                y = p.get_y() + p.get_height() + 0.5
-                ax.text(x, y, int(p.get_height()), horizontalalignment='center', color='#30304f',
-                        fontsize='x-small')
-
-            plt.xticks(rotation=40, horizontalalignment='right')
-            ax.tick_params(axis='x', length=4, color=ax.spines['bottom'].get_edgecolor())
-            plt.xlabel('Country')
-            plt.ylabel('Number of members')
-            discord_file = gc.get_current_figure_as_file()
-            plt.close(fig)
+            spec.label_bars(horizontalalignment='center', color='#30304f', fontsize='x-small')
+
+            spec.rotate_xticklabels(40, ha='right')
+            spec.spine_colored_xticks(length=4)
+            spec.set_xlabel('Country')
+            spec.set_ylabel('Number of members')
+            discord_file = await gc.render_file(spec)
             embed = discord_common.cf_color_embed(title='Distribution of server members by country')
         else:
             countries = [country.title() for country in countries]
@@ -1440,22 +1446,21 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
             df = pd.DataFrame(data, columns=['Country', 'Rating'])
             column_order = sorted((country for country in countries if counter[country]),
                                   key=counter.get, reverse=True)
-            plt.clf()
             if len(column_order) <= 5:
-                sns.swarmplot(x='Country', y='Rating', hue='Rating', data=df, order=column_order,
-                              palette=color_map)
+                spec = gc.PlotSpec()
+                spec.seaborn('swarmplot', x='Country', y='Rating', hue='Rating', data=df,
+                             order=column_order, palette=color_map)
             else:
                 # Add ticks and rotate tick labels to avoid overlap.
-                with sns.axes_style(rc={'xtick.bottom': True}):
-                    sns.swarmplot(x='Country', y='Rating', hue='Rating', data=df,
-                                  order=column_order, palette=color_map)
-                plt.xticks(rotation=30, horizontalalignment='right')
-                ax = plt.gca()
-                ax.tick_params(axis='x', color=ax.spines['bottom'].get_edgecolor())
-            plt.legend().remove()
-            plt.xlabel('Country')
-            plt.ylabel('Rating')
-            discord_file = gc.get_current_figure_as_file()
+                spec = gc.PlotSpec(axes_rc={'xtick.bottom': True})
+                spec.seaborn('swarmplot', x='Country', y='Rating', hue='Rating', data=df,
+                             order=column_order, palette=color_map)
+                spec.rotate_xticklabels(30, ha='right')
+                spec.spine_colored_xticks()
+            spec.remove_legend()
+            spec.set_xlabel('Country')
+            spec.set_ylabel('Rating')
+            discord_file = await gc.render_file(spec)
             embed = discord_common.cf_color_embed(title='Rating distribution of server members by '
                                                         'country')
 
@@ -1490,7 +1495,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         rating_changes = await cf.contest.ratingChanges(contest_id=contest_id)
         if in_server:
             guild_handles = set(handle for discord_id, handle
-                                in cf_common.user_db.get_handles_for_guild(inter.guild.id))
+                                in await cf_common.user_db.aio.get_handles_for_guild(inter.guild.id))
             rating_changes = [rating_change for rating_change in rating_changes
                               if rating_change.handle in guild_handles or rating_change.handle in handles]
 
@@ -1535,32 +1540,30 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
 
         title = rating_changes[0].contestName
 
-        plt.clf()
-        fig = plt.figure(figsize=(12, 8))
-        plt.title(title)
-        plt.xlabel('Rank')
-        plt.ylabel('Rating Changes')
+        spec = gc.PlotSpec(figsize=(12, 8))
+        spec.set_title(title)
+        spec.set_xlabel('Rank')
+        spec.set_ylabel('Rating Changes')
 
         mark_size = 2e4 / len(ranks)
-        plt.xlim(xmin - xmargin, xmax + xmargin)
-        plt.ylim(ymin - ymargin, ymax + ymargin)
-        plt.scatter(ranks, delta, s=mark_size, c=color)
+        spec.set_xlim(xmin - xmargin, xmax + xmargin)
+        spec.set_ylim(ymin - ymargin, ymax + ymargin)
+        spec.scatter(ranks, delta, s=mark_size, c=color)
 
         for handle, point in users_to_mark.items():
-            plt.annotate(handle,
-                         xy=point,
-                         xytext=(0, 0),
-                         textcoords='offset points',
-                         ha='left',
-                         va='bottom',
-                         fontsize='large')
-            plt.plot(*point,
-                     marker='o',
-                     markersize=5,
-                     color='black')
-
-        discord_file = gc.get_current_figure_as_file()
-        plt.close(fig)
+            spec.annotate(handle,
+                          xy=point,
+                          xytext=(0, 0),
+                          textcoords='offset points',
+                          ha='left',
+                          va='bottom',
+                          fontsize='large')
+            spec.plot(*point,
+                      marker='o',
+                      markersize=5,
+                      color='black')
+
+        discord_file = await gc.render_file(spec)
 
         embed = discord_common.cf_color_embed(title=title)
         discord_common.attach_image(embed, discord_file)
@@ -1917,7 +1920,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         handles = tuple(handles.split())
 
         resource = 'codeforces.com'
-        timezone = cf_common.user_db.get_guildtz(inter.guild.id)
+        timezone = await cf_common.user_db.aio.get_guildtz(inter.guild.id)
         timezone = pytz.timezone(timezone or 'Asia/Kolkata')
         for pattern in _PATTERNS:
             if pattern in contest_id:
@@ -1953,8 +1956,8 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
                 for clist_user in clist_users:
                     users[clist_user['id']] = clist_user['name']
             standings_to_show = []
-            standings = await clist.statistics(contest_id=contest_id, account_ids=account_ids, with_extra_fields=True, with_problems=True, order_by='place', limit=50)
-            for standing in standings:
+            standings = clist.iter_statistics(contest_id=contest_id, account_ids=account_ids, with_extra_fields=True, with_problems=True, order_by='place', limit=50)
+            async for standing in standings:
                 if not standing['place'] or not standing['handle']:
                     continue
                 if resource=='codedrills.io':
@@ -2005,6 +2008,23 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
         if ranklist is None:
             raise ActivitiesCogError('No ranklist to show')
 
+        key = (contest_id, ranklist.fetch_time, frozenset(handle.lower() for handle in handles),
+               vc)
+        pages = self.ranklist_pages.get(key)
+        if pages is None:
+            pages = await self._make_ranklist_pages(inter, contest, handles, ranklist, vc)
+            if pages is None:
+                return
+            self.ranklist_pages[key] = pages
+            if len(self.ranklist_pages) > _RANKLIST_PAGES_CACHE_SIZE:
+                self.ranklist_pages.popitem(last=False)
+        else:
+            self.ranklist_pages.move_to_end(key)
+        await paginator.paginate(self.bot, 'text', inter, pages,
+                           message=await inter.original_message(),
+                           wait_time=_STANDINGS_PAGINATE_WAIT_TIME)
+
+    async def _make_ranklist_pages(self, inter, contest, handles, ranklist, vc):
         handle_standings = []
         for handle in handles:
             try:
@@ -2024,7 +2044,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
             error = f'None of the handles are present in the ranklist of `{contest.name}`'
             if vc:
                 await inter.edit_original_message(embed=discord_common.embed_alert(error))
-                return
+                return None
             raise ActivitiesCogError(error)
 
         handle_standings.sort(key=lambda data: data[1].rank)
@@ -2033,10 +2053,7 @@ class Activities(commands.Cog, description = "Analyzing activities with graphs a
             deltas = [ranklist.get_delta(handle) for handle, standing in handle_standings]
 
         problem_indices = [problem.index for problem in ranklist.problems]
-        pages = self._make_standings_pages(contest, problem_indices, handle_standings, deltas)
-        await paginator.paginate(self.bot, 'text', inter, pages,
-                           message=await inter.original_message(),
-                           wait_time=_STANDINGS_PAGINATE_WAIT_TIME)
+        return self._make_standings_pages(contest, problem_indices, handle_standings, deltas)
 
     @discord_common.send_error_if(ActivitiesCogError, cache_system2.CacheError,
                                   cf_common.FilterError, rl.RanklistError,
@@ -6,7 +6,10 @@ import disnake
 from disnake.ext import commands
 
 from tle import constants
+from tle.util import codeforces_api as cf
 from tle.util import codeforces_common as cf_common
+from tle.util import async_cache
+from tle.util.db import executor as db_executor
 
 def timed_command(coro):
     @functools.wraps(coro)
@@ -47,12 +50,20 @@ class CacheControl(commands.Cog):
 
     @cache.sub_command(description='Reload rating changes cache')
     @commands.is_owner()
-    async def ratingchanges(self, inter, contest_id: int):
+    async def ratingchanges(self, inter, contest_id: int = None):
         """
-        Defaults to 'missing'. Mode 'all' clears existing cached changes.
-        Mode 'contest_id' clears existing changes with the given contest id.
+        Mode 'all' refetches the changes of all finished contests in the
+        background, resuming an interrupted refetch, and replaces the cached
+        changes when done. Mode 'contest_id' clears existing changes with the
+        given contest id.
         """
         await inter.response.defer()
+        if contest_id is None:
+            count = await cf_common.cache2.rating_changes_cache.fetch_all_contests()
+            if count is None:
+                return await inter.edit_original_message('Rating changes backfill is already running')
+            return await inter.edit_original_message(
+                f'Started rating changes backfill of {count} contests, see `/cache backfill`')
         count = await cf_common.cache2.rating_changes_cache.fetch_contest(contest_id)
         await inter.edit_original_message(f'Done, fetched {count} changes and recached handle ratings')
 
@@ -60,13 +71,18 @@ class CacheControl(commands.Cog):
     @commands.is_owner()
     async def problemsets(self, inter, contest_id: int = None):
         """
-        Mode 'all' clears all existing cached problems. Mode 'contest_id'
-        clears existing problems with the given contest id.
+        Mode 'all' refetches the problemsets of all finished contests in the
+        background, resuming an interrupted refetch. Mode 'contest_id' clears
+        existing problems with the given contest id.
         """
         await inter.response.defer()
 
         if contest_id == None:
             count = await cf_common.cache2.problemset_cache.update_for_all()
+            if count is None:
+                return await inter.edit_original_message('Problemset backfill is already running')
+            return await inter.edit_original_message(
+                f'Started problemset backfill of {count} contests, see `/cache backfill`')
         else:
             try:
                 contest_id = int(contest_id)
@@ -75,5 +91,64 @@ class CacheControl(commands.Cog):
             count = await cf_common.cache2.problemset_cache.update_for_contest(contest_id)
         await inter.edit_original_message(f'Done, fetched {count} problems')
 
+    @cache.sub_command(description='Show progress of background backfills')
+    @commands.is_owner()
+    async def backfill(self, inter):
+        await inter.response.defer()
+        problemset_cache = cf_common.cache2.problemset_cache
+        rating_changes_cache = cf_common.cache2.rating_changes_cache
+        lines = [self._backfill_line('Problemsets', problemset_cache.backfill_progress,
+                                     problemset_cache.backfill_running()),
+                 self._backfill_line('Rating changes', rating_changes_cache.backfill_progress,
+                                     rating_changes_cache.backfill_running())]
+        await inter.edit_original_message('\n'.join(lines))
+
+    @staticmethod
+    def _backfill_line(name, progress, running):
+        if progress is None:
+            return f'{name}: not started'
+        line = f'{name}: {progress.done}/{progress.total} contests'
+        if progress.error is not None:
+            return line + f', failed with `{progress.error!r}`'
+        if not running:
+            return line + ', finished'
+        eta = progress.eta()
+        if eta is not None:
+            line += f', ETA {cf_common.pretty_time_format(eta, shorten=True)}'
+        return line
+
+    @cache.sub_command(description='Show Codeforces API request queue stats')
+    @commands.is_owner()
+    async def apistats(self, inter):
+        await inter.response.defer()
+        lines = [f'{stats.priority.name.capitalize()}: {stats.queued} queued, '
+                 f'{stats.served} served, average wait {stats.avg_wait:.2f}s, '
+                 f'max wait {stats.max_wait:.2f}s'
+                 for stats in cf.scheduler_stats()]
+        await inter.edit_original_message('\n'.join(lines))
+
+    @cache.sub_command(description='Show database query latency stats')
+    @commands.is_owner()
+    async def dbstats(self, inter):
+        await inter.response.defer()
+
+        def fmt(seconds):
+            return '>5s' if seconds is None else f'<={seconds * 1000:g}ms'
+
+        lines = [f'`{stats.name}`: {stats.count} calls, average {stats.avg * 1000:.1f}ms, '
+                 f'p50 {fmt(stats.p50)}, p99 {fmt(stats.p99)}, max {stats.max * 1000:.1f}ms'
+                 for stats in db_executor.latency_stats()[:20]]
+        await inter.edit_original_message('\n'.join(lines) or 'No queries yet')
+
+    @cache.sub_command(description='Show in-memory cache hit rates and sizes')
+    @commands.is_owner()
+    async def cachestats(self, inter):
+        await inter.response.defer()
+        lines = [f'`{stats.name}`: {stats.hits} hits, {stats.misses} misses, '
+                 f'{stats.coalesced} coalesced, {stats.entries} entries, '
+                 f'{stats.size / 2**20:.1f}/{stats.max_size / 2**20:.0f} MiB'
+                 for stats in async_cache.cache_stats()]
+        await inter.edit_original_message('\n'.join(lines) or 'No caches')
+
 def setup(bot):
     bot.add_cog(CacheControl(bot))
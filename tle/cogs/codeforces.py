@@ -7,7 +7,6 @@ import asyncio
 import disnake
 
 from disnake.ext import commands
-from matplotlib import pyplot as plt
 from collections import defaultdict, namedtuple
 
 from tle import constants
@@ -67,17 +66,17 @@ def elo_prob(player, opponent):
 def elo_delta(player, opponent, win):
     return _ELO_CONSTANT * (win - elo_prob(player, opponent))
 
-def get_cf_user(userid, guild_id):
-    handle = cf_common.user_db.get_handle(userid, guild_id)
-    return cf_common.user_db.fetch_cf_user(handle)
+async def get_cf_user(userid, guild_id):
+    handle = await cf_common.user_db.aio.get_handle(userid, guild_id)
+    return await cf_common.user_db.aio.fetch_cf_user(handle)
 
-def complete_duel(duelid, guild_id, win_status, winner_id, loser_id, finish_time, score, dtype):
-    winner_r = cf_common.user_db.get_duel_rating(winner_id)
-    loser_r = cf_common.user_db.get_duel_rating(loser_id)
+async def complete_duel(duelid, guild_id, win_status, winner_id, loser_id, finish_time, score, dtype):
+    winner_r = await cf_common.user_db.aio.get_duel_rating(winner_id)
+    loser_r = await cf_common.user_db.aio.get_duel_rating(loser_id)
 
     delta = round(elo_delta(winner_r, loser_r, score))
 
-    rc = cf_common.user_db.complete_duel(
+    rc = await cf_common.user_db.aio.complete_duel(
         duelid, win_status, finish_time, winner_id, loser_id, delta, dtype)
     if rc == 0:
         raise CodeforcesCogError('Hey! No cheating!')
@@ -85,8 +84,8 @@ def complete_duel(duelid, guild_id, win_status, winner_id, loser_id, finish_time
     if dtype == DuelType.UNOFFICIAL:
         return None
 
-    winner_cf = get_cf_user(winner_id, guild_id)
-    loser_cf = get_cf_user(loser_id, guild_id)
+    winner_cf = await get_cf_user(winner_id, guild_id)
+    loser_cf = await get_cf_user(loser_id, guild_id)
     desc = f'Rating change after <@{winner_id}> vs <@{loser_id}>:'
 
     if delta < 0:
@@ -118,7 +117,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
             raise Exception
 
         user_id = inter.author.id
-        active = cf_common.user_db.check_challenge(user_id)
+        active = await cf_common.user_db.aio.check_challenge(user_id)
         if active is not None:
             _, _, name, contest_id, index, _ = active
             url = f'{cf.CONTEST_BASE_URL}{contest_id}/problem/{index}'
@@ -130,7 +129,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         user_id = inter.author.id
 
         issue_time = datetime.datetime.now().timestamp()
-        rc = cf_common.user_db.new_challenge(user_id, issue_time, problem, delta)
+        rc = await cf_common.user_db.aio.new_challenge(user_id, issue_time, problem, delta)
         if rc != 1:
             return await inter.edit_original_message('Your challenge has already been added to the database!')
 
@@ -152,15 +151,16 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
 
         await self._validate_gitgud_status(inter,delta=None)
         handle, = await cf_common.resolve_handles(inter, self.converter, ('!' + str(inter.author),))
-        user = cf_common.user_db.fetch_cf_user(handle)
+        user = await cf_common.user_db.aio.fetch_cf_user(handle)
         rating = round(user.effective_rating, -2)
-        resp = await cf.user.rating(handle=handle)
+        resp = await cf_common.cache2.user_cache.get_rating_changes(handle)
         contests = {change.contestId for change in resp}
-        submissions = await cf.user.status(handle=handle)
-        solved = {sub.problem.name for sub in submissions if sub.verdict == 'OK'}
-        problems = [prob for prob in cf_common.cache2.problem_cache.problems
-                    if prob.name not in solved and prob.contestId in contests
-                    and ((prob.rating - rating) >= _GITGUD_MAX_NEG_DELTA_VALUE and (prob.rating - rating) <= _GITGUD_MAX_POS_DELTA_VALUE)]
+        masks = await cf_common.cache2.submission_cache.get_problem_masks(handle)
+        index = cf_common.cache2.problem_cache.index
+        mask = (index.contests_mask(contests) & ~masks.solved &
+                index.rating_mask(rating + _GITGUD_MAX_NEG_DELTA_VALUE,
+                                  rating + _GITGUD_MAX_POS_DELTA_VALUE))
+        problems = index.problems_in(mask)
 
         if not problems:
             return await inter.edit_original_message('Problems not found within the search parameters')
@@ -202,24 +202,22 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
 
         tags = list(tags.split())
         handle, = await cf_common.resolve_handles(inter, self.converter, ('!' + str(inter.author),))
-        if rating == None: rating = round(cf_common.user_db.fetch_cf_user(handle).effective_rating, -2)
+        if rating == None: rating = round((await cf_common.user_db.aio.fetch_cf_user(handle)).effective_rating, -2)
         if rating % 100 != 0: return await inter.edit_original_message('Problem rating should be a multiple of 100.')
 
-        submissions = await cf.user.status(handle=handle)
-        solved = {sub.problem.name for sub in submissions if sub.verdict == 'OK'}
+        masks = await cf_common.cache2.submission_cache.get_problem_masks(handle)
 
-        problems = [prob for prob in cf_common.cache2.problem_cache.problems
-                    if prob.rating == rating and prob.name not in solved and
-                    not cf_common.is_contest_writer(prob.contestId, handle)]
+        index = cf_common.cache2.problem_cache.index
+        mask = index.rating_mask(rating) & ~masks.solved
         if tags:
-            problems = [prob for prob in problems if prob.tag_matches(tags)]
+            mask &= index.tags_mask(tags)
+        # Already sorted by contest start time.
+        problems = [prob for prob in index.problems_in(mask)
+                    if not cf_common.is_contest_writer(prob.contestId, handle)]
 
         if not problems:
             return await inter.edit_original_message('Problems not found within the search parameters')
 
-        problems.sort(key=lambda problem: cf_common.cache2.contest_cache.get_contest(
-            problem.contestId).startTimeSeconds)
-
         choice = max([random.randrange(len(problems)) for _ in range(2)])
         problem = problems[choice]
 
@@ -249,27 +247,26 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         delta = int(delta)
         
         handles = await cf_common.resolve_handles(inter, self.converter, handles)
-        resp = [await cf.user.status(handle=handle) for handle in handles]
-        submissions = [sub for user in resp for sub in user]
-        solved = {sub.problem.name for sub in submissions}
-        info = await cf.user.info(handles=handles)
+        tried = 0
+        for masks in await cf_common.cache2.submission_cache.get_problem_masks_many(handles):
+            tried |= masks.tried
+        info = await cf_common.cache2.user_cache.get_info(handles)
         rating = int(round(sum(user.effective_rating for user in info) / len(handles), -2))
         rating += delta
         rating = max(800, rating)
         rating = min(3500, rating)
-        problems = [prob for prob in cf_common.cache2.problem_cache.problems
-                    if abs(prob.rating - rating) <= 300 and prob.name not in solved
-                    and not any(cf_common.is_contest_writer(prob.contestId, handle) for handle in handles)
-                    and not cf_common.is_nonstandard_problem(prob)]
+        index = cf_common.cache2.problem_cache.index
+        mask = (index.rating_mask(rating - 300, rating + 300) & ~tried &
+                ~index.nonstandard_mask)
         if tags:
-            problems = [prob for prob in problems if prob.tag_matches(tags)]
+            mask &= index.tags_mask(tags)
+        # Already sorted by contest start time.
+        problems = [prob for prob in index.problems_in(mask)
+                    if not any(cf_common.is_contest_writer(prob.contestId, handle) for handle in handles)]
 
         if len(problems) < 4:
             return await inter.edit_original_message('Problems not found within the search parameters')
 
-        problems.sort(key=lambda problem: cf_common.cache2.contest_cache.get_contest(
-            problem.contestId).startTimeSeconds)
-
         choices = []
         for i in range(4):
             k = max(random.randrange(len(problems) - i) for _ in range(2))
@@ -303,29 +300,21 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         await self._validate_gitgud_status(inter, delta)
 
         handle, = await cf_common.resolve_handles(inter, self.converter, ('!' + str(inter.author),))
-        user = cf_common.user_db.fetch_cf_user(handle)
+        user = await cf_common.user_db.aio.fetch_cf_user(handle)
         rating = round(user.effective_rating, -2)
         rating = max(rating, 1200)
-        submissions = await cf.user.status(handle=handle)
-        solved = {sub.problem.name for sub in submissions}
-        noguds = cf_common.user_db.get_noguds(inter.author.id)
-
-        problems = [prob for prob in cf_common.cache2.problem_cache.problems
-                    if (prob.rating == rating + delta and
-                        prob.name not in solved and
-                        prob.name not in noguds)]
-
-        def check(problem):
-            return (not cf_common.is_nonstandard_problem(problem) and
-                    not cf_common.is_contest_writer(problem.contestId, handle))
-
-        problems = list(filter(check, problems))
+        masks = await cf_common.cache2.submission_cache.get_problem_masks(handle)
+        noguds = await cf_common.user_db.aio.get_noguds(inter.author.id)
+
+        index = cf_common.cache2.problem_cache.index
+        mask = (index.rating_mask(rating + delta) & ~masks.tried &
+                ~index.names_mask(noguds) & ~index.nonstandard_mask)
+        # Already sorted by contest start time.
+        problems = [prob for prob in index.problems_in(mask)
+                    if not cf_common.is_contest_writer(prob.contestId, handle)]
         if not problems:
             return await inter.edit_original_message('No problem to assign')
 
-        problems.sort(key=lambda problem: cf_common.cache2.contest_cache.get_contest(
-            problem.contestId).startTimeSeconds)
-
         choice = max(random.randrange(len(problems)) for _ in range(2))
         await self._gitgud(inter, handle, problems[choice], delta)
 
@@ -358,7 +347,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
             return message, embed
 
         member = member or inter.author
-        data = cf_common.user_db.gitlog(member.id)
+        data = await cf_common.user_db.aio.gitlog(member.id)
         if not data: return await inter.edit_original_message(f'`{member}` has no gitgud history.')
 
         score = 0
@@ -379,11 +368,11 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
 
         handle, = await cf_common.resolve_handles(inter, self.converter, ('!' + str(inter.author),))
         user_id = inter.author.id
-        active = cf_common.user_db.check_challenge(user_id)
+        active = await cf_common.user_db.aio.check_challenge(user_id)
         if not active:
             return await inter.edit_original_message(f'You do not have an active challenge')
 
-        submissions = await cf.user.status(handle=handle)
+        submissions = await cf_common.cache2.submission_cache.get_submissions(handle)
         solved = {sub.problem.name for sub in submissions if sub.verdict == 'OK'}
 
         challenge_id, issue_time, name, contestId, index, delta = active
@@ -392,7 +381,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
 
         delta = _GITGUD_SCORE_DISTRIB[delta // 100 + 3]
         finish_time = int(datetime.datetime.now().timestamp())
-        rc = cf_common.user_db.complete_challenge(user_id, challenge_id, finish_time, delta)
+        rc = await cf_common.user_db.aio.complete_challenge(user_id, challenge_id, finish_time, delta)
         if rc == 1:
             duration = cf_common.pretty_time_format(finish_time - issue_time)
             await inter.edit_original_message(f'Challenge completed in {duration}. {handle} gained {delta} points.')
@@ -418,7 +407,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
             return await inter.edit_original_message('You don\'t have permission to skip other members\' gitgud challenge.')
 
         await cf_common.resolve_handles(inter, self.converter, ('!' + str(member),))
-        active = cf_common.user_db.check_challenge(member.id)
+        active = await cf_common.user_db.aio.check_challenge(member.id)
         if not active:
             revoker = 'You' if member == inter.author else f'`{member}`'
             return await inter.edit_original_message(f'{revoker} do not have an active challenge')
@@ -428,7 +417,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         if not has_perm and finish_time - issue_time < _GITGUD_NO_SKIP_TIME:
             skip_time = cf_common.pretty_time_format(issue_time + _GITGUD_NO_SKIP_TIME - finish_time)
             return await inter.edit_original_message(f'Think more. You can skip your challenge in {skip_time}.')
-        rc = cf_common.user_db.skip_challenge(member.id, challenge_id, Gitgud.NOGUD)
+        rc = await cf_common.user_db.aio.skip_challenge(member.id, challenge_id, Gitgud.NOGUD)
         if rc == 1:
             await inter.edit_original_message(f'Challenge skipped.')
         else:
@@ -452,7 +441,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         handles = list(handles.split())
 
         handles = await cf_common.resolve_handles(inter, self.converter, handles, maxcnt=25)
-        info = await cf.user.info(handles=handles)
+        info = await cf_common.cache2.user_cache.get_info(handles)
         contests = cf_common.cache2.contest_cache.get_contests_in_phase('FINISHED')
 
         if not pattern:
@@ -499,7 +488,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
 
     async def register(self, member: disnake.Member):
         """Register a duelist"""
-        rc = cf_common.user_db.register_duelist(member.id)
+        rc = await cf_common.user_db.aio.register_duelist(member.id)
 
     @duel.sub_command(description='Challenge another server member to a duel')
     async def challenge(self, inter, opponent: disnake.Member, rating: commands.Range[800, 3500] = None):
@@ -516,40 +505,43 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
 
         await cf_common.resolve_handles(inter, self.converter, ('!' + str(inter.author), '!' + str(opponent)))
         userids = [challenger_id, challengee_id]
-        handles = [cf_common.user_db.get_handle(
+        handles = [await cf_common.user_db.aio.get_handle(
             userid, inter.guild.id) for userid in userids]
-        submissions = [await cf.user.status(handle=handle) for handle in handles]
+        all_masks = await cf_common.cache2.submission_cache.get_problem_masks_many(handles)
 
-        if not cf_common.user_db.is_duelist(challenger_id):
+        if not await cf_common.user_db.aio.is_duelist(challenger_id):
             await self.register(inter.author)
-        if not cf_common.user_db.is_duelist(challengee_id):
+        if not await cf_common.user_db.aio.is_duelist(challengee_id):
             await self.register(opponent)
 
         if challenger_id == challengee_id:
             return await inter.edit_original_message(
                 f'{inter.author.mention}, you cannot challenge yourself!')
-        if cf_common.user_db.check_duel_challenge(challenger_id):
+        if await cf_common.user_db.aio.check_duel_challenge(challenger_id):
             return await inter.edit_original_message(
                 f'{inter.author.mention}, you are currently in a duel!')
-        if cf_common.user_db.check_duel_challenge(challengee_id):
+        if await cf_common.user_db.aio.check_duel_challenge(challengee_id):
             return await inter.edit_original_message(
                 f'`{opponent}` is currently in a duel!')
 
-        users = [cf_common.user_db.fetch_cf_user(handle) for handle in handles]
+        users = [await cf_common.user_db.aio.fetch_cf_user(handle) for handle in handles]
         lowest_rating = min(user.rating or 0 for user in users)
         suggested_rating = max(round(lowest_rating, -2) - 200, 800)
         rating = round(rating, -2) if rating else suggested_rating
 
-        solved = {
-            sub.problem.name for subs in submissions for sub in subs if sub.verdict != 'COMPILATION_ERROR'}
+        compiled = 0
+        for masks in all_masks:
+            compiled |= masks.compiled
         seen = {name for userid in userids for name,
-                in cf_common.user_db.get_duel_problem_names(userid)}
+                in await cf_common.user_db.aio.get_duel_problem_names(userid)}
+
+        index = cf_common.cache2.problem_cache.index
+        candidates_mask = ~compiled & ~index.names_mask(seen) & ~index.nonstandard_mask
 
         def get_problems(rating):
-            return [prob for prob in cf_common.cache2.problem_cache.problems
-                    if prob.rating == rating and prob.name not in solved and prob.name not in seen
-                    and not any(cf_common.is_contest_writer(prob.contestId, handle) for handle in handles)
-                    and not cf_common.is_nonstandard_problem(prob)]
+            # Already sorted by contest start time.
+            return [prob for prob in index.problems_in(index.rating_mask(rating) & candidates_mask)
+                    if not any(cf_common.is_contest_writer(prob.contestId, handle) for handle in handles)]
 
         problems = []
         for problems in map(get_problems, range(rating, 400, -100)):
@@ -560,54 +552,51 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
             return await inter.edit_original_message(
                 f'No unsolved {rating} rated problems left for `{handles[0]}` vs `{handles[1]}`.')
 
-        problems.sort(key=lambda problem: cf_common.cache2.contest_cache.get_contest(
-            problem.contestId).startTimeSeconds)
-
         choice = max(random.randrange(len(problems)) for _ in range(2))
         problem = problems[choice]
 
         issue_time = datetime.datetime.now().timestamp()
-        duelid = cf_common.user_db.create_duel(
+        duelid = await cf_common.user_db.aio.create_duel(
             challenger_id, challengee_id, issue_time, problem, DuelType.OFFICIAL)
 
         await inter.edit_original_message(f'{inter.author.mention} is challenging {opponent.mention} to a {rating} rated duel!\nType `/duel accept` to accept or `/duel decline` to decline the challenge.')
         await asyncio.sleep(_DUEL_EXPIRY_TIME)
-        if cf_common.user_db.cancel_duel(duelid, Duel.EXPIRED):
+        if await cf_common.user_db.aio.cancel_duel(duelid, Duel.EXPIRED):
             await inter.channel.send(f'{inter.author.mention}, your request to duel `{opponent}` has expired!')
 
     @duel.sub_command(description='Decline a duel')
     async def decline(self, inter):
         await inter.response.defer()
 
-        active = cf_common.user_db.check_duel_decline(inter.author.id)
+        active = await cf_common.user_db.aio.check_duel_decline(inter.author.id)
         if not active:
             return await inter.edit_original_message(
                 f'{inter.author.mention}, you are not being challenged!')
 
         duelid, challenger = active
         challenger = inter.guild.get_member(challenger)
-        cf_common.user_db.cancel_duel(duelid, Duel.DECLINED)
+        await cf_common.user_db.aio.cancel_duel(duelid, Duel.DECLINED)
         await inter.edit_original_message(f'{inter.author.mention} declined a challenge by {challenger.mention}.')
 
     @duel.sub_command(description='Withdraw a challenge')
     async def withdraw(self, inter):
         await inter.response.defer()
 
-        active = cf_common.user_db.check_duel_withdraw(inter.author.id)
+        active = await cf_common.user_db.aio.check_duel_withdraw(inter.author.id)
         if not active:
             return await inter.edit_original_message(
                 f'{inter.author.mention}, you are not challenging anyone.')
 
         duelid, challengee = active
         challengee = inter.guild.get_member(challengee)
-        cf_common.user_db.cancel_duel(duelid, Duel.WITHDRAWN)
+        await cf_common.user_db.aio.cancel_duel(duelid, Duel.WITHDRAWN)
         await inter.edit_original_message(f'{inter.author.mention} withdrew a challenge to `{challengee}`.')
 
     @duel.sub_command(description='Accept a duel')
     async def accept(self, inter):
         await inter.response.defer()
 
-        active = cf_common.user_db.check_duel_accept(inter.author.id)
+        active = await cf_common.user_db.aio.check_duel_accept(inter.author.id)
         if not active:
             return await inter.edit_original_message(f'{inter.author.mention}, you are not being challenged.')
 
@@ -617,7 +606,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         await asyncio.sleep(15)
 
         start_time = datetime.datetime.now().timestamp()
-        rc = cf_common.user_db.start_duel(duelid, start_time)
+        rc = await cf_common.user_db.aio.start_duel(duelid, start_time)
         if rc != 1: return await inter.channel.send(embed = discord_common.embed_alert(f'Unable to start the duel between {challenger.mention} and {inter.author.mention}.'))
 
         problem = cf_common.cache2.problem_cache.problem_by_name[name]
@@ -632,7 +621,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
     async def complete(self, inter):
         await inter.response.defer()
 
-        active = cf_common.user_db.check_duel_complete(inter.author.id)
+        active = await cf_common.user_db.aio.check_duel_complete(inter.author.id)
         if not active: return await inter.edit_original_message(f'{inter.author.mention}, you are not in a duel.')
 
         duelid, challenger_id, challengee_id, start_time, problem_name, contest_id, index, dtype = active
@@ -644,8 +633,8 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         TESTING = -1
 
         async def get_solve_time(userid):
-            handle = cf_common.user_db.get_handle(userid, inter.guild.id)
-            subs = [sub for sub in await cf.user.status(handle=handle)
+            handle = await cf_common.user_db.aio.get_handle(userid, inter.guild.id)
+            subs = [sub for sub in await cf_common.cache2.submission_cache.get_submissions(handle)
                     if (sub.verdict == 'OK' or sub.verdict == 'TESTING')
                     and sub.problem.contestId == contest_id
                     and sub.problem.index == index]
@@ -669,18 +658,18 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
                 winner = challenger_id if challenger_time < challengee_time else challengee_id
                 loser  = challenger_id if challenger_time > challengee_time else challengee_id
                 win_status = Winner.CHALLENGER if winner == challenger_id else Winner.CHALLENGEE
-                embed = complete_duel(duelid, inter.guild.id, win_status, winner, loser, min(challenger_time, challengee_time), 1, dtype)
+                embed = await complete_duel(duelid, inter.guild.id, win_status, winner, loser, min(challenger_time, challengee_time), 1, dtype)
                 await inter.edit_original_message(f'Both <@{winner}> and <@{loser}> solved it but <@{winner}> was {diff} faster!', embed=embed)
             else:
-                embed = complete_duel(duelid, inter.guild.id, Winner.DRAW, challenger_id, challengee_id, challenger_time, 0.5, dtype)
+                embed = await complete_duel(duelid, inter.guild.id, Winner.DRAW, challenger_id, challengee_id, challenger_time, 0.5, dtype)
                 await inter.edit_original_message(f"<@{challenger_id}> and <@{challengee_id}> solved the problem in the exact same amount of time! It's a draw!", embed=embed)
         elif challenger_time:
             diff = cf_common.pretty_time_format(abs(challenger_time - start_time), always_seconds=True)
-            embed = complete_duel(duelid, inter.guild.id, Winner.CHALLENGER, challenger_id, challengee_id, challenger_time, 1, dtype)
+            embed = await complete_duel(duelid, inter.guild.id, Winner.CHALLENGER, challenger_id, challengee_id, challenger_time, 1, dtype)
             await inter.edit_original_message(f'<@{challenger_id}> beat <@{challengee_id}> in a duel after {diff}!', embed=embed)
         elif challengee_time:
             diff = cf_common.pretty_time_format(abs(challengee_time - start_time), always_seconds=True)
-            embed = complete_duel(duelid, inter.guild.id, Winner.CHALLENGEE, challengee_id, challenger_id, challengee_time, 1, dtype)
+            embed = await complete_duel(duelid, inter.guild.id, Winner.CHALLENGEE, challengee_id, challenger_id, challengee_time, 1, dtype)
             await inter.edit_original_message(f'<@{challengee_id}> beat <@{challenger_id}> in a duel after {diff}!', embed=embed)
         else:
             await inter.edit_original_message('Nobody solved the problem yet.')
@@ -689,7 +678,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
     async def draw(self, inter):
         await inter.response.defer()
 
-        active = cf_common.user_db.check_duel_draw(inter.author.id)
+        active = await cf_common.user_db.aio.check_duel_draw(inter.author.id)
         if not active: return await inter.edit_original_message(f'{inter.author.mention}, you are not in a duel.')
 
         duelid, challenger_id, challengee_id, start_time, dtype = active
@@ -704,7 +693,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
             offeree_id = challenger_id if inter.author.id != challenger_id else challengee_id
             offeree = inter.guild.get_member(offeree_id)
             if offeree == None:
-                cf_common.user_db.invalidate_duel(duelid)
+                await cf_common.user_db.aio.invalidate_duel(duelid)
                 return await inter.edit_original_message(f'You can offer draw because your challenger is in this server. If you can\'t complete this duel challenge, please try `/duel invalidate`')
             return await inter.edit_original_message(f'{inter.author.mention} is offering a draw to {offeree.mention}!')
 
@@ -712,7 +701,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
             return await inter.edit_original_message(f'{inter.author.mention}, you\'ve already offered a draw.')
 
         offerer = inter.guild.get_member(self.draw_offers[duelid])
-        embed = complete_duel(duelid, inter.guild.id, Winner.DRAW, offerer.id, inter.author.id, now, 0.5, dtype)
+        embed = await complete_duel(duelid, inter.guild.id, Winner.DRAW, offerer.id, inter.author.id, now, 0.5, dtype)
         await inter.edit_original_message(f'{inter.author.mention} accepted draw offer by {offerer.mention}.', embed=embed)
 
     @duel.sub_command(description='Show duelist profile')
@@ -725,30 +714,30 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         await inter.response.defer()
 
         member = member or inter.author
-        if not cf_common.user_db.is_duelist(member.id):
+        if not await cf_common.user_db.aio.is_duelist(member.id):
             await self.register(member)
 
-        user = get_cf_user(member.id, inter.guild.id)
+        user = await get_cf_user(member.id, inter.guild.id)
         if not user:
             embed = discord_common.embed_neutral(f'Handle for `{member}` not found in database')
             return await inter.edit_original_message(embed = embed)
 
-        rating = cf_common.user_db.get_duel_rating(member.id)
+        rating = await cf_common.user_db.aio.get_duel_rating(member.id)
         desc = f'Duelist profile of {rating2rank(rating).title} {member.mention} aka **[{user.handle}]({user.url})**'
         embed = disnake.Embed(
             description=desc, color=rating2rank(rating).color_embed)
         embed.add_field(name='Rating', value=rating, inline=True)
 
-        wins = cf_common.user_db.get_duel_wins(member.id)
+        wins = await cf_common.user_db.aio.get_duel_wins(member.id)
         num_wins = len(wins)
         embed.add_field(name='Wins', value=num_wins, inline=True)
-        num_losses = cf_common.user_db.get_num_duel_losses(member.id)
+        num_losses = await cf_common.user_db.aio.get_num_duel_losses(member.id)
         embed.add_field(name='Losses', value=num_losses, inline=True)
-        num_draws = cf_common.user_db.get_num_duel_draws(member.id)
+        num_draws = await cf_common.user_db.aio.get_num_duel_draws(member.id)
         embed.add_field(name='Draws', value=num_draws, inline=True)
-        num_declined = cf_common.user_db.get_num_duel_declined(member.id)
+        num_declined = await cf_common.user_db.aio.get_num_duel_declined(member.id)
         embed.add_field(name='Declined', value=num_declined, inline=True)
-        num_rdeclined = cf_common.user_db.get_num_duel_rdeclined(member.id)
+        num_rdeclined = await cf_common.user_db.aio.get_num_duel_rdeclined(member.id)
         embed.add_field(name='Got declined', value=num_rdeclined, inline=True)
 
         def duel_to_string(duel):
@@ -818,7 +807,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         await inter.response.defer()
 
         member = member or inter.author
-        data = cf_common.user_db.get_duels(member.id)
+        data = await cf_common.user_db.aio.get_duels(member.id)
         pages = await self._paginate_duels(
             data, f'Dueling history of {member.display_name}', inter, False)
         await paginator.paginate(self.bot, 'edit', inter, pages,
@@ -829,7 +818,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
     async def recent(self, inter):
         await inter.response.defer()
 
-        data = cf_common.user_db.get_recent_duels()
+        data = await cf_common.user_db.aio.get_recent_duels()
         pages = await self._paginate_duels(
             data, 'List of recent duels', inter, True)
         await paginator.paginate(self.bot, 'edit', inter, pages,
@@ -857,7 +846,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
             embed = discord_common.cf_color_embed(description=log_str)
             return message, embed
 
-        fake_data = cf_common.user_db.get_ongoing_duels()
+        fake_data = await cf_common.user_db.aio.get_ongoing_duels()
         data = []
 
         for d in fake_data:
@@ -880,10 +869,10 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         await inter.response.defer()
 
         users = [(inter.guild.get_member(user_id), rating)
-                 for user_id, rating in cf_common.user_db.get_duelists()]
-        users = [(member, cf_common.user_db.get_handle(member.id, inter.guild.id), rating)
+                 for user_id, rating in await cf_common.user_db.aio.get_duelists()]
+        users = [(member, await cf_common.user_db.aio.get_handle(member.id, inter.guild.id), rating)
                  for member, rating in users
-                 if member is not None and cf_common.user_db.get_num_duel_completed(member.id) > 0]
+                 if member is not None and await cf_common.user_db.aio.get_num_duel_completed(member.id) > 0]
 
         _PER_PAGE = 10
 
@@ -915,7 +904,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
                            wait_time=5 * 60, set_pagenum_footers=True)
 
     async def invalidate_duel(self, inter, duelid, challenger_id, challengee_id):
-        rc = cf_common.user_db.invalidate_duel(duelid)
+        rc = await cf_common.user_db.aio.invalidate_duel(duelid)
         if rc == 0:
             return await inter.edit_original_message(f'Unable to invalidate duel {duelid}.')
 
@@ -941,7 +930,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         if not has_perm and member != inter.author:
             return await inter.edit_original_message(f'You don\'t have permission to invalidate other members\' duel.')
 
-        active = cf_common.user_db.check_duel_complete(member.id)
+        active = await cf_common.user_db.aio.check_duel_complete(member.id)
         if not active: return await inter.edit_original_message(f'Member `{member}` is not in a duel.')
 
         duelid, challenger_id, challengee_id, start_time, _, _, _, _ = active
@@ -962,7 +951,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
 
         if member == None: member = inter.author
         duelists = [member.id]
-        duels = cf_common.user_db.get_complete_official_duels()
+        duels = await cf_common.user_db.aio.get_complete_official_duels()
         rating = dict()
         plot_data = defaultdict(list)
         time_tick = 0
@@ -990,7 +979,7 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
         if time_tick == 0:
             return await inter.edit_original_message(f'Nothing to plot.')
 
-        plt.clf()
+        spec = gc.PlotSpec()
         # plot at least from mid gray to mid purple
         min_rating = 1350
         max_rating = 1550
@@ -1000,16 +989,16 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
                 max_rating = max(max_rating, rating)
 
             x, y = zip(*rating_data)
-            plt.plot(x, y,
-                     linestyle='-',
-                     marker='o',
-                     markersize=2,
-                     markerfacecolor='white',
-                     markeredgewidth=0.5)
+            spec.plot(x, y,
+                      linestyle='-',
+                      marker='o',
+                      markersize=2,
+                      markerfacecolor='white',
+                      markeredgewidth=0.5)
 
-        gc.plot_rating_bg(DUEL_RANKS)
-        plt.xlim(0, time_tick - 1)
-        plt.ylim(min_rating - 100, max_rating + 100)
+        spec.rating_bg(DUEL_RANKS)
+        spec.set_xlim(0, time_tick - 1)
+        spec.set_ylim(min_rating - 100, max_rating + 100)
 
         labels = [
             gc.StrWrap('{} ({})'.format(
@@ -1017,9 +1006,9 @@ class Codeforces(commands.Cog, description = "Ask for or challenge your friends
                 rating_data[-1][1]))
             for duelist, rating_data in plot_data.items()
         ]
-        plt.legend(labels, loc='upper left', prop=gc.fontprop)
+        spec.legend(labels, loc='upper left', prop=gc.fontprop)
 
-        discord_file = gc.get_current_figure_as_file()
+        discord_file = await gc.render_file(spec)
         embed = discord_common.cf_color_embed(title='Duel rating graph')
         discord_common.attach_image(embed, discord_file)
         discord_common.set_author_footer(embed, inter.author)
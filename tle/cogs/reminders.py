@@ -187,7 +187,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
 
     async def _update_task(self):
         self.logger.info(f'Updating reminder tasks.')
-        self._generate_contest_cache()
+        await self._generate_contest_cache()
         contest_cache = self.contest_cache
         current_time = dt.datetime.utcnow()
 
@@ -215,12 +215,12 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         self.start_time_map.clear()
         for contest in self.future_contests:
             self.start_time_map[time.mktime(contest.start_time.timetuple())].append(contest)
-        self._reschedule_all_tasks()
+        await self._reschedule_all_tasks()
         await asyncio.sleep(_CONTEST_REFRESH_PERIOD)
         asyncio.create_task(self._update_task())
 
-    def _generate_contest_cache(self):
-        clist.cache(forced=False)
+    async def _generate_contest_cache(self):
+        await clist.cache(forced=False)
         db_file = Path(constants.CONTESTS_DB_FILE_PATH)
         with db_file.open() as f:
             data = json.load(f)
@@ -230,16 +230,6 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
                 _WEBSITE_ALLOWED_PATTERNS,
                 _WEBSITE_DISALLOWED_PATTERNS)]
 
-    def get_guild_contests(self, contests, guild_id):
-        settings = cf_common.user_db.get_reminder_settings(guild_id)
-        if not settings: return []
-        _, _, _, website_allowed_patterns, website_disallowed_patterns = settings
-        website_allowed_patterns = json.loads(website_allowed_patterns) if settings else _WEBSITE_ALLOWED_PATTERNS
-        website_disallowed_patterns = json.loads(website_disallowed_patterns) if settings else _WEBSITE_DISALLOWED_PATTERNS
-        contests = [contest for contest in contests if contest.is_desired(
-            website_allowed_patterns, website_disallowed_patterns)]
-        return contests
-
     def get_all_contests(self, contests, guild_id, resources=None):
         website_allowed_patterns = _WEBSITE_ALLOWED_PATTERNS
         website_disallowed_patterns = _WEBSITE_DISALLOWED_PATTERNS
@@ -247,17 +237,19 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
             website_allowed_patterns, website_disallowed_patterns, resources)]
         return contests
 
-    def _reschedule_all_tasks(self):
+    async def _reschedule_all_tasks(self):
         for guild in self.bot.guilds:
-            self._reschedule_tasks(guild.id)
+            await self._reschedule_tasks(guild.id)
 
-    def _reschedule_tasks(self, guild_id):
+    async def _reschedule_tasks(self, guild_id):
+        settings = await cf_common.user_db.aio.get_reminder_settings(guild_id)
+        localtimezone = await cf_common.user_db.aio.get_guildtz(guild_id)
+        # Nothing is awaited from here on, so a concurrent reschedule cannot leave tasks behind.
         for task in self.task_map[guild_id]:
             task.cancel()
         self.task_map[guild_id].clear()
         if not self.start_time_map:
             return
-        settings = cf_common.user_db.get_reminder_settings(guild_id)
         if settings is None or any(setting is None for setting in settings):
             return
         channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns = settings
@@ -266,13 +258,13 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         website_allowed_patterns = json.loads(website_allowed_patterns)
         website_disallowed_patterns = json.loads(website_disallowed_patterns)
 
-        localtimezone = cf_common.user_db.get_guildtz(guild_id)
         localtimezone = pytz.timezone(localtimezone or 'Asia/Dhaka')
 
         guild = self.bot.get_guild(guild_id)
         channel, role = guild.get_channel(channel_id), guild.get_role(role_id)
         for start_time, contests in self.start_time_map.items():
-            contests = self.get_guild_contests(contests, guild_id)
+            contests = [contest for contest in contests if contest.is_desired(
+                website_allowed_patterns, website_disallowed_patterns)]
             if not contests:
                 continue
             for before_mins in before:
@@ -306,7 +298,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         if len(contests) == 0:
             return await inter.edit_original_message(embed=discord_common.embed_neutral(empty_msg))
 
-        zone = cf_common.user_db.get_guildtz(inter.guild.id)
+        zone = await cf_common.user_db.aio.get_guildtz(inter.guild.id)
         zone = pytz.timezone(zone or 'Asia/Kolkata')
 
         pages = self._make_contest_pages(contests, title, zone)
@@ -353,14 +345,14 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
 
         before = [before]
         _, _, _, default_allowed_patterns, default_disallowed_patterns = get_default_guild_settings()
-        cf_common.user_db.set_reminder_settings(
+        await cf_common.user_db.aio.set_reminder_settings(
             inter.guild.id, inter.channel.id, role.id, json.dumps(before),
                 json.dumps(default_allowed_patterns),
                 json.dumps(default_disallowed_patterns)
             )
         message = f'Contest reminder has successfully been enabled in this channel {inter.channel.mention}.\nType `/remind settings` to show current settings.'
         await inter.edit_original_message(embed=discord_common.embed_success(message))
-        self._reschedule_tasks(inter.guild.id)
+        await self._reschedule_tasks(inter.guild.id)
 
     @remind.sub_command(description='Set contest reminder in a specified channel')
     @commands.check_any(discord_common.is_guild_owner(), commands.has_permissions(administrator = True), commands.is_owner())
@@ -380,23 +372,23 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
 
         before = [before]
         _, _, _, default_allowed_patterns, default_disallowed_patterns = get_default_guild_settings()
-        cf_common.user_db.set_reminder_settings(
+        await cf_common.user_db.aio.set_reminder_settings(
             inter.guild.id, channel.id, role.id, json.dumps(before),
                 json.dumps(default_allowed_patterns),
                 json.dumps(default_disallowed_patterns)
             )
         message = f'Contest reminder has successfully been enabled in channel {channel.mention}.\nType `/remind settings` to show current settings.'
         await inter.edit_original_message(embed=discord_common.embed_success(message))
-        self._reschedule_tasks(inter.guild.id)
+        await self._reschedule_tasks(inter.guild.id)
 
-    def _set_guild_setting(
+    async def _set_guild_setting(
             self,
             guild_id,
             websites,
             allowed_patterns,
             disallowed_patterns):
         # load settings
-        settings = cf_common.user_db.get_reminder_settings(guild_id)
+        settings = await cf_common.user_db.aio.get_reminder_settings(guild_id)
         channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns = settings
         channel_id, role_id, before = int(channel_id), int(role_id), json.loads(before)
         website_allowed_patterns = json.loads(website_allowed_patterns)
@@ -411,7 +403,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
             website_disallowed_patterns[website] = disallowed_patterns[website]
             supported_websites.append(website)
         # save settings
-        cf_common.user_db.set_reminder_settings(
+        await cf_common.user_db.aio.set_reminder_settings(
             guild_id, channel_id, role_id, json.dumps(before),
                 json.dumps(website_allowed_patterns),
                 json.dumps(website_disallowed_patterns)
@@ -420,11 +412,11 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
 
     async def subscribe(self, guild_id, websites):
         """Start contest reminders from websites."""
-        self._set_guild_setting(guild_id, websites, _WEBSITE_ALLOWED_PATTERNS, _WEBSITE_DISALLOWED_PATTERNS)
+        await self._set_guild_setting(guild_id, websites, _WEBSITE_ALLOWED_PATTERNS, _WEBSITE_DISALLOWED_PATTERNS)
 
     async def unsubscribe(self, guild_id, websites):
         """Stop contest reminders from websites."""
-        self._set_guild_setting(guild_id, websites, defaultdict(list), defaultdict(lambda: ['']))
+        await self._set_guild_setting(guild_id, websites, defaultdict(list), defaultdict(lambda: ['']))
 
     @remind.sub_command_group(description='Configure contest reminder settings')
     @commands.check_any(discord_common.is_guild_owner(), commands.has_permissions(administrator = True), commands.is_owner())
@@ -436,7 +428,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
     async def general_settings(self, inter, channel: disnake.TextChannel = None, role: disnake.Role = None, before: commands.Range[0, ...] = None):
         await inter.response.defer(ephemeral = True)
 
-        settings = cf_common.user_db.get_reminder_settings(inter.guild.id)
+        settings = await cf_common.user_db.aio.get_reminder_settings(inter.guild.id)
         if settings is None:
             return await inter.edit_original_message(embed=discord_common.embed_neutral('Contest reminder hasn\'t been set.\nYou may want to set a reminder by typing `/remind here` or `/remind inchannel`.'))
 
@@ -446,20 +438,20 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         before = [before] if before else json.loads(old_before)
         if not await self._verify_reminder_settings(inter, channel, role): return
 
-        cf_common.user_db.set_reminder_settings(
+        await cf_common.user_db.aio.set_reminder_settings(
             inter.guild.id, channel.id, role.id, json.dumps(before),
             website_allowed_patterns, website_disallowed_patterns
         )
         message = f'Contest reminder has successfully been updated!\nType `/remind settings` to show new settings.'
         await inter.edit_original_message(embed = discord_common.embed_success(message))
-        self._reschedule_tasks(inter.guild.id)
+        await self._reschedule_tasks(inter.guild.id)
 
     @config.sub_command(description='Change websites for contest reminder')
     @commands.check_any(discord_common.is_guild_owner(), commands.has_permissions(administrator = True), commands.is_owner())
     async def websites(self, inter):
         await inter.response.defer(ephemeral = True)
 
-        settings = cf_common.user_db.get_reminder_settings(inter.guild.id)
+        settings = await cf_common.user_db.aio.get_reminder_settings(inter.guild.id)
         if settings is None:
             return await inter.edit_original_message(embed=discord_common.embed_neutral(
                 'You have to set a contest reminder for your server in advance.\n'
@@ -484,21 +476,21 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
             await self.unsubscribe(inter.guild.id, _SUPPORTED_WEBSITES)
             await self.subscribe(inter.guild.id, select.values)
             await self._settings(inter)
-            self._reschedule_tasks(inter.guild.id)
+            await self._reschedule_tasks(inter.guild.id)
         select.callback = select_callback
 
         select_all = disnake.ui.Button(label = 'Select all', style = disnake.ButtonStyle.blurple)
         async def select_all_callback(_):
             await self.subscribe(inter.guild.id, _SUPPORTED_WEBSITES)
             await self._settings(inter)
-            self._reschedule_tasks(inter.guild.id)
+            await self._reschedule_tasks(inter.guild.id)
         select_all.callback = select_all_callback
 
         unselect_all = disnake.ui.Button(label = 'Unselect all', style = disnake.ButtonStyle.red)
         async def unselect_all_callback(_):
             await self.unsubscribe(inter.guild.id, _SUPPORTED_WEBSITES)
             await self._settings(inter)
-            self._reschedule_tasks(inter.guild.id)
+            await self._reschedule_tasks(inter.guild.id)
         unselect_all.callback = unselect_all_callback
 
         view = disnake.ui.View()
@@ -510,7 +502,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
         await inter.edit_original_message(content = content, view = view)
 
     async def _settings(self, inter):
-        settings = cf_common.user_db.get_reminder_settings(inter.guild.id)
+        settings = await cf_common.user_db.aio.get_reminder_settings(inter.guild.id)
         if settings is None:
             return await inter.edit_original_message(embed=discord_common.embed_neutral('Contest reminder hasn\'t been set.\nYou may want to set a reminder by typing `/remind here` or `/remind inchannel`.'), view = None)
         channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns = settings
@@ -553,9 +545,9 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
     async def disable(self, inter):
         await inter.response.defer()
 
-        cf_common.user_db.clear_reminder_settings(inter.guild.id)
+        await cf_common.user_db.aio.clear_reminder_settings(inter.guild.id)
         await inter.edit_original_message(embed=discord_common.embed_success('Reminder settings cleared'))
-        self._reschedule_tasks(inter.guild.id)
+        await self._reschedule_tasks(inter.guild.id)
 
     @commands.slash_command(description='Set the server\'s timezone', usage=' <timezone>')
     @commands.check_any(discord_common.is_guild_owner(), commands.has_permissions(administrator = True), commands.is_owner())
@@ -575,7 +567,7 @@ class Reminders(commands.Cog, description = "Follow upcoming CP contests with ou
             desc += 'Examples of valid timezones:\n'
             desc += '```\n' + '\n'.join(random.sample(pytz.all_timezones, 5)) + '\n```'
             return await inter.edit_original_message(embed=discord_common.embed_alert(desc))
-        cf_common.user_db.set_guildtz(inter.guild.id, str(pytz.timezone(timezone)))
+        await cf_common.user_db.aio.set_guildtz(inter.guild.id, str(pytz.timezone(timezone)))
         await inter.edit_original_message(embed=discord_common.embed_success(
             f'Succesfully set the server timezone to {timezone}'))
 
@@ -6,10 +6,29 @@ LOGS_DIR = 'logs'
 ASSETS_DIR = os.path.join(DATA_DIR, 'assets')
 DB_DIR = os.path.join(DATA_DIR, 'db')
 MISC_DIR = os.path.join(DATA_DIR, 'misc')
-TEMP_DIR = os.path.join(DATA_DIR, 'temp')
 
 USER_DB_FILE_PATH = os.path.join(DB_DIR, 'user.db')
 CACHE_DB_FILE_PATH = os.path.join(DB_DIR, 'cache.db')
+SUBMISSION_DB_FILE_PATH = os.path.join(DB_DIR, 'submission.db')
+
+# Minimum number of seconds between two uploads of a database to Firebase.
+DB_BACKUP_INTERVAL = int(os.environ.get('DB_BACKUP_INTERVAL', 10 * 60))
+# Directory to keep database backups in when there is no Firebase bucket.
+BACKUP_DIR_PATH = os.environ.get('BACKUP_DIR')
+# Number of threads running database reads. Writes run one at a time on a thread of their own.
+DB_THREADS = 4
+# Number of processes drawing plots.
+PLOT_WORKERS = int(os.environ.get('PLOT_WORKERS', 2))
+# Image format of plots, png or webp. WebP images are lossless and smaller, but take longer to
+# encode. Plots fall back to PNG where Pillow has no WebP support.
+PLOT_FORMAT = os.environ.get('PLOT_FORMAT', 'png').lower()
+# Resolution of plots in dots per inch.
+PLOT_DPI = int(os.environ.get('PLOT_DPI', 100))
+# zlib compression level of PNG plots, from 0 for the fastest to 9 for the smallest.
+PLOT_PNG_COMPRESSION = int(os.environ.get('PLOT_PNG_COMPRESSION', 6))
+# Keep a columnar copy of the rating history in memory, at a cost of about 30 bytes per
+# rating change.
+RATING_HISTORY_INDEX = os.environ.get('RATING_HISTORY_INDEX', '').lower() in ('1', 'true')
 
 FONTS_DIR = os.path.join(ASSETS_DIR, 'fonts')
 
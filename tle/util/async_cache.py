@@ -0,0 +1,142 @@
+import asyncio
+import functools
+import sys
+import time
+from collections import namedtuple, OrderedDict
+
+# Containers longer than this are sized from an evenly spaced sample of their items.
+_SIZE_SAMPLE = 16
+
+_caches = []
+
+CacheStats = namedtuple('CacheStats', 'name hits misses coalesced entries size max_size')
+
+
+def approx_size(obj):
+    """Estimates the memory used by obj and everything it holds, in bytes."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        items = list(obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        items = obj if isinstance(obj, (list, tuple)) else list(obj)
+    else:
+        return size
+    if not items:
+        return size
+    step = max(1, len(items) // _SIZE_SAMPLE)
+    sample = items[::step]
+    return size + len(items) * sum(map(approx_size, sample)) // len(sample)
+
+
+def cache_stats():
+    """Returns the stats of every `AsyncCache`."""
+    return [cache.stats() for cache in _caches]
+
+
+class AsyncCache:
+    """LRU cache of values produced by coroutines, such as the results of API queries.
+
+    Entries are dropped `ttl` seconds after they were stored, and the least recently used ones
+    are dropped once the approximate size of all values goes over `max_size` bytes. Concurrent
+    lookups of a key that is not cached share a single fetch, which is all the cache does if
+    `ttl` is 0. Values are handed out to every caller, so they must not be mutated.
+    """
+
+    def __init__(self, name, *, ttl, max_size):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        # key -> (time stored, expiry time, size, value)
+        self._entries = OrderedDict()
+        # key -> (task fetching it, index of the key in the result of the task)
+        self._pending = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        _caches.append(self)
+
+    async def get(self, key, fetch, *, ttl=None, max_age=None):
+        """Returns the value for key, which is `await fetch()` if it has to be fetched.
+
+        `ttl` overrides how long a fetched value is kept, and a cached value older than
+        `max_age` seconds is fetched again.
+        """
+        async def fetch_one(keys):
+            return [await fetch()]
+        value, = await self.get_many([key], fetch_one, ttl=ttl, max_age=max_age)
+        return value
+
+    async def get_many(self, keys, fetch_many, *, ttl=None, max_age=None):
+        """Same as `get` for several keys. The keys that are neither cached nor being fetched
+        are fetched together by `await fetch_many(keys)`, which returns their values in the
+        same order. Values are returned in the order of `keys`."""
+        now = time.monotonic()
+        values = {}
+        waiting = set()
+        missing = []
+        for key in keys:
+            if key in values or key in waiting:
+                continue
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored, expiry, _, value = entry
+                if now < expiry and (max_age is None or now - stored <= max_age):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    values[key] = value
+                    continue
+            if key in self._pending:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                missing.append(key)
+            waiting.add(key)
+
+        if missing:
+            task = asyncio.ensure_future(fetch_many(missing))
+            task.add_done_callback(functools.partial(self._store, missing, ttl))
+            for i, key in enumerate(missing):
+                self._pending[key] = task, i
+        # Fetches that are done are no longer pending, so look them all up before waiting.
+        fetches = {key: self._pending[key] for key in waiting}
+        for key, (task, i) in fetches.items():
+            # The fetch goes on for the other callers if this one is cancelled.
+            values[key] = (await asyncio.shield(task))[i]
+        return [values[key] for key in keys]
+
+    def invalidate(self, key):
+        """Drops the cached value for key, if any."""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return CacheStats(self.name, self.hits, self.misses, self.coalesced, len(self._entries),
+                          self.size, self.max_size)
+
+    def _store(self, keys, ttl, task):
+        for key in keys:
+            del self._pending[key]
+        # Retrieving the exception also keeps asyncio from logging it when no caller is left.
+        if task.cancelled() or task.exception() is not None:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        expiry = now + ttl
+        for key, value in zip(keys, task.result()):
+            self.invalidate(key)
+            size = approx_size(value)
+            if size > self.max_size:
+                continue
+            self._entries[key] = now, expiry, size, value
+            self.size += size
+        while self.size > self.max_size:
+            _, (_, _, size, _) = self._entries.popitem(last=False)
+            self.size -= size
@@ -1,16 +1,18 @@
 import asyncio
 import logging
 import time
-from aiocache import cached
 
-from collections import defaultdict
+from collections import defaultdict, namedtuple, OrderedDict
 from disnake.ext import commands
 
+from tle import constants
 from tle.util import codeforces_common as cf_common
 from tle.util import codeforces_api as cf
 from tle.util import events
 from tle.util import tasks
 from tle.util import paginator
+from tle.util.async_cache import AsyncCache
+from tle.util.problem_index import ProblemIndex, make_mask
 from tle.util.ranklist import Ranklist
 
 logger = logging.getLogger(__name__)
@@ -80,15 +82,15 @@ class ContestCache:
         except KeyError:
             raise ContestNotFound(contest_id)
 
-    def get_problemset(self, contest_id):
-        return self.cache_master.conn.get_problemset_from_contest(contest_id)
+    async def get_problemset(self, contest_id):
+        return await self.cache_master.conn.aio.get_problemset_from_contest(contest_id)
 
     def get_contests_in_phase(self, phase):
         return self.contests_by_phase[phase]
 
     async def _try_disk(self):
         async with self.reload_lock:
-            contests = self.cache_master.conn.fetch_contests()
+            contests = await self.cache_master.conn.aio.fetch_contests()
             if not contests:
                 self.logger.info('Contest cache on disk is empty.')
                 return
@@ -119,7 +121,7 @@ class ContestCache:
         contests.sort(key=lambda contest: (contest.startTimeSeconds, contest.id))
 
         if from_api:
-            rc = self.cache_master.conn.cache_contests(contests)
+            rc = await self.cache_master.conn.aio.cache_contests(contests)
             self.logger.info(f'{rc} contests stored in database')
 
         contests_by_phase = {phase: [] for phase in cf.Contest.PHASES}
@@ -166,6 +168,10 @@ class ProblemCache:
 
         self.problems = []
         self.problem_by_name = {}
+        # Ordinals are handed out once per problem name and never change or get reused, so bit
+        # masks over them stay valid across reloads.
+        self.ordinal_by_name = {}
+        self.index = ProblemIndex([], {}, self.ordinal_by_name)
         self.problems_last_cache = 0
 
         self.reload_lock = asyncio.Lock()
@@ -193,12 +199,13 @@ class ProblemCache:
 
     async def _try_disk(self):
         async with self.reload_lock:
-            problems = self.cache_master.conn.fetch_problems()
+            problems = await self.cache_master.conn.aio.fetch_problems()
             if not problems:
                 self.logger.info('Problem cache on disk is empty.')
                 return
             self.problems = problems
             self.problem_by_name = {problem.name: problem for problem in problems}
+            self._build_index()
             self.logger.info(f'{len(self.problems)} problems fetched from disk')
 
     @tasks.task_spec(name='ProblemCacheUpdate',
@@ -234,11 +241,38 @@ class ProblemCache:
 
         self.problems = list(problem_by_name.values())
         self.problem_by_name = problem_by_name
+        self._build_index()
         self.problems_last_cache = time.time()
 
-        rc = self.cache_master.conn.cache_problems(self.problems)
+        rc = await self.cache_master.conn.aio.cache_problems(self.problems)
         self.logger.info(f'{rc} problems stored in database')
 
+    def _build_index(self):
+        for problem in self.problems:
+            if problem.name not in self.ordinal_by_name:
+                self.ordinal_by_name[problem.name] = len(self.ordinal_by_name)
+        self.index = ProblemIndex(self.problems, self.cache_master.contest_cache.contest_by_id,
+                                  self.ordinal_by_name)
+
+
+class BackfillProgress:
+    """Progress of a background backfill, which may have been resumed partway through."""
+
+    def __init__(self, total, done):
+        self.total = total
+        self.done = done
+        self.begin_done = done
+        self.begin_time = time.time()
+        self.error = None
+
+    def eta(self):
+        """Returns the estimated number of seconds left, or None if nothing was done yet."""
+        done_here = self.done - self.begin_done
+        if done_here == 0:
+            return None
+        rate = done_here / (time.time() - self.begin_time)
+        return (self.total - self.done) / rate
+
 
 class ProblemsetCacheError(CacheError):
     pass
@@ -252,19 +286,29 @@ class ProblemsetNotCached(ProblemsetCacheError):
 class ProblemsetCache:
     _MONITOR_PERIOD_SINCE_CONTEST_END = 14 * 24 * 60 * 60
     _RELOAD_DELAY = 60 * 60
+    _BACKFILL_CHUNK_SIZE = 50
 
     def __init__(self, cache_master):
-        self.problems = []
-        # problem -> list of contests in which it appears
+        # (problem name, contest start time) -> list of contests in which it appears
         self.problem_to_contests = defaultdict(list)
+        # contest -> keys of problem_to_contests that list it
+        self.problem_ids_by_contest = defaultdict(list)
         self.cache_master = cache_master
         self.update_lock = asyncio.Lock()
+        self.backfill_task = None
+        self.backfill_progress = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
     async def run(self):
-        if self.cache_master.conn.problemset_empty():
+        if await self.cache_master.conn.aio.problemset_empty():
             self.logger.warning('Problemset cache on disk is empty. This must be populated '
                                 'manually before use.')
+        await self._load_problem_contests()
+        contest_ids, done = await self.cache_master.conn.aio.fetch_problemset_backfill()
+        if contest_ids:
+            self.logger.info(f'Resuming problemset backfill with {len(contest_ids)} contests '
+                             'left.')
+            self._start_backfill(contest_ids, done)
         self._update_task.start()
 
     async def update_for_contest(self, contest_id):
@@ -272,18 +316,58 @@ class ProblemsetCache:
         async with self.update_lock:
             contest = self.cache_master.contest_cache.get_contest(contest_id)
             problemset, _ = await self._fetch_problemsets([contest], force_fetch=True)
-            self.cache_master.conn.clear_problemset(contest_id)
-            self._save_problems(problemset)
+            await self.cache_master.conn.aio.clear_problemset(contest_id)
+            await self._save_problems(problemset)
+            await self._refresh_problem_contests([contest_id])
             return len(problemset)
 
+    def backfill_running(self):
+        return self.backfill_task is not None and not self.backfill_task.done()
+
     async def update_for_all(self):
-        """Update problemsets for all finished contests. Intended for manual trigger."""
-        async with self.update_lock:
+        """Start refetching the problemsets of all finished contests in the background, or
+        resume the refetch that was interrupted. Intended for manual trigger. Returns the number
+        of contests left to fetch, or None if the refetch is already running.
+        """
+        if self.backfill_running():
+            return None
+        conn = self.cache_master.conn
+        contest_ids, done = await conn.aio.fetch_problemset_backfill()
+        if not contest_ids:
             contests = self.cache_master.contest_cache.contests_by_phase['FINISHED']
-            problemsets, _ = await self._fetch_problemsets(contests, force_fetch=True)
-            self.cache_master.conn.clear_problemset()
-            self._save_problems(problemsets)
-            return len(problemsets)
+            await conn.aio.clear_problemset_backfill()
+            await conn.aio.begin_problemset_backfill([contest.id for contest in contests])
+            contest_ids, done = await conn.aio.fetch_problemset_backfill()
+        self._start_backfill(contest_ids, done)
+        return len(contest_ids)
+
+    def _start_backfill(self, contest_ids, done):
+        self.backfill_progress = BackfillProgress(len(contest_ids) + done, done)
+        self.backfill_task = asyncio.create_task(self._backfill(contest_ids))
+
+    async def _backfill(self, contest_ids):
+        # Everything already saved stays, so an interrupted backfill leaves a usable cache and
+        # picks up from the last saved chunk.
+        cf.set_request_priority(cf.RequestPriority.BACKGROUND)
+        conn = self.cache_master.conn
+        progress = self.backfill_progress
+        try:
+            for chunk in paginator.chunkify(contest_ids, self._BACKFILL_CHUNK_SIZE):
+                # The requests are paced by the API rate limit, running them together only
+                # overlaps their latency.
+                problemsets = await asyncio.gather(*map(self._fetch_for_contest, chunk))
+                problems = [problem for problemset in problemsets for problem in problemset]
+                async with self.update_lock:
+                    rc = await conn.aio.save_backfilled_problemsets(chunk, problems)
+                    await self._refresh_problem_contests(
+                        {problem.contestId for problem in problems})
+                progress.done += len(chunk)
+                self.logger.info(f'Backfill saved {rc} problems, {progress.done}/'
+                                 f'{progress.total} contests done.')
+            await conn.aio.clear_problemset_backfill()
+        except Exception as e:
+            progress.error = e
+            self.logger.exception('Problemset backfill failed, it can be resumed later.')
 
     @tasks.task_spec(name='ProblemsetCacheUpdate',
                      waiter=tasks.Waiter.fixed_delay(_RELOAD_DELAY))
@@ -291,8 +375,9 @@ class ProblemsetCache:
         async with self.update_lock:
             contests = self.cache_master.contest_cache.contests_by_phase['FINISHED']
             new_problems, updated_problems = await self._fetch_problemsets(contests)
-            self._save_problems(new_problems + updated_problems)
-            self._update_from_disk()
+            await self._save_problems(new_problems + updated_problems)
+            await self._refresh_problem_contests(
+                {problem.contestId for problem in new_problems + updated_problems})
             self.logger.info(f'{len(new_problems)} new problems saved and {len(updated_problems)} '
                              'saved problems updated.')
 
@@ -309,7 +394,7 @@ class ProblemsetCache:
                 if now > contest.end_time + self._MONITOR_PERIOD_SINCE_CONTEST_END:
                     # Contest too old, we do not want to check it.
                     continue
-                problemset = self.cache_master.conn.fetch_problemset(contest.id)
+                problemset = await self.cache_master.conn.aio.fetch_problemset(contest.id)
                 if not problemset:
                     new_contest_ids.append(contest.id)
                     continue
@@ -335,26 +420,41 @@ class ProblemsetCache:
             problemset = []
         return problemset
 
-    def _save_problems(self, problems):
-        rc = self.cache_master.conn.cache_problemset(problems)
+    async def _save_problems(self, problems):
+        rc = await self.cache_master.conn.aio.cache_problemset(problems)
         self.logger.info(f'Saved {rc} problems to database.')
 
-    def get_problemset(self, contest_id):
-        problemset = self.cache_master.conn.fetch_problemset(contest_id)
+    async def get_problemset(self, contest_id):
+        problemset = await self.cache_master.conn.aio.fetch_problemset(contest_id)
         if not problemset:
             raise ProblemsetNotCached(contest_id)
         return problemset
 
-    def _update_from_disk(self):
-        self.problems = self.cache_master.conn.fetch_problems2()
+    def _add_problem_contests(self, rows):
+        for name, start_time, contest_id in rows:
+            problem_id = (name, start_time)
+            self.problem_to_contests[problem_id].append(contest_id)
+            self.problem_ids_by_contest[contest_id].append(problem_id)
+
+    async def _load_problem_contests(self):
+        rows = await self.cache_master.conn.aio.fetch_problem_contests()
         self.problem_to_contests = defaultdict(list)
-        for problem in self.problems:
-            try:
-                contest = cf_common.cache2.contest_cache.get_contest(problem.contestId)
-                problem_id = (problem.name, contest.startTimeSeconds)
-                self.problem_to_contests[problem_id].append(contest.id)
-            except ContestNotFound:
-                pass
+        self.problem_ids_by_contest = defaultdict(list)
+        self._add_problem_contests(rows)
+        self.logger.info(f'Loaded {len(rows)} problem to contest mappings from disk.')
+
+    async def _refresh_problem_contests(self, contest_ids):
+        """Replace the mappings of the given contests with the ones on disk."""
+        if not contest_ids:
+            return
+        rows = await self.cache_master.conn.aio.fetch_problem_contests(contest_ids)
+        for contest_id in contest_ids:
+            for problem_id in self.problem_ids_by_contest.pop(contest_id, []):
+                contests = self.problem_to_contests[problem_id]
+                contests.remove(contest_id)
+                if not contests:
+                    del self.problem_to_contests[problem_id]
+        self._add_problem_contests(rows)
 
 
 class RatingChangesCache:
@@ -366,46 +466,100 @@ class RatingChangesCache:
         self.cache_master = cache_master
         self.monitored_contests = []
         self.handle_rating_cache = {}
+        self.history_index = None
+        self.history_index_lock = asyncio.Lock()
+        self.backfill_task = None
+        self.backfill_progress = None
         self.logger = logging.getLogger(self.__class__.__name__)
 
     async def run(self):
-        self._refresh_handle_cache()
+        await self._refresh_handle_cache()
+        await self._refresh_history_index()
         if not self.handle_rating_cache:
             self.logger.warning('Rating changes cache on disk is empty. This must be populated '
                                 'manually before use.')
+        contest_ids, done = await self.cache_master.conn.aio.fetch_rating_change_backfill()
+        if contest_ids:
+            self.logger.info(f'Resuming rating changes backfill with {len(contest_ids)} '
+                             'contests left.')
+            self._start_backfill(contest_ids, done)
         self._update_task.start()
 
     async def fetch_contest(self, contest_id):
         """Fetch rating changes for a particular contest. Intended for manual trigger."""
         contest = self.cache_master.contest_cache.contest_by_id[contest_id]
         changes = await self._fetch([contest])
-        self.cache_master.conn.clear_rating_changes(contest_id=contest_id)
-        self._save_changes(changes)
+        handles = await self.cache_master.conn.aio.clear_rating_changes(contest_id=contest_id)
+        await self._refresh_handle_cache()
+        await self._refresh_history_index(handles)
+        await self._save_changes(changes)
         return len(changes)
 
+    def backfill_running(self):
+        return self.backfill_task is not None and not self.backfill_task.done()
+
     async def fetch_all_contests(self):
-        """Fetch rating changes for all contests. Intended for manual trigger."""
-        self.cache_master.conn.clear_rating_changes()
-        return await self.fetch_missing_contests()
+        """Start refetching the rating changes of all finished contests in the background, or
+        resume the refetch that was interrupted. The changes go to a shadow table which replaces
+        the saved changes when done, until then the old changes are used. Intended for manual
+        trigger. Returns the number of contests left to fetch, or None if the refetch is already
+        running.
+        """
+        if self.backfill_running():
+            return None
+        conn = self.cache_master.conn
+        contest_ids, done = await conn.aio.fetch_rating_change_backfill()
+        if not contest_ids:
+            contests = self.cache_master.contest_cache.contests_by_phase['FINISHED']
+            await conn.aio.begin_rating_change_backfill([contest.id for contest in contests])
+            contest_ids, done = await conn.aio.fetch_rating_change_backfill()
+        self._start_backfill(contest_ids, done)
+        return len(contest_ids)
+
+    def _start_backfill(self, contest_ids, done):
+        self.backfill_progress = BackfillProgress(len(contest_ids) + done, done)
+        self.backfill_task = asyncio.create_task(self._backfill(contest_ids))
+
+    async def _backfill(self, contest_ids):
+        cf.set_request_priority(cf.RequestPriority.BACKGROUND)
+        conn = self.cache_master.conn
+        progress = self.backfill_progress
+        try:
+            for chunk in paginator.chunkify(contest_ids, self._CONTESTS_PER_CHUNK):
+                # The requests are paced by the API rate limit, running them together only
+                # overlaps their latency.
+                changes = await asyncio.gather(*map(self._fetch_for_contest, chunk))
+                rc = await conn.aio.save_backfilled_rating_changes(
+                    chunk, [change for contest_changes in changes for change in contest_changes])
+                progress.done += len(chunk)
+                self.logger.info(f'Backfill saved {rc} changes, {progress.done}/'
+                                 f'{progress.total} contests done.')
+            await conn.aio.finish_rating_change_backfill()
+            self.logger.info('Rating changes backfill swapped in.')
+            await self._refresh_handle_cache()
+            await self._refresh_history_index()
+        except Exception as e:
+            progress.error = e
+            self.logger.exception('Rating changes backfill failed, it can be resumed later.')
 
     async def fetch_missing_contests(self):
         """Fetch rating changes for contests which are not saved in database. Intended for
         manual trigger."""
         contests = self.cache_master.contest_cache.contests_by_phase['FINISHED']
         contests = [
-            contest for contest in contests if not self.has_rating_changes_saved(contest.id)]
+            contest for contest in contests if not await self.has_rating_changes_saved(contest.id)]
         total_changes = 0
-        for contests_chunk in paginator.chunkify(contests, _CONTESTS_PER_CHUNK):
+        for contests_chunk in paginator.chunkify(contests, self._CONTESTS_PER_CHUNK):
             contests_chunk = await self._fetch(contests_chunk)
-            self._save_changes(contests_chunk)
+            await self._save_changes(contests_chunk)
             total_changes += len(contests_chunk)
         return total_changes
 
-    def is_newly_finished_without_rating_changes(self, contest):
+    async def is_newly_finished_without_rating_changes(self, contest):
         now = time.time()
         return (contest.phase == 'FINISHED' and
                 now - contest.end_time < self._RATED_DELAY and
-                not self.has_rating_changes_saved(contest.id))
+                not await self.has_rating_changes_saved(contest.id))
 
     @tasks.task_spec(name='RatingChangesCacheUpdate',
                      waiter=tasks.Waiter.for_event(events.ContestListRefresh))
@@ -420,8 +574,8 @@ class RatingChangesCache:
         to_monitor = [
             contest for contest in
             self.cache_master.contest_cache.contests_by_phase['FINISHED'] 
-            if self.is_newly_finished_without_rating_changes(contest)
-            and not _is_blacklisted(contest)
+            if not _is_blacklisted(contest)
+            and await self.is_newly_finished_without_rating_changes(contest)
             ]
                  
         cur_ids = {contest.id for contest in self.monitored_contests}
@@ -439,8 +593,8 @@ class RatingChangesCache:
     async def _monitor_task(self, _):
         self.monitored_contests = [
             contest for contest in self.monitored_contests
-            if self.is_newly_finished_without_rating_changes(contest)
-            and not _is_blacklisted(contest)
+            if not _is_blacklisted(contest)
+            and await self.is_newly_finished_without_rating_changes(contest)
         ]
 
         if not self.monitored_contests:
@@ -452,7 +606,10 @@ class RatingChangesCache:
         # Sort by the rating update time of the first change in the list of changes, assuming
         # every change in the list has the same time.
         contest_changes_pairs.sort(key=lambda pair: pair[1][0].ratingUpdateTimeSeconds)
-        self._save_changes(contest_changes_pairs)
+        await self._save_changes(contest_changes_pairs)
+        if contest_changes_pairs:
+            # Ratings of the participants changed.
+            self.cache_master.user_cache.clear()
         for contest, changes in contest_changes_pairs:
             cf_common.event_sys.dispatch(events.RatingChangesUpdate, contest=contest,
                                          rating_changes=changes)
@@ -460,43 +617,66 @@ class RatingChangesCache:
     async def _fetch(self, contests):
         all_changes = []
         for contest in contests:
-            try:
-                changes = await cf.contest.ratingChanges(contest_id=contest.id)
-                self.logger.info(f'{len(changes)} rating changes fetched for contest {contest.id}')
-                if changes:
-                    all_changes.append((contest, changes))
-            except cf.CodeforcesApiError as er:
-                self.logger.warning(f'Fetch rating changes failed for contest {contest.id}, ignoring. {er!r}')
-                pass
+            changes = await self._fetch_for_contest(contest.id)
+            if changes:
+                all_changes.append((contest, changes))
         return all_changes
 
-    def _save_changes(self, contest_changes_pairs):
+    async def _fetch_for_contest(self, contest_id):
+        try:
+            changes = await cf.contest.ratingChanges(contest_id=contest_id)
+            self.logger.info(f'{len(changes)} rating changes fetched for contest {contest_id}')
+        except cf.CodeforcesApiError as er:
+            self.logger.warning(f'Fetch rating changes failed for contest {contest_id}, ignoring. {er!r}')
+            changes = []
+        return changes
+
+    async def _save_changes(self, contest_changes_pairs):
         flattened = [change for _, changes in contest_changes_pairs for change in changes]
         if not flattened:
             return
-        rc = self.cache_master.conn.save_rating_changes(flattened)
+        rc = await self.cache_master.conn.aio.save_rating_changes(flattened)
         self.logger.info(f'Saved {rc} changes to database.')
-        self._refresh_handle_cache()
-
-    def _refresh_handle_cache(self):
-        changes = self.cache_master.conn.get_all_rating_changes()
-        handle_rating_cache = {}
-        for change in changes:
-            handle_rating_cache[change.handle] = change.newRating
+        # Only the saved handles can have a new latest rating.
+        handles = {change.handle for change in flattened}
+        latest_ratings = await self.cache_master.conn.aio.get_latest_ratings(handles)
+        self.handle_rating_cache.update(latest_ratings)
+        self.logger.info(f'Ratings for {len(latest_ratings)} handles updated')
+        await self._refresh_history_index(handles)
+
+    async def _refresh_handle_cache(self):
+        handle_rating_cache = await self.cache_master.conn.aio.get_latest_ratings()
         self.handle_rating_cache = handle_rating_cache
         self.logger.info(f'Ratings for {len(handle_rating_cache)} handles cached')
 
-    def get_users_with_more_than_n_contests(self, time_cutoff, n):
-        return self.cache_master.conn.get_users_with_more_than_n_contests(time_cutoff, n)
+    async def _refresh_history_index(self, handles=None):
+        """Reloads the rating history of the given handles into the index, or all of it."""
+        if not constants.RATING_HISTORY_INDEX:
+            return
+        # The old index keeps answering queries while the new one loads. Refreshes run one at a
+        # time so that a later one always loads what the earlier ones did.
+        async with self.history_index_lock:
+            if handles is None or self.history_index is None:
+                history_index = await self.cache_master.conn.aio.load_rating_history_index()
+                self.history_index = history_index
+                self.logger.info(f'Rating history index loaded with {len(history_index)} changes '
+                                 f'of {len(history_index.handles)} handles')
+                return
+            changed = await self.cache_master.conn.aio.load_rating_history_index(handles)
+            self.history_index = self.history_index.merge(changed, handles)
+            self.logger.info(f'Rating history index updated with {len(changed)} changes of '
+                             f'{len(changed.handles)} handles')
 
-    def get_rating_changes_for_contest(self, contest_id):
-        return self.cache_master.conn.get_rating_changes_for_contest(contest_id)
+    async def get_rating_changes_for_contest(self, contest_id):
+        return await self.cache_master.conn.aio.get_rating_changes_for_contest(contest_id)
 
-    def has_rating_changes_saved(self, contest_id):
-        return self.cache_master.conn.has_rating_changes_saved(contest_id)
+    async def has_rating_changes_saved(self, contest_id):
+        return await self.cache_master.conn.aio.has_rating_changes_saved(contest_id)
 
-    def get_rating_changes_for_handle(self, handle):
-        return self.cache_master.conn.get_rating_changes_for_handle(handle)
+    async def get_rating_changes_for_handle(self, handle):
+        if self.history_index is not None:
+            return self.history_index.get_rating_changes_for_handle(handle)
+        return await self.cache_master.conn.aio.get_rating_changes_for_handle(handle)
 
     def get_current_rating(self, handle, default_if_absent=False):
         return self.handle_rating_cache.get(handle,
@@ -543,7 +723,7 @@ class RanklistCache:
         finished_contests = [
             contest for contest in contests_by_phase['FINISHED']
             if not _is_blacklisted(contest)
-            and rating_cache.is_newly_finished_without_rating_changes(contest)
+            and await rating_cache.is_newly_finished_without_rating_changes(contest)
         ]
 
         to_monitor = running_contests + finished_contests
@@ -555,7 +735,7 @@ class RanklistCache:
                 self.monitored_contests = to_monitor
                 self._monitor_task.start()
             else:
-                self.ranklist_by_contest = {}
+                self._clear_ranklists()
 
     @tasks.task_spec(name='RanklistCacheUpdate.MonitorActiveContests',
                      waiter=tasks.Waiter.fixed_delay(_RELOAD_DELAY))
@@ -564,11 +744,11 @@ class RanklistCache:
         self.monitored_contests = [
             contest for contest in self.monitored_contests
             if not _is_blacklisted(contest) and (contest.phase != 'FINISHED'
-                or cache.is_newly_finished_without_rating_changes(contest))
+                or await cache.is_newly_finished_without_rating_changes(contest))
         ]
 
         if not self.monitored_contests:
-            self.ranklist_by_contest = {}
+            self._clear_ranklists()
             self.logger.info('No more active contests for which to monitor ranklists.')
             await self._monitor_task.stop()
             return
@@ -577,8 +757,20 @@ class RanklistCache:
         # If any ranklist could not be fetched, the old ranklist is kept.
         for contest_id, ranklist in ranklist_by_contest.items():
             self.ranklist_by_contest[contest_id] = ranklist
+        if ranklist_by_contest:
+            cf_common.event_sys.dispatch(events.RanklistUpdate,
+                                         contest_ids=list(ranklist_by_contest))
+
+    def _clear_ranklists(self):
+        contest_ids = list(self.ranklist_by_contest)
+        self.ranklist_by_contest = {}
+        if contest_ids:
+            cf_common.event_sys.dispatch(events.RanklistUpdate, contest_ids=contest_ids)
 
-    async def generate_ranklist(self, contest_id, *, fetch_changes=False, predict_changes=False):
+    async def generate_ranklist(self, contest_id, *, fetch_changes=False, predict_changes=False,
+                                previous=None):
+        """Fetch the ranklist of the contest. When predicting changes, `previous` may be an earlier
+        ranklist of the same contest whose prediction work is reused where possible."""
         assert fetch_changes ^ predict_changes
 
         contest, problems, standings = await cf.contest.standings(contest_id=contest_id,
@@ -622,7 +814,7 @@ class RanklistCache:
                     current_rating = {handle: rating
                                       for handle, rating in current_rating.items() if rating < 2100}
                 ranklist = Ranklist(contest, problems, standings, now, is_rated=True)
-                ranklist.predict(current_rating)
+                ranklist.predict(current_rating, previous)
 
         return ranklist
 
@@ -645,40 +837,220 @@ class RanklistCache:
         handles = [row.party.members[0].handle for row in standings
                    if row.party.members[0].handle in handles and
                       row.party.participantType == 'VIRTUAL']
-        current_vc_rating = {handle: cf_common.user_db.get_vc_rating(handle_to_member_id.get(handle))
+        current_vc_rating = {handle: await cf_common.user_db.aio.get_vc_rating(handle_to_member_id.get(handle))
                                 for handle in handles}
         ranklist = Ranklist(contest, problems, standings, now, is_rated=True)
-        delta_by_handle = {}
-        for handle in handles:
-            mixed_ratings = current_official_rating.copy()
-            mixed_ratings[handle] = current_vc_rating.get(handle)
-            ranklist.predict(mixed_ratings)
-            delta_by_handle[handle] = ranklist.delta_by_handle.get(handle, 0)
-
-        ranklist.delta_by_handle = delta_by_handle
+        ranklist.predict_virtual(current_official_rating, current_vc_rating)
         return ranklist
 
     async def _fetch(self, contests):
         ranklist_by_contest = {}
         for contest in contests:
             try:
-                ranklist = await self.generate_ranklist(contest.id, predict_changes=True)
+                previous = self.ranklist_by_contest.get(contest.id)
+                ranklist = await self.generate_ranklist(contest.id, predict_changes=True,
+                                                        previous=previous)
                 ranklist_by_contest[contest.id] = ranklist
                 self.logger.info(f'Ranklist fetched for contest {contest.id}')
+                calculator = ranklist.calculator
+                if previous is not None and calculator is not None:
+                    self.logger.info(f'Prediction for contest {contest.id} reused the seed table: '
+                                     f'{calculator.seed_reused}, reused performance ratings: '
+                                     f'{calculator.search_reused_fraction:.1%}')
             except cf.CodeforcesApiError as er:
                 self.logger.warning(f'Ranklist fetch failed for contest {contest.id}. {er!r}')
 
         return ranklist_by_contest
 
 
+# Bit masks over problem ordinals of the problems a handle got accepted, submitted anything to,
+# and submitted anything but a compilation error to.
+ProblemMasks = namedtuple('ProblemMasks', 'solved tried compiled')
+
+
+class SubmissionCache:
+    _SYNC_BATCH_SIZE = 100
+    _MASK_CACHE_SIZE = 1000
+    _SUBMISSIONS_TTL = 5 * 60
+    _SUBMISSIONS_MAX_SIZE = 128 * 1024 * 1024
+    # Submissions made this recently are fetched again on every sync, their verdicts may still
+    # change with system tests, hacks and rejudges after the contest.
+    _RESYNC_WINDOW = 3 * 24 * 60 * 60
+
+    def __init__(self, cache_master):
+        self.cache_master = cache_master
+        self.sync_locks = defaultdict(asyncio.Lock)
+        # Least recently used first. Maps a lowercase handle to the number of problem ordinals
+        # when its masks were built and the masks.
+        self.masks_by_handle = OrderedDict()
+        self.submissions_by_handle = AsyncCache('submissions', ttl=self._SUBMISSIONS_TTL,
+                                                max_size=self._SUBMISSIONS_MAX_SIZE)
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    async def get_submissions(self, handle, *, max_age=0):
+        """Returns all submissions of the handle, newest first, after bringing the local copy up
+        to date with the API. Submissions loaded at most `max_age` seconds ago may be returned
+        instead, and concurrent calls for the same handle share a load. The returned list is
+        shared, so it must not be mutated."""
+        return await self.submissions_by_handle.get(
+            handle.lower(), lambda: self._load_submissions(handle), max_age=max_age)
+
+    async def get_submissions_many(self, handles, *, max_age=0, return_exceptions=False):
+        """Same as `get_submissions` for several handles, which are synced concurrently. Results
+        are in the same order as `handles`. If `return_exceptions` is True, a handle which failed
+        gets the exception in its place, otherwise the first failure is raised.
+        """
+        results = await asyncio.gather(*(self.get_submissions(handle, max_age=max_age)
+                                         for handle in handles),
+                                       return_exceptions=return_exceptions)
+        for result in results:
+            # A sync that was cancelled is not a failure of its handle.
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+        return results
+
+    async def _load_submissions(self, handle):
+        async with self.sync_locks[handle.lower()]:
+            await self._sync(handle)
+        return await self.cache_master.submission_conn.aio.fetch_submissions(handle)
+
+    async def get_problem_masks(self, handle):
+        """Returns the `ProblemMasks` of the handle after bringing the local copy of its
+        submissions up to date with the API. Problems that are not in the problem cache are not
+        in the masks."""
+        key = handle.lower()
+        async with self.sync_locks[key]:
+            await self._sync(handle)
+            ordinal_by_name = self.cache_master.problem_cache.ordinal_by_name
+            entry = self.masks_by_handle.get(key)
+            # Masks built before new problems got their ordinals may be missing some of them.
+            if entry is None or entry[0] != len(ordinal_by_name):
+                ordinal_count = len(ordinal_by_name)
+                verdicts = await self.cache_master.submission_conn.aio.fetch_problem_verdicts(handle)
+                entry = ordinal_count, self._make_masks(verdicts, ordinal_by_name)
+                self.masks_by_handle[key] = entry
+                if len(self.masks_by_handle) > self._MASK_CACHE_SIZE:
+                    self.masks_by_handle.popitem(last=False)
+            else:
+                self.masks_by_handle.move_to_end(key)
+            return entry[1]
+
+    async def get_problem_masks_many(self, handles):
+        """Same as `get_problem_masks` for several handles, which are synced concurrently.
+        Results are in the same order as `handles`."""
+        return await asyncio.gather(*(self.get_problem_masks(handle) for handle in handles))
+
+    @staticmethod
+    def _make_masks(verdicts, ordinal_by_name):
+        solved, tried, compiled = [], [], []
+        for name, verdict in verdicts:
+            ordinal = ordinal_by_name.get(name)
+            if ordinal is None:
+                continue
+            tried.append(ordinal)
+            if verdict == 'OK':
+                solved.append(ordinal)
+            if verdict != 'COMPILATION_ERROR':
+                compiled.append(ordinal)
+        return ProblemMasks(make_mask(solved), make_mask(tried), make_mask(compiled))
+
+    def _update_masks(self, handle, submissions, saved_verdicts):
+        key = handle.lower()
+        entry = self.masks_by_handle.get(key)
+        if entry is None:
+            return
+        if any(saved_verdicts.get(sub.id, sub.verdict) != sub.verdict for sub in submissions):
+            # A saved submission got a new verdict, like an accepted one that was hacked or a
+            # pending one that ended as a compilation error, which can take a problem out of the
+            # masks. Rebuild them from the database on the next use.
+            del self.masks_by_handle[key]
+            return
+        ordinal_count, masks = entry
+        new_masks = self._make_masks(((sub.problem.name, sub.verdict) for sub in submissions),
+                                     self.cache_master.problem_cache.ordinal_by_name)
+        self.masks_by_handle[key] = ordinal_count, ProblemMasks._make(
+            old | new for old, new in zip(masks, new_masks))
+
+    async def _sync(self, handle):
+        conn = self.cache_master.submission_conn
+        last_id, unsettled_id = await conn.aio.get_sync_point(
+            handle, time.time() - self._RESYNC_WINDOW)
+        if last_id is None:
+            submissions = await cf.user.status(handle=handle)
+        else:
+            # The API returns submissions newest first. Keep fetching until we reach one that is
+            # already saved with a verdict that will not change, saved rows fetched again are
+            # overwritten.
+            stop_id = last_id if unsettled_id is None else min(last_id, unsettled_id)
+            submissions = []
+            from_ = 1
+            while True:
+                batch = await cf.user.status(handle=handle, from_=from_,
+                                             count=self._SYNC_BATCH_SIZE)
+                submissions += batch
+                if len(batch) < self._SYNC_BATCH_SIZE or batch[-1].id <= stop_id:
+                    break
+                from_ += self._SYNC_BATCH_SIZE
+        if submissions:
+            saved_verdicts = {}
+            if last_id is not None:
+                saved_verdicts = await conn.aio.fetch_verdicts(
+                    handle, [sub.id for sub in submissions])
+            rc = await conn.aio.save_submissions(handle, submissions)
+            self.logger.info(f'Saved {rc} submissions for handle {handle}')
+            self._update_masks(handle, submissions, saved_verdicts)
+
+
+class UserCache:
+    """Keeps the results of the user.info and user.rating API methods for a while, for commands
+    that look up the same handles over and over. The results are shared, so they must not be
+    mutated."""
+    _INFO_TTL = 5 * 60
+    _RATING_CHANGES_TTL = 10 * 60
+    _MAX_SIZE = 32 * 1024 * 1024
+
+    def __init__(self, cache_master):
+        self.cache_master = cache_master
+        self.info_by_handle = AsyncCache('user.info', ttl=self._INFO_TTL,
+                                         max_size=self._MAX_SIZE)
+        self.rating_changes_by_handle = AsyncCache('user.rating', ttl=self._RATING_CHANGES_TTL,
+                                                   max_size=self._MAX_SIZE)
+
+    async def get_info(self, handles):
+        """Same as `cf.user.info`. Handles that are not cached are fetched together."""
+        handle_by_key = {handle.lower(): handle for handle in handles}
+
+        async def fetch(keys):
+            return await cf.user.info(handles=[handle_by_key[key] for key in keys])
+        return await self.info_by_handle.get_many([handle.lower() for handle in handles], fetch)
+
+    async def get_rating_changes(self, handle):
+        """Same as `cf.user.rating`."""
+        return await self.rating_changes_by_handle.get(
+            handle.lower(), lambda: cf.user.rating(handle=handle))
+
+    def clear(self):
+        self.info_by_handle.clear()
+        self.rating_changes_by_handle.clear()
+        # The API responses these were made from are reused for a while too.
+        cf.clear_responses('user.info', 'user.rating')
+
+
 class CacheSystem:
-    def __init__(self, conn):
+    _RATED_LIST_TTL = 30 * 60
+    _rated_list_cache = AsyncCache('user.ratedList', ttl=_RATED_LIST_TTL,
+                                   max_size=64 * 1024 * 1024)
+
+    def __init__(self, conn, submission_conn):
         self.conn = conn
+        self.submission_conn = submission_conn
         self.contest_cache = ContestCache(self)
         self.problem_cache = ProblemCache(self)
         self.rating_changes_cache = RatingChangesCache(self)
         self.ranklist_cache = RanklistCache(self)
         self.problemset_cache = ProblemsetCache(self)
+        self.submission_cache = SubmissionCache(self)
+        self.user_cache = UserCache(self)
 
     async def run(self):
         await self.rating_changes_cache.run()
@@ -688,9 +1060,9 @@ class CacheSystem:
         await self.problemset_cache.run()
 
     @staticmethod
-    @cached(ttl=30 * 60)
     async def getUsersEffectiveRating(*, activeOnly=None):
         """ Returns a dictionary mapping user handle to his effective rating for all the users.
         """
-        return await cf.user.ratedList(activeOnly=activeOnly)
+        return await CacheSystem._rated_list_cache.get(
+            activeOnly, lambda: cf.user.ratedList(activeOnly=activeOnly))
 
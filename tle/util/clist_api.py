@@ -2,7 +2,7 @@ import logging
 import os
 import datetime as dt
 from tle.util.codeforces_api import RatingChange, make_from_dict, Contest as CfContest
-import requests
+import aiohttp
 import json
 
 from tle import constants
@@ -10,6 +10,7 @@ from disnake.ext import commands
 
 from pathlib import Path
 import functools
+import itertools
 import time
 import asyncio
 from urllib.parse import urlencode
@@ -18,6 +19,12 @@ from collections import namedtuple, deque
 logger = logging.getLogger(__name__)
 URL_BASE = 'https://clist.by/api/v2/'
 _CLIST_API_TIME_DIFFERENCE = 30 * 60  # seconds
+_STATISTICS_PAGE_SIZE = 1000
+_STATISTICS_PREFETCH_PAGES = 4
+_CONNECTION_LIMIT = 10
+_KEEPALIVE_TIMEOUT = 60  # seconds
+
+_session = None
 
 
 class ClistApiError(commands.CommandError):
@@ -45,9 +52,10 @@ class HandleNotFoundError(TrueApiError):
         self.handle = handle
 
 class CallLimitExceededError(TrueApiError):
-    def __init__(self, comment=None):
+    def __init__(self, comment=None, retry_after=None):
         super().__init__(message='Clist API call limit exceeded')
         self.comment = comment
+        self.retry_after = retry_after
 
 def ratelimit(f):
     tries = 4
@@ -59,7 +67,10 @@ def ratelimit(f):
             except (CallLimitExceededError, ClientError, ClistApiError) as e:
                 logger.info(f'Try {i+1}/{tries} at query failed.')
                 if i < tries - 1:
-                    await asyncio.sleep(2 + i/2)
+                    delay = 2 + i/2
+                    if isinstance(e, CallLimitExceededError) and e.retry_after is not None:
+                        delay = max(delay, e.retry_after)
+                    await asyncio.sleep(delay)
                     logger.info(f'Retrying...')
                 else:
                     logger.info(f'Aborting.')
@@ -67,6 +78,39 @@ def ratelimit(f):
     return wrapped
 
 
+def _get_session():
+    """Returns the session shared by all Clist requests, creating it on first use."""
+    global _session
+    if _session is None:
+        connector = aiohttp.TCPConnector(limit=_CONNECTION_LIMIT,
+                                         keepalive_timeout=_KEEPALIVE_TIMEOUT)
+        _session = aiohttp.ClientSession(connector=connector,
+                                         headers={'Accept-Encoding': 'gzip'})
+    return _session
+
+
+def _parse_retry_after(value):
+    # Only the delay-seconds form of the header is handled.
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+async def _get_json(url):
+    try:
+        async with _get_session().get(url) as resp:
+            if resp.status == 429:
+                retry_after = _parse_retry_after(resp.headers.get('Retry-After'))
+                raise CallLimitExceededError(retry_after=retry_after)
+            if resp.status != 200:
+                raise ClistApiError
+            return await resp.json()
+    except (aiohttp.ClientError, ValueError) as e:
+        logger.error(f'Request to Clist API encountered error: {e!r}')
+        raise ClientError from e
+
+
 @ratelimit
 async def _query_clist_api(path, data):
     url = URL_BASE + path
@@ -76,21 +120,11 @@ async def _query_clist_api(path, data):
     else:
         url += '?'+ str(urlencode(data))
         url+='&'+clist_token
-    print("Calling Clist : "+url)
-    try:
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            if resp.status_code == 429:
-                raise CallLimitExceededError
-            else:
-                raise ClistApiError
-        return resp.json()
-    except Exception as e:
-        logger.error(f'Request to Clist API encountered error: {e!r}')
-        raise ClientError from e
+    logger.info(f'Querying Clist API at {URL_BASE + path} with {data}')
+    return await _get_json(url)
 
 
-def _query_api():
+async def _query_api():
     clist_token = os.getenv('CLIST_API_TOKEN')
     contests_start_time = dt.datetime.utcnow() - dt.timedelta(days=2)
     contests_start_time_string = contests_start_time.strftime(
@@ -98,17 +132,15 @@ def _query_api():
     url = URL_BASE +'/contest?limit=200&start__gte=' + \
         contests_start_time_string + '&' + clist_token
 
+    resp = await _get_json(url)
     try:
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            raise ClistApiError
-        return resp.json()['objects']
-    except Exception as e:
+        return resp['objects']
+    except (KeyError, TypeError) as e:
         logger.error(f'Request to Clist API encountered error: {e!r}')
         raise ClientError from e
 
 
-def cache(forced=False):
+async def cache(forced=False):
     
     current_time_stamp = dt.datetime.utcnow().timestamp()
     db_file = Path(constants.CONTESTS_DB_FILE_PATH)
@@ -126,7 +158,7 @@ def cache(forced=False):
             last_time_stamp < _CLIST_API_TIME_DIFFERENCE:
         return
 
-    contests = _query_api()
+    contests = await _query_api()
     db = {}
     db['querytime'] = current_time_stamp
     db['objects'] = contests
@@ -146,38 +178,71 @@ async def account(handle, resource):
         raise HandleNotFoundError(handle=handle, resource=resource) 
     return resp
 
-async def statistics(account_id=None, contest_id=None, order_by=None, account_ids=None, resource=None, with_problems=False, with_extra_fields=False, limit=1000):
-    params = {'limit':limit}
+async def iter_statistics(account_id=None, contest_id=None, order_by=None, account_ids=None, resource=None, with_problems=False, with_extra_fields=False, limit=1000):
+    """Yields the rows of `statistics` as pages arrive. Once the first page tells how many rows
+    there are, up to _STATISTICS_PREFETCH_PAGES of the following pages are fetched concurrently
+    while earlier ones are being consumed. Rows are yielded in order."""
+    params = {'limit':limit, 'total_count':True}
     if account_id!=None: params['account_id'] = account_id
     if contest_id!=None: params['contest_id'] = contest_id
     if order_by!=None: params['order_by'] = order_by
     if with_problems: params['with_problems'] = True
     if with_extra_fields: params['with_more_fields'] = True
     if account_ids!=None:
-        ids = ""
-        for i in range(len(account_ids)):
-            ids += str(account_ids[i])
-            if i!=(len(account_ids)-1):
-                ids += ','
-        params['account_id__in']=ids
+        params['account_id__in'] = ','.join(str(id_) for id_ in account_ids)
     if resource!=None: params['resource'] = resource
-    results = []
-    offset = 0
-    while True:
-        params['offset'] = offset
-        resp = await _query_clist_api('statistics', params)
+
+    async def fetch_page(offset):
+        resp = await _query_clist_api('statistics', {**params, 'offset':offset})
         if resp==None or 'objects' not in resp:
-            if offset==0:
-                raise ClientError
-            else:
+            return None
+        return resp
+
+    first = await fetch_page(0)
+    if first is None:
+        raise ClientError
+    for row in first['objects']:
+        yield row
+    if len(first['objects']) < _STATISTICS_PAGE_SIZE:
+        return
+
+    total_count = (first.get('meta') or {}).get('total_count')
+    if total_count is None:
+        offsets = itertools.count(_STATISTICS_PAGE_SIZE, _STATISTICS_PAGE_SIZE)
+        max_pending = 1
+    else:
+        offsets = iter(range(_STATISTICS_PAGE_SIZE, total_count, _STATISTICS_PAGE_SIZE))
+        max_pending = _STATISTICS_PREFETCH_PAGES
+
+    pending = deque()
+    def prefetch():
+        while len(pending) < max_pending:
+            offset = next(offsets, None)
+            if offset is None:
+                break
+            pending.append(asyncio.create_task(fetch_page(offset)))
+
+    try:
+        prefetch()
+        while pending:
+            resp = await pending.popleft()
+            if resp is None:
                 break
-        else:
+            prefetch()
             objects = resp['objects']
-            results += objects
-            if(len(objects)<1000):
+            for row in objects:
+                yield row
+            if len(objects) < _STATISTICS_PAGE_SIZE:
                 break
-        offset+=1000
-    return results
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def statistics(account_id=None, contest_id=None, order_by=None, account_ids=None, resource=None, with_problems=False, with_extra_fields=False, limit=1000):
+    return [row async for row in iter_statistics(account_id=account_id, contest_id=contest_id,
+                                                 order_by=order_by, account_ids=account_ids,
+                                                 resource=resource, with_problems=with_problems,
+                                                 with_extra_fields=with_extra_fields, limit=limit)]
 
 class Contest(CfContest):
     @property
@@ -288,9 +353,9 @@ async def fetch_user_info(resource, account_ids=None, handles=None):
     return resp
 
 async def fetch_rating_changes(account_ids=None, performance=False):
-    resp = await statistics(account_ids=account_ids, order_by='date', with_extra_fields=performance)
     result = []
-    for changes in resp:
+    async for changes in iter_statistics(account_ids=account_ids, order_by='date',
+                                         with_extra_fields=performance):
         time = dt.datetime.strptime(changes['date'],'%Y-%m-%dT%H:%M:%S')
         if changes['new_rating']==None: continue
         rating_change = changes['rating_change'] if changes['rating_change']!=None else 0
@@ -1,15 +1,21 @@
 import asyncio
+import contextvars
+import heapq
+import itertools
 import logging
 import time
 import os
-import requests
 import functools
 from collections import namedtuple, deque
+from enum import IntEnum
 
 import aiohttp
 
 from disnake.ext import commands
 
+from tle.util import json_stream
+from tle.util.async_cache import AsyncCache
+
 API_BASE_URL = 'https://codeforces.com/api/'
 CONTEST_BASE_URL = 'https://codeforces.com/contest/'
 CONTESTS_BASE_URL = 'https://codeforces.com/contests/'
@@ -156,6 +162,24 @@ def make_from_dict(namedtuple_cls, dict_):
     return namedtuple_cls._make(field_vals)
 
 
+def _make_party(party_dict):
+    members = [make_from_dict(Member, member) for member in party_dict['members']]
+    return make_from_dict(Party, party_dict)._replace(members=members)
+
+
+def _make_ranklist_row(row_dict):
+    problem_results = [make_from_dict(ProblemResult, problem_result)
+                       for problem_result in row_dict['problemResults']]
+    return make_from_dict(RanklistRow, row_dict)._replace(party=_make_party(row_dict['party']),
+                                                          problemResults=problem_results)
+
+
+def _make_submission(submission_dict):
+    return make_from_dict(Submission, submission_dict)._replace(
+        problem=make_from_dict(Problem, submission_dict['problem']),
+        author=_make_party(submission_dict['author']))
+
+
 # Error classes
 
 class CodeforcesApiError(commands.CommandError):
@@ -206,12 +230,126 @@ class RatingChangesUnavailableError(TrueApiError):
 
 # Codeforces API query methods
 
+# Codeforces allows about one request every two seconds per IP. Short bursts are tolerated.
+_RATE_LIMIT_PER_SECOND = 0.5
+_RATE_LIMIT_BURST = 5
+
+# Size of the chunks in which streamed responses are read.
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Seconds for which results of these methods are reused. They are polled by many users at once
+# around the end of a contest. Standings are left out, they can be large and are streamed so that
+# they are never held in memory for long. Concurrent queries of them are still shared.
+_RESPONSE_TTL = {
+    'contest.ratingChanges': 60,
+    'user.info': 30,
+    'user.rating': 60,
+}
+# Maximum approximate size of the reused results of one method, in bytes.
+_RESPONSE_CACHE_SIZE = 64 * 1024 * 1024
+_response_caches = {}
+
 _session = None
+_scheduler = None
+
+
+class RequestPriority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_request_priority = contextvars.ContextVar('request_priority',
+                                           default=RequestPriority.INTERACTIVE)
+
+
+def set_request_priority(priority):
+    """Sets the priority of API requests made from the current context, which includes asyncio
+    tasks created from it afterwards."""
+    _request_priority.set(priority)
+
+
+class TokenBucket:
+    """Paces callers to `rate` acquisitions per second on average, allowing bursts of up to
+    `capacity` acquisitions after a period of inactivity."""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    async def acquire(self):
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+SchedulerStats = namedtuple('SchedulerStats', 'priority queued served avg_wait max_wait')
+
+
+class RequestScheduler:
+    """Hands out permission to send API requests at the pace allowed by the token bucket. Waiting
+    requests are served by priority first and then in order of arrival."""
+    def __init__(self, rate, capacity):
+        self.bucket = TokenBucket(rate, capacity)
+        self.queue = []  # Heap of (priority, sequence number, future).
+        self.counter = itertools.count()
+        self.dispatcher = None
+        self.served = {priority: 0 for priority in RequestPriority}
+        self.total_wait = {priority: 0.0 for priority in RequestPriority}
+        self.max_wait = {priority: 0.0 for priority in RequestPriority}
+
+    async def acquire(self, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (priority, next(self.counter), future))
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self._dispatch())
+        begin = time.monotonic()
+        await future
+        wait = time.monotonic() - begin
+        self.served[priority] += 1
+        self.total_wait[priority] += wait
+        self.max_wait[priority] = max(self.max_wait[priority], wait)
+
+    async def _dispatch(self):
+        while self.queue:
+            await self.bucket.acquire()
+            while self.queue:
+                _, _, future = heapq.heappop(self.queue)
+                # The future is done if the waiting request was cancelled.
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+    def stats(self):
+        queued = {priority: 0 for priority in RequestPriority}
+        for priority, _, future in self.queue:
+            if not future.done():
+                queued[priority] += 1
+        return [SchedulerStats(priority, queued[priority], self.served[priority],
+                               self.total_wait[priority] / max(1, self.served[priority]),
+                               self.max_wait[priority])
+                for priority in RequestPriority]
+
+
+def scheduler_stats():
+    """Returns a `SchedulerStats` for every request priority."""
+    return _scheduler.stats()
 
 
 async def initialize():
     global _session
+    global _scheduler
     _session = aiohttp.ClientSession()
+    _scheduler = RequestScheduler(_RATE_LIMIT_PER_SECOND, _RATE_LIMIT_BURST)
 
 
 def _bool_to_str(value):
@@ -239,18 +377,53 @@ def cf_ratelimit(f):
     return wrapped
 
 
+async def _query_api(path, data=None, *, stream=None):
+    """Query the API and return the result. `stream` maps paths of large arrays inside the
+    result to functions converting their elements, see `json_stream.decode`. These arrays are
+    converted while the response is read instead of after it is fully buffered.
+
+    Concurrent queries of a method with the same parameters share one request, made at the
+    priority of the first of them, and results of the methods in `_RESPONSE_TTL` are reused for
+    a while. Results may be handed to several callers, so they must not be mutated.
+    """
+    cache = _response_caches.get(path)
+    if cache is None:
+        cache = AsyncCache(f'api:{path}', ttl=_RESPONSE_TTL.get(path, 0),
+                           max_size=_RESPONSE_CACHE_SIZE)
+        _response_caches[path] = cache
+    key = tuple(sorted(data.items())) if data else ()
+    return await cache.get(key, lambda: _fetch_api(path, data, stream=stream))
+
+
+def clear_responses(*paths):
+    """Forgets the reused results of the given API methods, for when they are known to have
+    changed."""
+    for path in paths:
+        cache = _response_caches.get(path)
+        if cache is not None:
+            cache.clear()
+
+
 @cf_ratelimit
-async def _query_api(path, data=None):
+async def _fetch_api(path, data=None, *, stream=None):
     url = API_BASE_URL + path
+    await _scheduler.acquire(_request_priority.get())
     try:
         logger.info(f'Querying CF API at {url} with {data}')
         # Explicitly state encoding (though aiohttp accepts gzip by default)
         headers = {'Accept-Encoding': 'gzip'}
         async with _session.post(url, data=data, headers=headers) as resp:
-            try:
-                respjson = await resp.json()
-            except aiohttp.ContentTypeError:
-                raise CodeforcesApiError
+            if stream is None:
+                try:
+                    respjson = await resp.json()
+                except aiohttp.ContentTypeError:
+                    raise CodeforcesApiError
+            else:
+                if resp.content_type != 'application/json':
+                    raise CodeforcesApiError
+                streamed = {('result',) + path: convert for path, convert in stream.items()}
+                respjson = await json_stream.decode(
+                    resp.content.iter_chunked(_STREAM_CHUNK_SIZE), streamed)
             if resp.status == 200:
                 return respjson['result']
             comment = f'HTTP Error {resp.status}, {respjson.get("comment")}'
@@ -284,10 +457,11 @@ def proxy_ratelimit(f):
 async def _query_proxy(url):
     try:
         logger.info(f'Querying RatingList from Proxy API.')
-        resp = requests.get(url)
-        if resp.status_code != 200:
-            raise CodeforcesApiError
-        resp = resp.json()
+        headers = {'Accept-Encoding': 'gzip'}
+        async with _session.get(url, headers=headers) as resp:
+            if resp.status != 200:
+                raise CodeforcesApiError
+            resp = await resp.json(content_type=None)
         logger.info(f'Fetched RatingList from Proxy API.')
         return {user_dict['handle']: user_dict['rating'] for user_dict in resp}
     except Exception as e:
@@ -332,21 +506,15 @@ class contest:
         if show_unofficial is not None:
             params['showUnofficial'] = _bool_to_str(show_unofficial)
         try:
-            resp = await _query_api('contest.standings', params)
+            resp = await _query_api('contest.standings', params,
+                                    stream={('rows',): _make_ranklist_row})
         except TrueApiError as e:
             if 'not found' in e.comment:
                 raise ContestNotFoundError(e.comment, contest_id)
             raise
         contest_ = make_from_dict(Contest, resp['contest'])
         problems = [make_from_dict(Problem, problem_dict) for problem_dict in resp['problems']]
-        for row in resp['rows']:
-            row['party']['members'] = [make_from_dict(Member, member)
-                                       for member in row['party']['members']]
-            row['party'] = make_from_dict(Party, row['party'])
-            row['problemResults'] = [make_from_dict(ProblemResult, problem_result)
-                                     for problem_result in row['problemResults']]
-        ranklist = [make_from_dict(RanklistRow, row_dict) for row_dict in resp['rows']]
-        return contest_, problems, ranklist
+        return contest_, problems, resp['rows']
 
 
 class problemset:
@@ -407,6 +575,8 @@ class user:
     def correct_rating_changes(*, resp, resource='codeforces.com'):
         adaptO = [1400, 900, 550, 300, 150, 100, 50]
         adaptN = [900, 550, 300, 150, 100, 50, 0]
+        # Work on copies, the lists of rating changes may be shared through a cache.
+        resp = [list(r) for r in resp]
         for r in resp:
             if (len(r) > 0):
                 if resource=='codeforces.com':
@@ -456,19 +626,24 @@ class user:
         if count is not None:
             params['count'] = count
         try:
-            resp = await _query_api('user.status', params)
+            resp = await _query_api('user.status', params, stream={(): _make_submission})
         except TrueApiError as e:
             if 'not found' in e.comment:
                 raise HandleNotFoundError(e.comment, handle)
             if 'should contain' in e.comment:
                 raise HandleInvalidError(e.comment, handle)
             raise
-        for submission in resp:
-            submission['problem'] = make_from_dict(Problem, submission['problem'])
-            submission['author']['members'] = [make_from_dict(Member, member)
-                                               for member in submission['author']['members']]
-            submission['author'] = make_from_dict(Party, submission['author'])
-        return [make_from_dict(Submission, submission_dict) for submission_dict in resp]
+        return resp
+
+    @staticmethod
+    async def status_many(*, handles, from_=None, count=None, return_exceptions=False):
+        """Fetches user.status for all the handles concurrently, paced by the global rate limit.
+        Results are in the same order as `handles`. If `return_exceptions` is True, a handle for
+        which the request failed gets the exception in its place instead of failing the batch.
+        """
+        return await asyncio.gather(*(user.status(handle=handle, from_=from_, count=count)
+                                      for handle in handles),
+                                    return_exceptions=return_exceptions)
 
 
 async def _needs_fixing(handles):
@@ -55,8 +55,9 @@ async def initialize(nodb):
         user_db = db.UserDbConn(constants.USER_DB_FILE_PATH)
     
     cache_db = db.CacheDbConn(constants.CACHE_DB_FILE_PATH)
+    submission_db = db.SubmissionDbConn(constants.SUBMISSION_DB_FILE_PATH)
 
-    cache2 = cache_system2.CacheSystem(cache_db)
+    cache2 = cache_system2.CacheSystem(cache_db, submission_db)
     await cache2.run()
 
     try:
@@ -125,20 +126,17 @@ async def get_visited_contests(handles : [str]):
     """ Returns a set of contest ids of contests that any of the given handles
         has at least one non-CE submission.
     """
-    user_submissions = [await cf.user.status(handle=handle) for handle in handles]
+    user_submissions = await cache2.submission_cache.get_submissions_many(handles)
     problem_to_contests = cache2.problemset_cache.problem_to_contests
 
-    contest_ids = []
-    for sub in itertools.chain.from_iterable(user_submissions):
-        if sub.verdict == 'COMPILATION_ERROR':
-            continue
-        try:
-            contest = cache2.contest_cache.get_contest(sub.problem.contestId)
-            problem_id = (sub.problem.name, contest.startTimeSeconds)
-            contest_ids += problem_to_contests[problem_id]
-        except cache_system2.ContestNotFound:
-            pass
-    return set(contest_ids)
+    contest_ids = set()
+    for contest_id, name in {(sub.problem.contestId, sub.problem.name)
+                             for sub in itertools.chain.from_iterable(user_submissions)
+                             if sub.verdict != 'COMPILATION_ERROR'}:
+        contest = cache2.contest_cache.contest_by_id.get(contest_id)
+        if contest is not None:
+            contest_ids.update(problem_to_contests.get((name, contest.startTimeSeconds), ()))
+    return contest_ids
 
 # These are special rated-for-all contests which have a combined ranklist for onsite and online
 # participants. The onsite participants have their submissions marked as out of competition. Just
@@ -257,11 +255,11 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
         handles.remove('+server')
         if resource=='codeforces.com':
             guild_handles = {handle for discord_id, handle
-                                in user_db.get_handles_for_guild(inter.guild.id)}
+                                in await user_db.aio.get_handles_for_guild(inter.guild.id)}
             handles.update(guild_handles)
         else:
             guild_account_ids = {account_id for user_id, account_id, handle 
-            in user_db.get_account_ids_for_resource(inter.guild.id, resource=resource)}
+            in await user_db.aio.get_account_ids_for_resource(inter.guild.id, resource=resource)}
             account_ids.update(guild_account_ids)
     if len(account_ids)==0 and (len(handles) < mincnt or (maxcnt and maxcnt < len(handles))):
         raise HandleCountOutOfBoundsError(mincnt, maxcnt)
@@ -276,20 +274,20 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
             for member in inter.guild.members:
                 if role in member.roles:
                     if resource=='codeforces.com':
-                        handle = user_db.get_handle(member.id, inter.guild.id)
+                        handle = await user_db.aio.get_handle(member.id, inter.guild.id)
                         if handle is not None:
                             resolved_handles.add(handle)
                     else:
-                        account_id = user_db.get_account_id(member.id, inter.guild.id, resource=resource)
+                        account_id = await user_db.aio.get_account_id(member.id, inter.guild.id, resource=resource)
                         if account_id is not None:
                             account_ids.add(account_id)
         elif handle.startswith('+'):
             list_name = handle[1:]
             if resource=='codeforces.com':
-                list_handles = set(user_db.get_list_handles(list_name=list_name, resource=resource))
+                list_handles = set(await user_db.aio.get_list_handles(list_name=list_name, resource=resource))
                 resolved_handles.update(list_handles)
             else:
-                list_account_ids = set(user_db.get_list_account_ids(list_name=list_name, resource=resource))
+                list_account_ids = set(await user_db.aio.get_list_account_ids(list_name=list_name, resource=resource))
                 account_ids.update(list_account_ids)
         elif handle.startswith('!'):
             # ! denotes Discord user
@@ -299,12 +297,12 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
             except commands.errors.CommandError:
                 raise FindMemberFailedError(member_identifier)
             if resource=='codeforces.com':
-                handle = user_db.get_handle(member.id, inter.guild.id)
+                handle = await user_db.aio.get_handle(member.id, inter.guild.id)
                 if handle is None:
                     raise HandleNotRegisteredError(member)
                 resolved_handles.add(handle)
             else:
-                account_id = user_db.get_account_id(member.id, inter.guild.id, resource=resource)
+                account_id = await user_db.aio.get_account_id(member.id, inter.guild.id, resource=resource)
                 if account_id is None:
                     raise HandleNotRegisteredError(member, resource=resource)
                 else:
@@ -313,7 +311,7 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
             if resource=='codeforces.com':
                 resolved_handles.add(handle)
             else:
-                account_id = user_db.get_account_id_from_handle(handle=handle, resource=resource)
+                account_id = await user_db.aio.get_account_id_from_handle(handle=handle, resource=resource)
                 if account_id is None:
                     resolved_handles.add(handle)
                 else:
@@ -330,10 +328,10 @@ async def resolve_handles(inter, converter, handles, *, mincnt=1, maxcnt=5, defa
                     account_ids.add(int(user['id']))
         return list(account_ids)
 
-def members_to_handles(members: [disnake.Member], guild_id):
+async def members_to_handles(members: [disnake.Member], guild_id):
     handles = []
     for member in members:
-        handle = user_db.get_handle(member.id, guild_id)
+        handle = await user_db.aio.get_handle(member.id, guild_id)
         if handle is None:
             raise HandleNotRegisteredError(member)
         handles.append(handle)
@@ -428,28 +426,32 @@ class SubFilter:
     def filter_solved(submissions):
         """Filters and keeps only solved submissions. If a problem is solved multiple times the first
         accepted submission is kept. The unique id for a problem is (problem name, contest start time).
+        The submissions are not modified, they may be shared.
         """
-        submissions.sort(key=lambda sub: sub.creationTimeSeconds)
-        problems = set()
-        solved_subs = []
+        return [submission for submission, contest in SubFilter._solved_with_contests(submissions)]
 
-        for submission in submissions:
+    @staticmethod
+    def _solved_with_contests(submissions):
+        """Same as `filter_solved`, with the contest of every submission or None if unknown."""
+        contest_by_id = cache2.contest_cache.contest_by_id
+        problems = set()
+        solved = []
+        accepted = [submission for submission in submissions if submission.verdict == 'OK']
+        accepted.sort(key=lambda sub: sub.creationTimeSeconds)
+        for submission in accepted:
             problem = submission.problem
-            contest = cache2.contest_cache.contest_by_id.get(problem.contestId, None)
-            if submission.verdict == 'OK':
-                # Assume (name, contest start time) is a unique identifier for problems
-                problem_key = (problem.name, contest.startTimeSeconds if contest else 0)
-                if problem_key not in problems:
-                    solved_subs.append(submission)
-                    problems.add(problem_key)
-        return solved_subs
+            contest = contest_by_id.get(problem.contestId, None)
+            # Assume (name, contest start time) is a unique identifier for problems
+            problem_key = (problem.name, contest.startTimeSeconds if contest else 0)
+            if problem_key not in problems:
+                solved.append((submission, contest))
+                problems.add(problem_key)
+        return solved
 
     def filter_subs(self, submissions):
-        submissions = SubFilter.filter_solved(submissions)
         filtered_subs = []
-        for submission in submissions:
+        for submission, contest in SubFilter._solved_with_contests(submissions):
             problem = submission.problem
-            contest = cache2.contest_cache.contest_by_id.get(problem.contestId, None)
             type_ok = submission.author.participantType in self.types
             date_ok = self.dlo <= submission.creationTimeSeconds < self.dhi
             tag_ok = not self.tags or problem.tag_matches(self.tags)
@@ -457,13 +459,15 @@ class SubFilter:
             index_ok = not self.indices or any(index.lower() == problem.index.lower() for index in self.indices)
             contest_ok = not self.contests or (contest and contest.matches(self.contests))
             team_ok = self.team or len(submission.author.members) == 1
+            # Same as not is_nonstandard_problem, without looking up the contest again.
+            standard = (contest is not None and not is_nonstandard_contest(contest) and
+                        not problem.tag_matches(['*special']))
             if self.rated:
-                problem_ok = contest and contest.id < cf.GYM_ID_THRESHOLD and not is_nonstandard_problem(problem)
+                problem_ok = contest and contest.id < cf.GYM_ID_THRESHOLD and standard
                 rating_ok = problem.rating and self.rlo <= problem.rating <= self.rhi
             else:
                 # acmsguru and gym allowed
-                problem_ok = (not contest or contest.id >= cf.GYM_ID_THRESHOLD
-                              or not is_nonstandard_problem(problem))
+                problem_ok = not contest or contest.id >= cf.GYM_ID_THRESHOLD or standard
                 rating_ok = True
             if type_ok and date_ok and rating_ok and tag_ok and notag_ok and team_ok and problem_ok and contest_ok and index_ok:
                 filtered_subs.append(submission)
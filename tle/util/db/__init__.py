@@ -1,2 +1,3 @@
 from .cache_db_conn import *
 from .user_db_conn import *
+from .submission_db_conn import *
@@ -0,0 +1,452 @@
+"""Backups of the SQLite databases.
+
+A backup is a compressed base snapshot of the database plus compressed change segments taken
+since. Triggers log the rowid of every changed row in a `_changelog` table, and a segment holds
+the current contents of those rows, or marks them deleted. Replaying the segments over the base
+with `restore` gives back the database, so the size of an upload and the time to restore grow
+with the number of changes instead of the size of the database.
+
+The objects of a backup are listed in a manifest. A new base is taken when the schema changes,
+when the segments grow too large compared to the base, or when the database does not descend
+from the base in the manifest.
+"""
+
+import atexit
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+from os import environ
+from firebase_admin import storage
+from tle import constants
+
+logger = logging.getLogger(__name__)
+
+bucket = None
+STORAGE_BUCKET = str(environ.get('STORAGE_BUCKET'))
+if STORAGE_BUCKET!='None':
+    bucket = storage.bucket()
+
+_CHANGELOG_TABLE = '_changelog'
+# Holds the name of the base the database descends from.
+_STATE_TABLE = '_backup_state'
+_TRIGGER_PREFIX = '_changelog_'
+# Take a new base once there are this many segments, or once they add up to this fraction of
+# the size of the base.
+_MAX_SEGMENTS = 100
+_MAX_SEGMENTS_SIZE_RATIO = 0.5
+
+_services = []
+# Blob names of the databases which could not be restored.
+_failed_restores = set()
+
+
+class BackupError(Exception):
+    pass
+
+
+class FirebaseStore:
+    """Backup objects in the Firebase storage bucket."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def put(self, name, data):
+        self.bucket.blob(name).upload_from_string(data)
+
+    def put_file(self, name, path):
+        self.bucket.blob(name).upload_from_filename(path)
+
+    def get(self, name):
+        blob = self.bucket.blob(name)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+
+    def get_file(self, name, path):
+        blob = self.bucket.blob(name)
+        if not blob.exists():
+            return False
+        blob.download_to_filename(path)
+        return True
+
+    def delete(self, name):
+        blob = self.bucket.blob(name)
+        if blob.exists():
+            blob.delete()
+
+
+class DirectoryStore:
+    """Backup objects in a local directory, which can stand in for the bucket."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, name):
+        path = os.path.join(self.directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def put(self, name, data):
+        with open(self._path(name), 'wb') as f:
+            f.write(data)
+
+    def put_file(self, name, path):
+        shutil.copyfile(path, self._path(name))
+
+    def get(self, name):
+        try:
+            with open(self._path(name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def get_file(self, name, path):
+        try:
+            shutil.copyfile(self._path(name), path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+def get_store():
+    """Returns the store for backups, or None if backups are disabled."""
+    if bucket is not None:
+        return FirebaseStore(bucket)
+    if constants.BACKUP_DIR_PATH:
+        return DirectoryStore(constants.BACKUP_DIR_PATH)
+    return None
+
+
+def _manifest_name(blob_name):
+    return f'{blob_name}-backup/manifest.json'
+
+
+def _user_tables(conn):
+    # Tables starting with an underscore are for bookkeeping.
+    query = ('SELECT name, sql FROM sqlite_master '
+             'WHERE type = \'table\' AND name NOT LIKE \'sqlite_%\' '
+             '    AND name NOT LIKE \'\\_%\' ESCAPE \'\\\' '
+             'ORDER BY name')
+    return conn.execute(query).fetchall()
+
+
+def _schema_hash(conn):
+    schema = '\n'.join(sql for _, sql in _user_tables(conn))
+    return hashlib.sha1(schema.encode()).hexdigest()
+
+
+def _install_triggers(conn):
+    """(Re)create the changelog table and the triggers feeding it for every table."""
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {_CHANGELOG_TABLE} ('
+                 'seq       INTEGER PRIMARY KEY,'
+                 'tbl       TEXT NOT NULL,'
+                 'row_id    INTEGER NOT NULL'
+                 ')')
+    conn.execute(f'CREATE TABLE IF NOT EXISTS {_STATE_TABLE} (base TEXT)')
+    query = ('SELECT name FROM sqlite_master '
+             'WHERE type = \'trigger\' AND name LIKE ?')
+    for name, in conn.execute(query, (_TRIGGER_PREFIX + '%',)).fetchall():
+        conn.execute(f'DROP TRIGGER "{name}"')
+    log = f'INSERT INTO {_CHANGELOG_TABLE} (tbl, row_id) VALUES'
+    for table, _ in _user_tables(conn):
+        trigger = f'"{_TRIGGER_PREFIX}{table}'
+        conn.execute(f'CREATE TRIGGER {trigger}_insert" AFTER INSERT ON "{table}" BEGIN '
+                     f'{log} (\'{table}\', NEW.rowid); END')
+        conn.execute(f'CREATE TRIGGER {trigger}_update" AFTER UPDATE ON "{table}" BEGIN '
+                     f'{log} (\'{table}\', OLD.rowid); {log} (\'{table}\', NEW.rowid); END')
+        conn.execute(f'CREATE TRIGGER {trigger}_delete" AFTER DELETE ON "{table}" BEGIN '
+                     f'{log} (\'{table}\', OLD.rowid); END')
+
+
+def _set_base(conn, base):
+    conn.execute(f'DELETE FROM {_STATE_TABLE}')
+    if base is not None:
+        conn.execute(f'INSERT INTO {_STATE_TABLE} (base) VALUES (?)', (base,))
+
+
+def _get_base(conn):
+    query = ('SELECT 1 FROM sqlite_master WHERE type = \'table\' AND name = ?')
+    if conn.execute(query, (_STATE_TABLE,)).fetchone() is None:
+        return None
+    res = conn.execute(f'SELECT base FROM {_STATE_TABLE}').fetchone()
+    return res and res[0]
+
+
+def _apply_segment(conn, segment):
+    for table, changes in segment.items():
+        conn.executemany(f'DELETE FROM "{table}" WHERE rowid = ?',
+                         [(row_id,) for row_id in changes['deleted']])
+        columns = ', '.join(['rowid'] + [f'"{column}"' for column in changes['columns']])
+        placeholders = ', '.join('?' * (len(changes['columns']) + 1))
+        conn.executemany(f'INSERT OR REPLACE INTO "{table}" ({columns}) VALUES ({placeholders})',
+                         changes['rows'])
+
+
+def _remove_wal(db_file):
+    # A write-ahead log left over from before would be replayed onto the restored database.
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+
+def restore(db_file, blob_name):
+    """Restore the database from its backup, if there is one. Runs at startup.
+
+    Every object of the backup is downloaded and the database is rebuilt in a temporary file
+    before it replaces `db_file`, so the database is left alone if any of it fails. Backups of
+    the database are then turned off until a restart, as a new base would replace the history
+    which could not be restored.
+    """
+    store = get_store()
+    if store is None:
+        return
+    begin = time.perf_counter()
+    manifest = store.get(_manifest_name(blob_name))
+    if manifest is None:
+        # Backups made before the delta format are a plain copy of the database.
+        restore_file = db_file + '.restore'
+        if store.get_file(blob_name, restore_file):
+            os.replace(restore_file, db_file)
+            _remove_wal(db_file)
+            logger.info(f'Restored {db_file} from full copy {blob_name}')
+        return
+    manifest = json.loads(manifest)
+    try:
+        _restore_manifest(store, db_file, manifest)
+    except Exception:
+        _failed_restores.add(blob_name)
+        raise
+    logger.info(f'Restored {db_file} from base and {len(manifest["segments"])} segments of '
+                f'{blob_name} in {time.perf_counter() - begin:.1f}s')
+
+
+def _restore_manifest(store, db_file, manifest):
+    segments = []
+    for name in manifest['segments']:
+        data = store.get(name)
+        if data is None:
+            raise BackupError(f'Segment {name} of the backup is missing')
+        segments.append(json.loads(gzip.decompress(data)))
+
+    restore_file = db_file + '.restore'
+    compressed_file = restore_file + '.gz'
+    try:
+        if not store.get_file(manifest['base'], compressed_file):
+            raise BackupError(f'Base {manifest["base"]} of the backup is missing')
+        with gzip.open(compressed_file, 'rb') as src, open(restore_file, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        _remove_wal(restore_file)
+        conn = sqlite3.connect(restore_file)
+        try:
+            for segment in segments:
+                _apply_segment(conn, segment)
+            # Replaying fired the triggers, but those changes are already backed up.
+            conn.execute(f'DELETE FROM {_CHANGELOG_TABLE}')
+            _set_base(conn, manifest['base'])
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(restore_file, db_file)
+        _remove_wal(db_file)
+    finally:
+        for path in (compressed_file, restore_file):
+            if os.path.exists(path):
+                os.remove(path)
+        _remove_wal(restore_file)
+
+
+class BackupService:
+    """Backs up a SQLite database from a worker thread.
+
+    Writers only mark the database dirty. Writes are coalesced and a base snapshot, taken with
+    SQLite's online backup API, or a change segment is uploaded at most once every `interval`
+    seconds. Anything not yet uploaded is flushed when the service is closed or the process
+    exits.
+    """
+
+    def __init__(self, db_file, blob_name, *, interval=constants.DB_BACKUP_INTERVAL):
+        self.db_file = db_file
+        self.blob_name = blob_name
+        self.interval = interval
+        self.store = get_store()
+        if self.store is not None and blob_name in _failed_restores:
+            logger.warning(f'Backups of {db_file} are disabled, it could not be restored')
+            self.store = None
+        self._manifest = None
+        self._pending = False
+        self._last_upload = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._upload_lock = threading.Lock()
+        if self.store is not None:
+            # Changes have to be logged from now on, so make sure the triggers exist.
+            conn = self._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                if not self._has_changelog(conn):
+                    _install_triggers(conn)
+                conn.execute('COMMIT')
+            finally:
+                conn.close()
+            thread = threading.Thread(target=self._run, name=f'Backup-{blob_name}', daemon=True)
+            thread.start()
+        _services.append(self)
+
+    def mark_dirty(self):
+        if self.store is None:
+            return
+        self._pending = True
+        self._wakeup.set()
+
+    def flush(self):
+        """Upload the changes now if there are any which have not been uploaded."""
+        with self._upload_lock:
+            if not self._pending:
+                return
+            self._pending = False
+            self._last_upload = time.monotonic()
+            try:
+                self._upload()
+            except Exception:
+                logger.exception(f'Backup of {self.db_file} failed, will retry')
+                self._pending = True
+                self._wakeup.set()
+
+    def close(self):
+        self._stopped.set()
+        self._wakeup.set()
+        self.flush()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            if self._stopped.is_set():
+                return
+            # Coalesce the writes made until the next upload is due.
+            delay = self._last_upload + self.interval - time.monotonic()
+            if delay > 0 and self._stopped.wait(delay):
+                return
+            self._wakeup.clear()
+            self.flush()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def _has_changelog(conn):
+        query = 'SELECT 1 FROM sqlite_master WHERE type = \'table\' AND name = ?'
+        return conn.execute(query, (_CHANGELOG_TABLE,)).fetchone() is not None
+
+    def _upload(self):
+        if self._manifest is None:
+            manifest = self.store.get(_manifest_name(self.blob_name))
+            self._manifest = manifest and json.loads(manifest)
+        conn = self._connect()
+        try:
+            if self._needs_base(conn):
+                self._upload_base(conn)
+            else:
+                self._upload_segment(conn)
+        finally:
+            conn.close()
+
+    def _needs_base(self, conn):
+        manifest = self._manifest
+        if (manifest is None or manifest['schema'] != _schema_hash(conn) or
+                manifest['base'] != _get_base(conn)):
+            return True
+        return (len(manifest['segments']) >= _MAX_SEGMENTS or
+                manifest['segments_size'] > _MAX_SEGMENTS_SIZE_RATIO * manifest['base_size'])
+
+    def _upload_base(self, conn):
+        # Start the changelog afresh, everything before this point is in the base.
+        name = f'{self.blob_name}-backup/base-{time.time_ns()}.db.gz'
+        conn.execute('BEGIN IMMEDIATE')
+        _install_triggers(conn)
+        conn.execute(f'DELETE FROM {_CHANGELOG_TABLE}')
+        _set_base(conn, name)
+        schema = _schema_hash(conn)
+        conn.execute('COMMIT')
+
+        snapshot_file = self.db_file + '.backup'
+        compressed_file = snapshot_file + '.gz'
+        dest = sqlite3.connect(snapshot_file)
+        try:
+            conn.backup(dest)
+        finally:
+            dest.close()
+        try:
+            with open(snapshot_file, 'rb') as src, gzip.open(compressed_file, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            self.store.put_file(name, compressed_file)
+            size = os.path.getsize(compressed_file)
+        finally:
+            os.remove(snapshot_file)
+            if os.path.exists(compressed_file):
+                os.remove(compressed_file)
+
+        manifest = {'schema': schema, 'base': name, 'base_size': size, 'segments': [],
+                    'segments_size': 0}
+        self._replace_manifest(manifest)
+        logger.info(f'Uploaded base backup of {self.db_file}, {size} bytes')
+
+    def _upload_segment(self, conn):
+        conn.execute('BEGIN')
+        last_seq, = conn.execute(f'SELECT MAX(seq) FROM {_CHANGELOG_TABLE}').fetchone()
+        if last_seq is None:
+            conn.execute('COMMIT')
+            return
+        query = f'SELECT DISTINCT tbl, row_id FROM {_CHANGELOG_TABLE} WHERE seq <= ?'
+        row_ids_by_table = {}
+        change_count = 0
+        for table, row_id in conn.execute(query, (last_seq,)):
+            row_ids_by_table.setdefault(table, set()).add(row_id)
+            change_count += 1
+        segment = {}
+        for table, row_ids in row_ids_by_table.items():
+            cursor = conn.execute(f'SELECT rowid, * FROM "{table}" WHERE rowid IN '
+                                  f'(SELECT value FROM json_each(?))', (json.dumps(list(row_ids)),))
+            rows = cursor.fetchall()
+            columns = [column[0] for column in cursor.description[1:]]
+            deleted = row_ids - {row[0] for row in rows}
+            segment[table] = {'columns': columns, 'rows': rows, 'deleted': sorted(deleted)}
+        conn.execute('COMMIT')
+
+        data = gzip.compress(json.dumps(segment).encode())
+        name = f'{self.blob_name}-backup/segment-{time.time_ns()}.json.gz'
+        self.store.put(name, data)
+        manifest = dict(self._manifest)
+        manifest['segments'] = manifest['segments'] + [name]
+        manifest['segments_size'] += len(data)
+        self._replace_manifest(manifest)
+        conn.execute(f'DELETE FROM {_CHANGELOG_TABLE} WHERE seq <= ?', (last_seq,))
+        logger.info(f'Uploaded backup segment of {self.db_file} with {change_count} changed rows, '
+                    f'{len(data)} bytes')
+
+    def _replace_manifest(self, manifest):
+        old_manifest = self._manifest
+        self.store.put(_manifest_name(self.blob_name), json.dumps(manifest).encode())
+        self._manifest = manifest
+        if old_manifest is not None and old_manifest['base'] != manifest['base']:
+            for name in [old_manifest['base']] + old_manifest['segments']:
+                self.store.delete(name)
+
+
+@atexit.register
+def flush_all():
+    """Flush every backup service. Runs on shutdown."""
+    for service in _services:
+        service.close()
@@ -1,28 +1,25 @@
 import json
-import sqlite3
 
 from tle.util import codeforces_api as cf
+from tle.util.db.backup import BackupService
+from tle.util.db.executor import AsyncDb, ThreadLocalConnection, writes
+from tle.util.db.rating_history_index import RatingHistoryIndex
 
-from os import environ
-from tle import constants
-from firebase_admin import storage
-
-bucket = None
-STORAGE_BUCKET = str(environ.get('STORAGE_BUCKET'))
-if STORAGE_BUCKET!='None':
-    bucket = storage.bucket()
 
 class CacheDbConn:
     def __init__(self, db_file):
-        self.conn = sqlite3.connect(db_file)
+        self.connection = ThreadLocalConnection(db_file)
+        self.aio = AsyncDb(self)
         self.create_tables()
+        self.backup = BackupService(db_file, 'tle_cache.db')
+
+    @property
+    def conn(self):
+        return self.connection.get()
 
-    # update the data in firebase
+    # schedule an update of the data in firebase
     def update(self):
-        if bucket==None:
-            return
-        blob = bucket.blob('tle_cache.db')
-        blob.upload_from_filename(constants.CACHE_DB_FILE_PATH)
+        self.backup.mark_dirty()
 
     def create_tables(self):
         # Table for contests from the contest.list endpoint.
@@ -55,21 +52,33 @@ class CacheDbConn:
         )
 
         # Table for rating changes fetched from contest.ratingChanges endpoint for every contest.
+        self._create_rating_change_table('rating_change')
+        self._create_rating_change_indexes()
+
+        # Table of the contests whose rating changes are being refetched by a backfill into the
+        # table rating_change_shadow, which replaces rating_change once the backfill is done.
+        # Empty when no backfill is in progress.
         self.conn.execute(
-            'CREATE TABLE IF NOT EXISTS rating_change ('
+            'CREATE TABLE IF NOT EXISTS rating_change_backfill ('
             'contest_id           INTEGER NOT NULL,'
+            'done                 INTEGER NOT NULL DEFAULT 0,'
+            'PRIMARY KEY (contest_id)'
+            ')'
+        )
+
+        # Table for the latest rating of every handle, kept up to date as rating changes are
+        # saved so that it does not have to be computed from all of rating_change.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS latest_rating ('
             'handle               TEXT NOT NULL,'
-            'rank                 INTEGER,'
+            'rating               INTEGER,'
             'rating_update_time   INTEGER,'
-            'old_rating           INTEGER,'
-            'new_rating           INTEGER,'
-            'UNIQUE (contest_id, handle)'
+            'PRIMARY KEY (handle)'
             ')'
         )
-        self.conn.execute('CREATE INDEX IF NOT EXISTS ix_rating_change_contest_id '
-                          'ON rating_change (contest_id)')
-        self.conn.execute('CREATE INDEX IF NOT EXISTS ix_rating_change_handle '
-                          'ON rating_change (handle)')
+        if self._latest_rating_empty():
+            self._rebuild_latest_ratings()
+            self.conn.commit()
 
         # Table for problems fetched from contest.standings endpoint for every contest.
         # This is separate from table problem as it contains the same problem twice if it
@@ -90,6 +99,53 @@ class CacheDbConn:
         self.conn.execute('CREATE INDEX IF NOT EXISTS ix_problem2_contest_id '
                           'ON problem2 (contest_id)')
 
+        # Table mapping every problem of problem2, identified by its name and the start time of
+        # its contest, to the contest it appears in. A problem shared by the divisions of a round
+        # has one row per division. Kept up to date as problemsets are saved.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS problem_contest ('
+            'name             TEXT NOT NULL,'
+            'start_time       INTEGER NOT NULL,'
+            'contest_id       INTEGER NOT NULL,'
+            'PRIMARY KEY (name, start_time, contest_id)'
+            ')'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS ix_problem_contest_contest_id '
+                          'ON problem_contest (contest_id)')
+        if self._problem_contest_empty():
+            self._rebuild_problem_contests()
+            self.conn.commit()
+
+        # Table of the contests whose problemsets are being refetched by a backfill, so that an
+        # interrupted backfill can be resumed. Empty when no backfill is in progress.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS problemset_backfill ('
+            'contest_id       INTEGER NOT NULL,'
+            'done             INTEGER NOT NULL DEFAULT 0,'
+            'PRIMARY KEY (contest_id)'
+            ')'
+        )
+
+    def _create_rating_change_table(self, name):
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {name} ('
+            'contest_id           INTEGER NOT NULL,'
+            'handle               TEXT NOT NULL,'
+            'rank                 INTEGER,'
+            'rating_update_time   INTEGER,'
+            'old_rating           INTEGER,'
+            'new_rating           INTEGER,'
+            'UNIQUE (contest_id, handle)'
+            ')'
+        )
+
+    def _create_rating_change_indexes(self):
+        self.conn.execute('CREATE INDEX IF NOT EXISTS ix_rating_change_contest_id '
+                          'ON rating_change (contest_id)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS ix_rating_change_handle '
+                          'ON rating_change (handle)')
+
+    @writes
     def cache_contests(self, contests):
         query = ('INSERT OR REPLACE INTO contest '
                  '(id, name, start_time, duration, type, phase, prepared_by) '
@@ -110,6 +166,7 @@ class CacheDbConn:
         return (problem.contestId, problem.problemsetName, problem.index, problem.name,
                 problem.type, problem.points, problem.rating, json.dumps(problem.tags))
 
+    @writes
     def cache_problems(self, problems):
         query = ('INSERT OR REPLACE INTO problem '
                  '(contest_id, problemset_name, [index], name, type, points, rating, tags) '
@@ -130,30 +187,127 @@ class CacheDbConn:
         res = self.conn.execute(query).fetchall()
         return list(map(self._unsquish_tags, res))
 
-    def save_rating_changes(self, changes):
+    def _insert_rating_changes(self, table, changes):
         change_tuples = [(change.contestId,
                           change.handle,
                           change.rank,
                           change.ratingUpdateTimeSeconds,
                           change.oldRating,
                           change.newRating) for change in changes]
-        query = ('INSERT OR REPLACE INTO rating_change '
+        query = (f'INSERT OR REPLACE INTO {table} '
                  '(contest_id, handle, rank, rating_update_time, old_rating, new_rating) '
                  'VALUES (?, ?, ?, ?, ?, ?)')
-        rc = self.conn.executemany(query, change_tuples).rowcount
+        return self.conn.executemany(query, change_tuples).rowcount
+
+    @writes
+    def save_rating_changes(self, changes):
+        rc = self._insert_rating_changes('rating_change', changes)
+        query = ('INSERT INTO latest_rating (handle, rating, rating_update_time) '
+                 'VALUES (?, ?, ?) '
+                 'ON CONFLICT (handle) DO UPDATE '
+                 'SET rating = excluded.rating, rating_update_time = excluded.rating_update_time '
+                 'WHERE excluded.rating_update_time >= latest_rating.rating_update_time')
+        self.conn.executemany(query, [(change.handle, change.newRating,
+                                       change.ratingUpdateTimeSeconds) for change in changes])
         self.conn.commit()
         self.update()
         return rc
 
+    @writes
     def clear_rating_changes(self, contest_id=None):
+        """Deletes the rating changes of the contest, or all of them. Returns the handles whose
+        changes were deleted, or None if all were."""
+        handles = None
         if contest_id is None:
             query = 'DELETE FROM rating_change'
             self.conn.execute(query)
+            query = 'DELETE FROM latest_rating'
+            self.conn.execute(query)
         else:
+            query = 'SELECT handle FROM rating_change WHERE contest_id = ?'
+            handles = [handle for handle, in self.conn.execute(query, (contest_id,))]
             query = 'DELETE FROM rating_change WHERE contest_id = ?'
             self.conn.execute(query, (contest_id,))
+            self._rebuild_latest_ratings(handles)
+        self.conn.commit()
+        self.update()
+        return handles
+
+    @writes
+    def begin_rating_change_backfill(self, contest_ids):
+        """Start a backfill of the rating changes of the given contests into an empty shadow
+        table."""
+        self.conn.execute('BEGIN IMMEDIATE')
+        self.conn.execute('DROP TABLE IF EXISTS rating_change_shadow')
+        self._create_rating_change_table('rating_change_shadow')
+        self.conn.execute('DELETE FROM rating_change_backfill')
+        query = ('INSERT INTO rating_change_backfill (contest_id) '
+                 'VALUES (?)')
+        self.conn.executemany(query, [(contest_id,) for contest_id in contest_ids])
+        self.conn.commit()
+        self.update()
+
+    def fetch_rating_change_backfill(self):
+        """Returns the ids of the contests the backfill in progress has yet to fetch, and the
+        number of contests it has fetched."""
+        query = ('SELECT contest_id, done '
+                 'FROM rating_change_backfill '
+                 'ORDER BY contest_id')
+        res = self.conn.execute(query).fetchall()
+        return [contest_id for contest_id, done in res if not done], sum(done for _, done in res)
+
+    @writes
+    def save_backfilled_rating_changes(self, contest_ids, changes):
+        """Save rating changes to the shadow table and mark the given contests as fetched by the
+        backfill, in one transaction."""
+        rc = self._insert_rating_changes('rating_change_shadow', changes)
+        self.conn.execute('UPDATE rating_change_backfill SET done = 1 '
+                          'WHERE contest_id IN (SELECT value FROM json_each(?))',
+                          (json.dumps(list(contest_ids)),))
         self.conn.commit()
         self.update()
+        return rc
+
+    @writes
+    def finish_rating_change_backfill(self):
+        """Replace rating_change with the shadow table and recompute the latest ratings, in one
+        transaction so that readers see either the old or the new table."""
+        self.conn.execute('BEGIN IMMEDIATE')
+        # Keep the changes of contests the backfill has none for, such as contests that were
+        # rated while it ran or whose fetch failed.
+        self.conn.execute('INSERT OR IGNORE INTO rating_change_shadow '
+                          'SELECT * FROM rating_change '
+                          'WHERE contest_id NOT IN ('
+                          '    SELECT DISTINCT contest_id FROM rating_change_shadow)')
+        self.conn.execute('DROP TABLE rating_change')
+        self.conn.execute('ALTER TABLE rating_change_shadow RENAME TO rating_change')
+        self._create_rating_change_indexes()
+        self.conn.execute('DELETE FROM latest_rating')
+        self._rebuild_latest_ratings()
+        self.conn.execute('DELETE FROM rating_change_backfill')
+        self.conn.commit()
+        self.update()
+
+    def _latest_rating_empty(self):
+        query = 'SELECT 1 FROM latest_rating'
+        res = self.conn.execute(query).fetchone()
+        return res is None
+
+    def _rebuild_latest_ratings(self, handles=None):
+        """Recompute the latest ratings of the given handles, or of everyone, from rating_change.
+        Does not commit."""
+        # SQLite takes the bare column new_rating from the row with the maximum time.
+        query = ('INSERT OR REPLACE INTO latest_rating (handle, rating, rating_update_time) '
+                 'SELECT handle, new_rating, MAX(rating_update_time) '
+                 'FROM rating_change ')
+        if handles is None:
+            self.conn.execute(query + 'GROUP BY handle')
+            return
+        handles = json.dumps(handles)
+        self.conn.execute('DELETE FROM latest_rating '
+                          'WHERE handle IN (SELECT value FROM json_each(?))', (handles,))
+        self.conn.execute(query + 'WHERE handle IN (SELECT value FROM json_each(?)) '
+                                  'GROUP BY handle', (handles,))
 
     def get_users_with_more_than_n_contests(self, time_cutoff, n):
         query = ('SELECT handle, COUNT(*) AS num_contests '
@@ -162,6 +316,16 @@ class CacheDbConn:
         res = self.conn.execute(query, (n, time_cutoff,)).fetchall()
         return [user[0] for user in res]
 
+    def get_latest_ratings(self, handles=None):
+        """Returns a mapping from handle to rating after the latest rating change, for the given
+        handles or for everyone."""
+        query = ('SELECT handle, rating '
+                 'FROM latest_rating')
+        if handles is None:
+            return dict(self.conn.execute(query))
+        query += ' WHERE handle IN (SELECT value FROM json_each(?))'
+        return dict(self.conn.execute(query, (json.dumps(list(handles)),)))
+
     def get_all_rating_changes(self):
         query = ('SELECT contest_id, name, handle, rank, rating_update_time, old_rating, new_rating '
                  'FROM rating_change r '
@@ -171,6 +335,9 @@ class CacheDbConn:
         res = self.conn.execute(query)
         return (cf.RatingChange._make(change) for change in res)
 
+    def load_rating_history_index(self, handles=None):
+        return RatingHistoryIndex.load(self.conn, handles)
+
     def get_rating_changes_for_contest(self, contest_id):
         query = ('SELECT contest_id, name, handle, rank, rating_update_time, old_rating, new_rating '
                  'FROM rating_change r '
@@ -192,32 +359,30 @@ class CacheDbConn:
                  'FROM rating_change r '
                  'LEFT JOIN contest c '
                  'ON r.contest_id = c.id '
-                 'WHERE r.handle = ?')
+                 'WHERE r.handle = ? '
+                 'ORDER BY rating_update_time')
         res = self.conn.execute(query, (handle,)).fetchall()
         return [cf.RatingChange._make(change) for change in res]
 
+    @writes
     def cache_problemset(self, problemset):
         query = ('INSERT OR REPLACE INTO problem2 '
                  '(contest_id, problemset_name, [index], name, type, points, rating, tags) '
                  'VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
         rc = self.conn.executemany(query, list(map(self._squish_tags, problemset))).rowcount
+        self._rebuild_problem_contests({problem.contestId for problem in problemset})
         self.conn.commit()
         self.update()
         return rc
 
-    def fetch_problems2(self):
-        query = ('SELECT contest_id, problemset_name, [index], name, type, points, rating, tags '
-                 'FROM problem2 ')
-        res = self.conn.execute(query).fetchall()
-        return list(map(self._unsquish_tags, res))
-
+    @writes
     def clear_problemset(self, contest_id=None):
         if contest_id is None:
-            query = 'DELETE FROM problem2'
-            self.conn.execute(query)
+            self.conn.execute('DELETE FROM problem2')
+            self.conn.execute('DELETE FROM problem_contest')
         else:
-            query = 'DELETE FROM problem2 WHERE contest_id = ?'
-            self.conn.execute(query, (contest_id,))
+            self.conn.execute('DELETE FROM problem2 WHERE contest_id = ?', (contest_id,))
+            self.conn.execute('DELETE FROM problem_contest WHERE contest_id = ?', (contest_id,))
 
     def fetch_problemset(self, contest_id):
         query = ('SELECT contest_id, problemset_name, [index], name, type, points, rating, tags '
@@ -226,10 +391,85 @@ class CacheDbConn:
         res = self.conn.execute(query, (contest_id,)).fetchall()
         return list(map(self._unsquish_tags, res))
 
+    def _problem_contest_empty(self):
+        query = 'SELECT 1 FROM problem_contest'
+        res = self.conn.execute(query).fetchone()
+        return res is None
+
+    def _rebuild_problem_contests(self, contest_ids=None):
+        """Recompute the rows of problem_contest of the given contests, or of every contest, from
+        problem2. Problems of contests that are not in the contest table are left out. Does not
+        commit."""
+        query = ('INSERT OR REPLACE INTO problem_contest (name, start_time, contest_id) '
+                 'SELECT problem2.name, contest.start_time, problem2.contest_id '
+                 'FROM problem2 JOIN contest ON contest.id = problem2.contest_id ')
+        if contest_ids is None:
+            self.conn.execute('DELETE FROM problem_contest')
+            self.conn.execute(query)
+            return
+        contest_ids = json.dumps(list(contest_ids))
+        self.conn.execute('DELETE FROM problem_contest '
+                          'WHERE contest_id IN (SELECT value FROM json_each(?))', (contest_ids,))
+        self.conn.execute(query + 'WHERE problem2.contest_id IN (SELECT value FROM json_each(?))',
+                          (contest_ids,))
+
+    def fetch_problem_contests(self, contest_ids=None):
+        """Returns the (name, start_time, contest_id) rows of problem_contest of the given
+        contests, or of every contest."""
+        query = ('SELECT name, start_time, contest_id '
+                 'FROM problem_contest ')
+        if contest_ids is None:
+            return self.conn.execute(query).fetchall()
+        query += 'WHERE contest_id IN (SELECT value FROM json_each(?))'
+        return self.conn.execute(query, (json.dumps(list(contest_ids)),)).fetchall()
+
+    @writes
+    def begin_problemset_backfill(self, contest_ids):
+        query = ('INSERT OR IGNORE INTO problemset_backfill (contest_id) '
+                 'VALUES (?)')
+        self.conn.executemany(query, [(contest_id,) for contest_id in contest_ids])
+        self.conn.commit()
+        self.update()
+
+    def fetch_problemset_backfill(self):
+        """Returns the ids of the contests the backfill in progress has yet to fetch, and the
+        number of contests it has fetched."""
+        query = ('SELECT contest_id, done '
+                 'FROM problemset_backfill '
+                 'ORDER BY contest_id')
+        res = self.conn.execute(query).fetchall()
+        return [contest_id for contest_id, done in res if not done], sum(done for _, done in res)
+
+    @writes
+    def save_backfilled_problemsets(self, contest_ids, problems):
+        """Replace the problemsets of the contests that have problems with them and mark all the
+        contests as fetched by the backfill, in one transaction."""
+        fetched_ids = json.dumps(list({problem.contestId for problem in problems}))
+        self.conn.execute('DELETE FROM problem2 '
+                          'WHERE contest_id IN (SELECT value FROM json_each(?))', (fetched_ids,))
+        query = ('INSERT OR REPLACE INTO problem2 '
+                 '(contest_id, problemset_name, [index], name, type, points, rating, tags) '
+                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+        rc = self.conn.executemany(query, list(map(self._squish_tags, problems))).rowcount
+        self._rebuild_problem_contests({problem.contestId for problem in problems})
+        self.conn.execute('UPDATE problemset_backfill SET done = 1 '
+                          'WHERE contest_id IN (SELECT value FROM json_each(?))',
+                          (json.dumps(list(contest_ids)),))
+        self.conn.commit()
+        self.update()
+        return rc
+
+    @writes
+    def clear_problemset_backfill(self):
+        self.conn.execute('DELETE FROM problemset_backfill')
+        self.conn.commit()
+        self.update()
+
     def problemset_empty(self):
         query = 'SELECT 1 FROM problem2'
         res = self.conn.execute(query).fetchone()
         return res is None
 
     def close(self):
-        self.conn.close()
+        self.backup.close()
+        self.connection.close()
@@ -0,0 +1,134 @@
+import asyncio
+import bisect
+import functools
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from tle import constants
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+_LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_executor = ThreadPoolExecutor(max_workers=constants.DB_THREADS, thread_name_prefix='db')
+# SQLite lets one connection write at a time, writes on the pool would only hold up reads waiting
+# for the lock.
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+LatencyStats = namedtuple('LatencyStats', 'name count avg p50 p99 max')
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(_LATENCY_BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(_LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Returns the upper bound in seconds of the bucket holding the q-th percentile, or None
+        for the overflow bucket."""
+        target = q / 100 * sum(self.counts)
+        seen = 0
+        for bound, count in zip(_LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound / 1000
+        return None
+
+    def stats(self, name):
+        count = sum(self.counts)
+        return LatencyStats(name, count, self.total / count, self.percentile(50),
+                            self.percentile(99), self.max)
+
+
+def _record(name, seconds):
+    with _histograms_lock:
+        if name not in _histograms:
+            _histograms[name] = LatencyHistogram()
+        _histograms[name].add(seconds)
+
+
+def writes(method):
+    """Marks a method of a database connection class as one that writes to the database, so
+    that `AsyncDb` runs it on the writer thread."""
+    method.writes = True
+    return method
+
+
+def latency_stats():
+    """Returns the latency stats of every method that was run through `AsyncDb`, busiest first."""
+    with _histograms_lock:
+        stats = [histogram.stats(name) for name, histogram in _histograms.items()]
+    return sorted(stats, key=lambda stats: stats.count, reverse=True)
+
+
+class ThreadLocalConnection:
+    """Hands out one connection to the database per thread, so that the database can be used
+    from the DB thread pool. The database is put in WAL mode so that readers run in parallel
+    with the writer."""
+
+    def __init__(self, db_file, row_factory=None):
+        self.db_file = db_file
+        self.row_factory = row_factory
+        self._local = threading.local()
+        self._conns = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Each connection is only ever used by the thread that made it, but closing happens
+            # from elsewhere.
+            conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.row_factory = self.row_factory
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+            self._conns = []
+        self._local = threading.local()
+
+
+class AsyncDb:
+    """Runs the methods of a database connection class on the DB thread pool, or on the writer
+    thread for methods marked with `writes`.
+
+    `await db.aio.method(*args)` does the same as `db.method(*args)` without blocking the event
+    loop. The time each call takes is recorded in a latency histogram.
+    """
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, name):
+        method = getattr(self._db, name)
+        stats_name = f'{self._db.__class__.__name__}.{name}'
+        executor = _writer if getattr(method, 'writes', False) else _executor
+
+        def timed(*args, **kwargs):
+            begin = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                _record(stats_name, time.perf_counter() - begin)
+
+        async def run(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor,
+                                              functools.partial(timed, *args, **kwargs))
+        return run
@@ -0,0 +1,102 @@
+import json
+
+import numpy as np
+
+from tle.util import codeforces_api as cf
+
+
+class RatingHistoryIndex:
+    """Columnar in-memory copy of the rating_change table, for fast lookups by handle.
+
+    Handles are interned, and the rows are grouped by handle and sorted by time within a group,
+    so the rating history of the i-th handle is the slice between offsets[i] and offsets[i + 1]
+    of every column.
+    """
+    _CHUNK_SIZE = 100000
+    # Types of contest_id, rank, rating_update_time, old_rating and new_rating.
+    _DTYPES = (np.int32, np.int32, np.int64, np.int32, np.int32)
+
+    def __init__(self, handles, offsets, contest_ids, ranks, times, old_ratings, new_ratings,
+                 contest_names):
+        self.handles = handles
+        self.handle_ids = {handle: i for i, handle in enumerate(handles)}
+        self.offsets = offsets
+        self.contest_ids = contest_ids
+        self.ranks = ranks
+        self.times = times
+        self.old_ratings = old_ratings
+        self.new_ratings = new_ratings
+        self.contest_names = contest_names
+        self.counts = np.diff(offsets)
+
+    @classmethod
+    def load(cls, conn, handles=None):
+        """Load the index from a connection to the cache database, for the given handles or for
+        everyone."""
+        contest_names = dict(conn.execute('SELECT id, name FROM contest'))
+        query = ('SELECT handle, contest_id, rank, rating_update_time, old_rating, new_rating '
+                 'FROM rating_change ')
+        if handles is None:
+            cursor = conn.execute(query + 'ORDER BY handle, rating_update_time')
+        else:
+            query += ('WHERE handle IN (SELECT value FROM json_each(?)) '
+                      'ORDER BY handle, rating_update_time')
+            cursor = conn.execute(query, (json.dumps(list(handles)),))
+        handles = []
+        starts = []
+        columns = [[] for _ in range(5)]
+        total = 0
+        while True:
+            rows = cursor.fetchmany(cls._CHUNK_SIZE)
+            if not rows:
+                break
+            chunk_handles, *chunk_columns = zip(*rows)
+            chunk_handles = np.array(chunk_handles, dtype=object)
+            chunk_starts = np.flatnonzero(chunk_handles[1:] != chunk_handles[:-1]) + 1
+            if not handles or chunk_handles[0] != handles[-1]:
+                chunk_starts = np.concatenate(([0], chunk_starts))
+            handles += chunk_handles[chunk_starts].tolist()
+            starts.append(chunk_starts + total)
+            for column, values, dtype in zip(columns, chunk_columns, cls._DTYPES):
+                column.append(np.array(values, dtype=dtype))
+            total += len(rows)
+
+        offsets = np.concatenate(starts + [[total]]).astype(np.int64)
+        contest_ids, ranks, times, old_ratings, new_ratings = (
+            np.concatenate(column) if column else np.zeros(0, dtype=dtype)
+            for column, dtype in zip(columns, cls._DTYPES))
+        return cls(handles, offsets, contest_ids, ranks, times, old_ratings, new_ratings,
+                   contest_names)
+
+    def merge(self, other, handles):
+        """Returns a new index with the rows of the given handles replaced by those in other,
+        which is loaded for the same handles. Handles without rows in other are dropped."""
+        keep = np.ones(len(self.handles), dtype=bool)
+        keep[[self.handle_ids[handle] for handle in handles if handle in self.handle_ids]] = False
+        keep_rows = np.repeat(keep, self.counts)
+        kept_counts = self.counts[keep]
+        offsets = np.concatenate(([0], np.cumsum(kept_counts),
+                                  other.offsets[1:] + kept_counts.sum())).astype(np.int64)
+        columns = [np.concatenate((column[keep_rows], other_column)) for column, other_column in (
+            (self.contest_ids, other.contest_ids), (self.ranks, other.ranks),
+            (self.times, other.times), (self.old_ratings, other.old_ratings),
+            (self.new_ratings, other.new_ratings))]
+        handles = [handle for handle, kept in zip(self.handles, keep.tolist()) if kept]
+        return RatingHistoryIndex(handles + other.handles, offsets, *columns,
+                                  other.contest_names)
+
+    def __len__(self):
+        return len(self.contest_ids)
+
+    def get_rating_changes_for_handle(self, handle):
+        """Returns the rating changes of the handle, oldest first."""
+        handle_id = self.handle_ids.get(handle)
+        if handle_id is None:
+            return []
+        rows = slice(self.offsets[handle_id], self.offsets[handle_id + 1])
+        return [cf.RatingChange(contest_id, self.contest_names.get(contest_id), handle, rank,
+                                time, old_rating, new_rating)
+                for contest_id, rank, time, old_rating, new_rating in zip(
+                    self.contest_ids[rows].tolist(), self.ranks[rows].tolist(),
+                    self.times[rows].tolist(), self.old_ratings[rows].tolist(),
+                    self.new_ratings[rows].tolist())]
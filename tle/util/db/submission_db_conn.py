@@ -0,0 +1,120 @@
+import json
+
+from tle.util import codeforces_api as cf
+from tle.util.db.executor import AsyncDb, ThreadLocalConnection, writes
+
+
+class SubmissionDbConn:
+    """Local store of Codeforces submissions per handle.
+
+    Everything here can be rebuilt from the API, so unlike the other databases it is not backed
+    up to Firebase.
+    """
+
+    def __init__(self, db_file):
+        self.connection = ThreadLocalConnection(db_file)
+        self.aio = AsyncDb(self)
+        self.create_tables()
+
+    @property
+    def conn(self):
+        return self.connection.get()
+
+    def create_tables(self):
+        # Table for submissions from the user.status endpoint. A team submission shows up in the
+        # status of every member, so the id alone is not unique.
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS submission ('
+            'handle           TEXT NOT NULL COLLATE NOCASE,'
+            'id               INTEGER NOT NULL,'
+            'contest_id       INTEGER,'
+            'problem          TEXT,'
+            'author           TEXT,'
+            'language         TEXT,'
+            'verdict          TEXT,'
+            'creation_time    INTEGER,'
+            'relative_time    INTEGER,'
+            'PRIMARY KEY (handle, id)'
+            ')'
+        )
+
+    @staticmethod
+    def _squish(handle, submission):
+        author = submission.author._replace(
+            members=[member.handle for member in submission.author.members])
+        return (handle, submission.id, submission.contestId, json.dumps(submission.problem),
+                json.dumps(author), submission.programmingLanguage, submission.verdict,
+                submission.creationTimeSeconds, submission.relativeTimeSeconds)
+
+    @staticmethod
+    def _unsquish(row):
+        id_, contest_id, problem, author, language, verdict, creation_time, relative_time = row
+        problem = cf.Problem._make(json.loads(problem))
+        author = cf.Party._make(json.loads(author))
+        author = author._replace(members=[cf.Member(handle) for handle in author.members])
+        return cf.Submission(id_, contest_id, problem, author, language, verdict, creation_time,
+                             relative_time)
+
+    @writes
+    def save_submissions(self, handle, submissions):
+        query = ('INSERT OR REPLACE INTO submission '
+                 '(handle, id, contest_id, problem, author, language, verdict, creation_time, '
+                 '    relative_time) '
+                 'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)')
+        rows = [self._squish(handle, submission) for submission in submissions]
+        rc = self.conn.executemany(query, rows).rowcount
+        self.conn.commit()
+        return rc
+
+    def fetch_submissions(self, handle):
+        """Returns the submissions of the handle, newest first like the API."""
+        query = ('SELECT id, contest_id, problem, author, language, verdict, creation_time, '
+                 '    relative_time '
+                 'FROM submission '
+                 'WHERE handle = ? '
+                 'ORDER BY id DESC')
+        res = self.conn.execute(query, (handle,)).fetchall()
+        return [self._unsquish(row) for row in res]
+
+    def fetch_problem_verdicts(self, handle):
+        """Returns the distinct (problem name, verdict) pairs of the submissions of the handle."""
+        query = ('SELECT DISTINCT json_extract(problem, \'$[3]\'), verdict '
+                 'FROM submission '
+                 'WHERE handle = ?')
+        return self.conn.execute(query, (handle,)).fetchall()
+
+    def fetch_verdicts(self, handle, ids):
+        """Returns a dict of the saved verdicts of the submissions of the handle with the given
+        ids. Ids that are not saved are left out."""
+        query = ('SELECT id, verdict '
+                 'FROM submission '
+                 'WHERE handle = ? AND id IN (SELECT value FROM json_each(?))')
+        return dict(self.conn.execute(query, (handle, json.dumps(list(ids)))).fetchall())
+
+    def get_sync_point(self, handle, since):
+        """Returns the id of the newest saved submission of the handle and the id of the oldest
+        saved submission whose verdict may still change, that is one still pending or made at
+        or after the timestamp `since`. Either may be None.
+        """
+        query = ('SELECT MAX(id) '
+                 'FROM submission '
+                 'WHERE handle = ?')
+        last_id, = self.conn.execute(query, (handle,)).fetchone()
+        query = ('SELECT MIN(id) '
+                 'FROM submission '
+                 'WHERE handle = ? AND (verdict IS NULL OR verdict = ? OR creation_time >= ?)')
+        unsettled_id, = self.conn.execute(query, (handle, 'TESTING', since)).fetchone()
+        return last_id, unsettled_id
+
+    @writes
+    def clear_submissions(self, handle=None):
+        if handle is None:
+            query = 'DELETE FROM submission'
+            self.conn.execute(query)
+        else:
+            query = 'DELETE FROM submission WHERE handle = ?'
+            self.conn.execute(query, (handle,))
+        self.conn.commit()
+
+    def close(self):
+        self.connection.close()
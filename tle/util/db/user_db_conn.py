@@ -6,15 +6,8 @@ from typing import List
 from disnake.ext import commands
 
 from tle.util import codeforces_api as cf
-
-from os import environ
-from firebase_admin import storage
-from tle import constants
-
-bucket = None
-STORAGE_BUCKET = str(environ.get('STORAGE_BUCKET'))
-if STORAGE_BUCKET!='None':
-    bucket = storage.bucket()
+from tle.util.db.backup import BackupService
+from tle.util.db.executor import AsyncDb, ThreadLocalConnection, writes
 
 class Gitgud(IntEnum):
     GOTGUD = 0
@@ -67,16 +60,18 @@ def namedtuple_factory(cursor, row):
 
 class UserDbConn:
     def __init__(self, dbfile):
-        self.conn = sqlite3.connect(dbfile)
-        self.conn.row_factory = namedtuple_factory
+        self.connection = ThreadLocalConnection(dbfile, row_factory=namedtuple_factory)
+        self.aio = AsyncDb(self)
         self.create_tables()
+        self.backup = BackupService(dbfile, 'tle.db')
     
-    # update the data in firebase
+    @property
+    def conn(self):
+        return self.connection.get()
+
+    # schedule an update of the data in firebase
     def update(self):
-        if bucket==None:
-            return
-        blob = bucket.blob('tle.db')
-        blob.upload_from_filename(constants.USER_DB_FILE_PATH)
+        self.backup.mark_dirty()
 
     def create_tables(self):
         self.conn.execute(
@@ -233,6 +228,7 @@ class UserDbConn:
         self.conn.row_factory = None
         return res
 
+    @writes
     def new_challenge(self, user_id, issue_time, prob, delta):
         query1 = '''
             INSERT INTO challenge
@@ -316,6 +312,7 @@ class UserDbConn:
         '''
         return self.conn.execute(query, (user_id,)).fetchall()
 
+    @writes
     def complete_challenge(self, user_id, challenge_id, finish_time, delta):
         query1 = f'''
             UPDATE challenge SET finish_time = ?, status = {Gitgud.GOTGUD}
@@ -338,6 +335,7 @@ class UserDbConn:
         self.update()
         return 1
 
+    @writes
     def skip_challenge(self, user_id, challenge_id, status):
         query1 = '''
             UPDATE user_challenge SET active_challenge_id = NULL, issue_time = NULL
@@ -358,6 +356,7 @@ class UserDbConn:
         self.update()
         return 1
 
+    @writes
     def cache_cf_user(self, user):
         query = ('INSERT OR REPLACE INTO cf_user_cache '
                  '(handle, first_name, last_name, country, city, organization, contribution, '
@@ -376,6 +375,7 @@ class UserDbConn:
         user = self.conn.execute(query, (handle,)).fetchone()
         return cf.User._make(user) if user else None
 
+    @writes
     def set_handle(self, user_id, guild_id, handle):
         query = ('SELECT user_id '
                  'FROM user_handle '
@@ -393,6 +393,7 @@ class UserDbConn:
         self.update()
         return res
 
+    @writes
     def set_account_id(self, user_id, guild_id, account_id, resource, handle):
         query = ('SELECT user_id '
                  'FROM clist_account_ids '
@@ -410,6 +411,7 @@ class UserDbConn:
         self.update()
         return res
 
+    @writes
     def set_inactive(self, guild_id_user_id_pairs):
         query = ('UPDATE user_handle '
                  'SET active = 0 '
@@ -470,6 +472,7 @@ class UserDbConn:
         res = self.conn.execute(query, (handle, guild_id)).fetchone()
         return int(res[0]) if res else None
 
+    @writes
     def remove_handle(self, user_id, guild_id):
         query = ('DELETE FROM user_handle '
                  'WHERE user_id = ? AND guild_id = ?')
@@ -484,6 +487,7 @@ class UserDbConn:
         self.update()
         return res1 or res2
 
+    @writes
     def remove_guild(self, guild_id):
         query = ('DELETE FROM user_handle '
                  'WHERE guild_id = ?')
@@ -520,6 +524,7 @@ class UserDbConn:
         res = self.conn.execute(query, (guild_id,)).fetchall()
         return [(int(t[0]), cf.User._make(t[1:])) for t in res]
 
+    @writes
     def set_guildtz(self, guild_id, timezone):
         query = '''
             INSERT OR REPLACE INTO guildtz (guild_id, timezone)
@@ -546,6 +551,7 @@ class UserDbConn:
         '''
         return self.conn.execute(query, (guild_id,)).fetchone()
 
+    @writes
     def set_reminder_settings(self, guild_id, channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns):
         query = '''
             INSERT OR REPLACE INTO reminder (guild_id, channel_id, role_id, before, website_allowed_patterns, website_disallowed_patterns)
@@ -555,6 +561,7 @@ class UserDbConn:
         self.conn.commit()
         self.update()
 
+    @writes
     def clear_reminder_settings(self, guild_id):
         query = '''DELETE FROM reminder WHERE guild_id = ?'''
         self.conn.execute(query, (guild_id,))
@@ -603,6 +610,7 @@ class UserDbConn:
         '''
         return self.conn.execute(query, (userid, userid)).fetchone()
 
+    @writes
     def create_duel(self, challenger, challengee, issue_time, prob, dtype):
         query = f'''
             INSERT INTO duel (challenger, challengee, issue_time, problem_name, contest_id, p_index, status, type) VALUES (?, ?, ?, ?, ?, ?, {Duel.PENDING}, ?)
@@ -612,6 +620,7 @@ class UserDbConn:
         self.update()
         return duelid
 
+    @writes
     def cancel_duel(self, duelid, status):
         query = f'''
             UPDATE duel SET status = ? WHERE id = ? AND status = {Duel.PENDING}
@@ -624,6 +633,7 @@ class UserDbConn:
         self.update()
         return rc
 
+    @writes
     def invalidate_duel(self, duelid):
         query = f'''
             UPDATE duel SET status = {Duel.INVALID} WHERE id = ? AND status = {Duel.ONGOING}
@@ -636,6 +646,7 @@ class UserDbConn:
         self.update()
         return rc
 
+    @writes
     def start_duel(self, duelid, start_time):
         query = f'''
             UPDATE duel SET start_time = ?, status = {Duel.ONGOING}
@@ -649,6 +660,7 @@ class UserDbConn:
         self.update()
         return rc
 
+    @writes
     def complete_duel(self, duelid, winner, finish_time, winner_id = -1, loser_id = -1, delta = 0, dtype = DuelType.OFFICIAL):
         query = f'''
             UPDATE duel SET status = {Duel.COMPLETE}, finish_time = ?, winner = ? WHERE id = ? AND status = {Duel.ONGOING}
@@ -666,6 +678,7 @@ class UserDbConn:
         self.update()
         return 1
 
+    @writes
     def update_duel_rating(self, userid, delta):
         query = '''
             UPDATE duelist SET rating = rating + ? WHERE user_id = ?
@@ -750,6 +763,7 @@ class UserDbConn:
         '''
         return self.conn.execute(query, (userid,)).fetchone()
 
+    @writes
     def register_duelist(self, userid):
         query = '''
             INSERT OR IGNORE INTO duelist (user_id, rating)
@@ -781,6 +795,7 @@ class UserDbConn:
         channel_id = self.conn.execute(query, (guild_id,)).fetchone()
         return int(channel_id[0]) if channel_id else None
 
+    @writes
     def set_rankup_channel(self, guild_id, channel_id):
         query = ('INSERT OR REPLACE INTO rankup '
                  '(guild_id, channel_id) '
@@ -789,6 +804,7 @@ class UserDbConn:
             self.conn.execute(query, (guild_id, channel_id))
         self.update()
 
+    @writes
     def clear_rankup_channel(self, guild_id):
         query = ('DELETE FROM rankup '
                  'WHERE guild_id = ?')
@@ -798,6 +814,7 @@ class UserDbConn:
         self.update()
         return res
 
+    @writes
     def update_status(self, guild_id: str, active_ids: list):
         placeholders = ', '.join(['?'] * len(active_ids))
         if not active_ids: return 0
@@ -832,6 +849,7 @@ class UserDbConn:
             return res
         return [handle for handle, in res]
 
+    @writes
     def add_to_list(self, list_name, resource, account_id, handle):
         query = ('INSERT OR REPLACE INTO list_handles '
                  '(list, resource, account_id, handle) '
@@ -842,6 +860,7 @@ class UserDbConn:
         self.update()
         return res
 
+    @writes
     def remove_from_list(self, list_name, resource, handle):
         query = ('DELETE FROM list_handles '
                  'WHERE list = ? AND resource = ? AND handle = ? ')
@@ -851,6 +870,7 @@ class UserDbConn:
         self.update()
         return res
 
+    @writes
     def delete_list(self, guild_id, list_name):
         query = ('DELETE FROM lists '
                  'WHERE guild_id = ? AND name = ?')
@@ -886,5 +906,5 @@ class UserDbConn:
         return account_id
     
     def close(self):
-        self.update()
-        self.conn.close()
\ No newline at end of file
+        self.backup.close()
+        self.connection.close()
\ No newline at end of file
@@ -22,6 +22,12 @@ class RatingChangesUpdate(Event):
         self.rating_changes = rating_changes
 
 
+class RanklistUpdate(Event):
+    """The cached ranklists of the contests were replaced or dropped."""
+    def __init__(self, *, contest_ids):
+        self.contest_ids = contest_ids
+
+
 # Event errors
 
 class EventError(commands.CommandError):
@@ -1,15 +1,20 @@
-import os
+import asyncio
 import io
+import multiprocessing
 import disnake
-import time
 import matplotlib.font_manager
 import matplotlib
 matplotlib.use('agg') # Explicitly set the backend to avoid issues
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 from tle import constants
-from matplotlib import pyplot as plt
-from matplotlib import rcParams
+from tle.util import plot_worker
+from tle.util.plot_worker import PlotSpec, StrWrap, apply_style
+from matplotlib.backend_bases import FigureCanvasBase
 from cycler import cycler
+from PIL import features as pil_features
 
 rating_color_cycler = cycler('color', ['#5d4dff',
                                        '#009ccc',
@@ -19,35 +24,43 @@ rating_color_cycler = cycler('color', ['#5d4dff',
 
 fontprop = matplotlib.font_manager.FontProperties(fname=constants.NOTO_SANS_CJK_REGULAR_FONT_PATH)
 
+_render_executor = None
+
+
+def image_format():
+    """Returns the format of plot images, as configured if it is supported."""
+    if (constants.PLOT_FORMAT == 'webp' and pil_features.check('webp') and
+            'webp' in FigureCanvasBase.get_supported_filetypes()):
+        return 'webp'
+    return 'png'
+
+
+def _get_render_executor():
+    global _render_executor
+    if _render_executor is None:
+        # Workers are spawned rather than forked, the bot has threads running. They only import
+        # plot_worker, which is what unpickling the tasks needs.
+        _render_executor = ProcessPoolExecutor(max_workers=constants.PLOT_WORKERS,
+                                               mp_context=multiprocessing.get_context('spawn'),
+                                               initializer=apply_style)
+    return _render_executor
+
+
+async def render(spec, image_format='png'):
+    """Draws the `PlotSpec` in a render worker process and returns the image as bytes."""
+    global _render_executor
+    loop = asyncio.get_running_loop()
+    executor = _get_render_executor()
+    try:
+        return await loop.run_in_executor(executor, plot_worker.render, spec, image_format)
+    except BrokenProcessPool:
+        # A worker died, start new ones for the next plots.
+        if _render_executor is executor:
+            _render_executor = None
+        raise
+
 
-# String wrapper to avoid the underscore behavior in legends
-#
-# In legends, matplotlib ignores labels that begin with _
-# https://matplotlib.org/api/pyplot_api.html#matplotlib.pyplot.legend
-# However, this check is only done for actual string objects.
-class StrWrap:
-    def __init__(self, s):
-        self.string = s
-    def __str__(self):
-        return self.string
-
-def get_current_figure_as_file():
-    filename = os.path.join(constants.TEMP_DIR, f'tempplot_{time.time()}.png')
-    plt.savefig(filename, facecolor=plt.gca().get_facecolor(), bbox_inches='tight', pad_inches=0.25)
-
-    with open(filename, 'rb') as file:
-        discord_file = disnake.File(io.BytesIO(file.read()), filename='plot.png')
-
-    os.remove(filename)
-    return discord_file
-
-def plot_rating_bg(ranks):
-    ymin, ymax = plt.gca().get_ylim()
-    bgcolor = plt.gca().get_facecolor()
-    for rank in ranks:
-        plt.axhspan(rank.low, rank.high, facecolor=rank.color_graph, alpha=0.8, edgecolor=bgcolor, linewidth=0.5)
-
-    locs, labels = plt.xticks()
-    for loc in locs:
-        plt.axvline(loc, color=bgcolor, linewidth=0.5)
-    plt.ylim(ymin, ymax)
+async def render_file(spec):
+    """Same as `render` in the configured image format, as a file to attach to a message."""
+    extension = image_format()
+    return disnake.File(io.BytesIO(await render(spec, extension)), filename=f'plot.{extension}')
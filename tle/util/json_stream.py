@@ -0,0 +1,121 @@
+"""Incremental decoding of JSON documents that arrive in chunks.
+
+Large arrays at known places in the document are decoded one element at a time and every element
+is converted as soon as it is complete, so only the converted elements are kept instead of the
+whole body and its decoded JSON values.
+"""
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader:
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    async def _fill(self):
+        """Read the next chunk, dropping what was consumed. Returns False at the end."""
+        if self.eof:
+            return False
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self.eof = True
+            text = self._utf8.decode(b'', final=True)
+        else:
+            text = self._utf8.decode(chunk)
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def _error(self, msg):
+        return json.JSONDecodeError(msg, self.buf, self.pos)
+
+    async def peek(self):
+        """Skip whitespace and return the next character, or '' at the end."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not await self._fill():
+                return ''
+
+    async def expect(self, chars):
+        """Consume the next character, which must be one of chars, and return it."""
+        char = await self.peek()
+        if not char or char not in chars:
+            raise self._error(f'Expecting one of {chars!r}')
+        self.pos += 1
+        return char
+
+    async def value(self):
+        """Decode the next value as a whole."""
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # A number at the end of the buffer may go on in the next chunk.
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Read until the pending text doubles so that a long value is not decoded again for
+            # every chunk.
+            target = 2 * (len(self.buf) - self.pos)
+            while len(self.buf) - self.pos < target and await self._fill():
+                pass
+
+
+async def decode(chunks, streamed=None):
+    """Decode the JSON document made of an async iterable of bytes chunks.
+
+    `streamed` maps paths of arrays in the document, given as tuples of object keys from the
+    root, to functions. The elements of these arrays are decoded one by one and replaced with
+    what the function returns for them.
+    """
+    streamed = streamed or {}
+    prefixes = {path[:i] for path in streamed for i in range(len(path))}
+    reader = _Reader(chunks)
+    value = await _parse(reader, (), streamed, prefixes)
+    if await reader.peek():
+        raise reader._error('Extra data')
+    return value
+
+
+async def _parse(reader, path, streamed, prefixes):
+    char = await reader.peek()
+    if path in streamed and char == '[':
+        convert = streamed[path]
+        reader.pos += 1
+        items = []
+        if await reader.peek() == ']':
+            reader.pos += 1
+            return items
+        while True:
+            items.append(convert(await reader.value()))
+            if await reader.expect(',]') == ']':
+                return items
+    if path in prefixes and char == '{':
+        reader.pos += 1
+        obj = {}
+        if await reader.peek() == '}':
+            reader.pos += 1
+            return obj
+        while True:
+            if await reader.peek() != '"':
+                raise reader._error('Expecting property name')
+            key = await reader.value()
+            await reader.expect(':')
+            obj[key] = await _parse(reader, path + (key,), streamed, prefixes)
+            if await reader.expect(',}') == '}':
+                return obj
+    return await reader.value()
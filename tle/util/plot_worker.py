@@ -0,0 +1,202 @@
+"""Drawing of plots in the render worker processes.
+
+The workers import only this module, so it must not import anything beyond what drawing needs.
+Everything a `PlotSpec` holds is unpickled in a worker, so specs must not refer to other modules
+of the bot either.
+"""
+
+import contextlib
+import functools
+import io
+
+import matplotlib
+matplotlib.use('agg') # Explicitly set the backend to avoid issues
+
+import seaborn as sns
+from tle import constants
+from matplotlib import dates as mdates
+from matplotlib import rcParams
+from matplotlib.figure import Figure
+from matplotlib.ticker import MultipleLocator
+
+
+# String wrapper to avoid the underscore behavior in legends
+#
+# In legends, matplotlib ignores labels that begin with _
+# https://matplotlib.org/api/pyplot_api.html#matplotlib.pyplot.legend
+# However, this check is only done for actual string objects.
+class StrWrap:
+    def __init__(self, s):
+        self.string = s
+    def __str__(self):
+        return self.string
+
+
+def apply_style():
+    """Sets up the matplotlib and seaborn style of the plots. Runs in the bot and in every render
+    worker."""
+    rcParams['figure.figsize'] = 7.0, 3.5
+    sns.set()
+    options = {
+        'axes.edgecolor': '#A0A0C5',
+        'axes.spines.top': False,
+        'axes.spines.right': False,
+    }
+    sns.set_style('darkgrid', options)
+
+
+class PlotSpec:
+    """Declarative description of a plot, which is drawn in a render worker process.
+
+    The methods of matplotlib `Axes` named in `_AXES_METHODS` can be called on a spec with the
+    same arguments, and are replayed in order on the axes of a new figure by the worker. The
+    methods defined here record steps that depend on what is drawn before them. All arguments
+    must be picklable.
+    """
+    _AXES_METHODS = frozenset({'annotate', 'bar', 'hist', 'legend', 'margins', 'plot', 'scatter',
+                               'set_prop_cycle', 'set_title', 'set_xlabel', 'set_xlim',
+                               'set_ylabel', 'set_ylim', 'tick_params', 'vlines'})
+
+    def __init__(self, *, figsize=None, axes_rc=None):
+        """`figsize` defaults to the size set by the style, and `axes_rc` overrides seaborn axes
+        style parameters for the axes."""
+        self.figsize = figsize
+        self.axes_rc = axes_rc
+        self.steps = []
+
+    def __getattr__(self, name):
+        if name not in PlotSpec._AXES_METHODS:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+        return functools.partial(self._add, name)
+
+    def _add(self, name, *args, **kwargs):
+        self.steps.append((name, args, kwargs))
+
+    def rating_bg(self, ranks):
+        """Colors the background with the bands of the ranks."""
+        self._add('rating_bg', [(rank.low, rank.high, rank.color_graph) for rank in ranks])
+
+    def autofmt_xdate(self):
+        self._add('autofmt_xdate')
+
+    def date_xaxis(self):
+        """Locates and formats the x ticks as dates, for when matplotlib cannot tell from the
+        data. It decides from the first list of a histogram, for instance."""
+        self._add('date_xaxis')
+
+    def round_xticks(self, multiple):
+        """Makes the spacing of the x ticks a multiple of the given number."""
+        self._add('round_xticks', multiple)
+
+    def clamp_ylim(self, low, high):
+        """Shrinks the y limits to lie within low and high."""
+        self._add('clamp_ylim', low, high)
+
+    def set_legend_zorder(self, zorder):
+        self._add('set_legend_zorder', zorder)
+
+    def remove_legend(self):
+        self._add('remove_legend')
+
+    def label_bars(self, **text_kwargs):
+        """Writes the height of every bar above it."""
+        self._add('label_bars', **text_kwargs)
+
+    def rotate_xticklabels(self, rotation, ha='center'):
+        self._add('rotate_xticklabels', rotation, ha)
+
+    def spine_colored_xticks(self, **tick_kwargs):
+        """Shows the x ticks in the color of the bottom spine."""
+        self._add('spine_colored_xticks', **tick_kwargs)
+
+    def seaborn(self, func_name, **kwargs):
+        """Calls the seaborn plotting function on the axes."""
+        self._add('seaborn', func_name, **kwargs)
+
+
+# The steps of `PlotSpec` which are not methods of `Axes`.
+
+def _rating_bg(fig, ax, bands):
+    ymin, ymax = ax.get_ylim()
+    bgcolor = ax.get_facecolor()
+    for low, high, color in bands:
+        ax.axhspan(low, high, facecolor=color, alpha=0.8, edgecolor=bgcolor, linewidth=0.5)
+
+    for loc in ax.get_xticks():
+        ax.axvline(loc, color=bgcolor, linewidth=0.5)
+    ax.set_ylim(ymin, ymax)
+
+
+def _date_xaxis(fig, ax):
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
+
+
+def _round_xticks(fig, ax, multiple):
+    ticks = ax.get_xticks()
+    base = ticks[1] - ticks[0]
+    ax.xaxis.set_major_locator(MultipleLocator(base=max(base // multiple * multiple, multiple)))
+
+
+def _clamp_ylim(fig, ax, low, high):
+    ymin, ymax = ax.get_ylim()
+    ax.set_ylim(max(ymin, low), min(ymax, high))
+
+
+def _label_bars(fig, ax, **text_kwargs):
+    for p in ax.patches:
+        x = p.get_x() + p.get_width() / 2
+        y = p.get_y() + p.get_height() + 0.5
+        ax.text(x, y, int(p.get_height()), **text_kwargs)
+
+
+def _rotate_xticklabels(fig, ax, rotation, ha):
+    for label in ax.get_xticklabels():
+        label.set_rotation(rotation)
+        label.set_horizontalalignment(ha)
+
+
+def _spine_colored_xticks(fig, ax, **tick_kwargs):
+    ax.tick_params(axis='x', color=ax.spines['bottom'].get_edgecolor(), **tick_kwargs)
+
+
+def _seaborn(fig, ax, func_name, **kwargs):
+    getattr(sns, func_name)(ax=ax, **kwargs)
+
+
+_STEPS = {
+    'rating_bg': _rating_bg,
+    'autofmt_xdate': lambda fig, ax: fig.autofmt_xdate(),
+    'date_xaxis': _date_xaxis,
+    'round_xticks': _round_xticks,
+    'clamp_ylim': _clamp_ylim,
+    'set_legend_zorder': lambda fig, ax, zorder: ax.get_legend().set_zorder(zorder),
+    'remove_legend': lambda fig, ax: ax.get_legend().remove(),
+    'label_bars': _label_bars,
+    'rotate_xticklabels': _rotate_xticklabels,
+    'spine_colored_xticks': _spine_colored_xticks,
+    'seaborn': _seaborn,
+}
+
+
+def render(spec, image_format):
+    """Draws the spec and returns it as an image in the given format."""
+    fig = Figure(figsize=spec.figsize)
+    style = sns.axes_style(rc=spec.axes_rc) if spec.axes_rc else contextlib.nullcontext()
+    with style:
+        ax = fig.add_subplot()
+    for name, args, kwargs in spec.steps:
+        if name in _STEPS:
+            _STEPS[name](fig, ax, *args, **kwargs)
+        else:
+            getattr(ax, name)(*args, **kwargs)
+    if image_format == 'webp':
+        pil_kwargs = {'lossless': True}
+    else:
+        pil_kwargs = {'compress_level': constants.PLOT_PNG_COMPRESSION}
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=image_format, dpi=constants.PLOT_DPI,
+                facecolor=ax.get_facecolor(), bbox_inches='tight', pad_inches=0.25,
+                pil_kwargs=pil_kwargs)
+    return buffer.getvalue()
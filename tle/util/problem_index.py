@@ -0,0 +1,103 @@
+from collections import defaultdict
+
+import numpy as np
+
+from tle.util import codeforces_common as cf_common
+
+
+def make_mask(ordinals):
+    """Returns the bitmask with the bits at the given ordinals set."""
+    ordinals = list(ordinals)
+    bits = np.zeros(max(ordinals, default=-1) + 1, dtype=bool)
+    bits[ordinals] = True
+    return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+
+def mask_ordinals(mask):
+    """Returns the ordinals of the bits set in a non-negative bitmask, in increasing order."""
+    if not mask:
+        return np.zeros(0, dtype=np.int64)
+    data = np.frombuffer(mask.to_bytes((mask.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(data, bitorder='little'))
+
+
+class ProblemIndex:
+    """Index over the problems of the problem cache for the recommendation commands.
+
+    A set of problems is a bitmask held in a Python int, where bit i stands for the problem with
+    ordinal i as assigned by the problem cache, so queries are a few bitwise operations. Ordinals
+    are stable, so masks built earlier, like the solved problems of a handle, stay valid when the
+    index is rebuilt. Problems whose contest is not known are left out.
+    """
+
+    def __init__(self, problems, contest_by_id, ordinal_by_name):
+        problems = [problem for problem in problems if problem.contestId in contest_by_id]
+        problems.sort(key=lambda problem: contest_by_id[problem.contestId].startTimeSeconds)
+        self.ordinal_by_name = ordinal_by_name
+        self.problem_by_ordinal = {}
+        # Position of every indexed problem when sorted by contest start time.
+        self.time_rank = np.zeros(len(ordinal_by_name), dtype=np.int64)
+
+        ordinals_by_rating = defaultdict(list)
+        ordinals_by_tag = defaultdict(list)
+        ordinals_by_contest = defaultdict(list)
+        nonstandard_ordinals = []
+        for rank, problem in enumerate(problems):
+            ordinal = ordinal_by_name[problem.name]
+            self.problem_by_ordinal[ordinal] = problem
+            self.time_rank[ordinal] = rank
+            ordinals_by_rating[problem.rating].append(ordinal)
+            for tag in problem.tags:
+                ordinals_by_tag[tag].append(ordinal)
+            ordinals_by_contest[problem.contestId].append(ordinal)
+            if (cf_common.is_nonstandard_contest(contest_by_id[problem.contestId]) or
+                    problem.tag_matches(['*special'])):
+                nonstandard_ordinals.append(ordinal)
+        self.all_mask = make_mask(self.problem_by_ordinal)
+        self.mask_by_rating = {rating: make_mask(ordinals)
+                               for rating, ordinals in ordinals_by_rating.items()}
+        self.mask_by_tag = {tag: make_mask(ordinals)
+                            for tag, ordinals in ordinals_by_tag.items()}
+        self.mask_by_contest = {contest_id: make_mask(ordinals)
+                                for contest_id, ordinals in ordinals_by_contest.items()}
+        self.nonstandard_mask = make_mask(nonstandard_ordinals)
+
+    def rating_mask(self, low, high=None):
+        """Problems rated between low and high inclusive, or exactly low if high is not given."""
+        if high is None:
+            high = low
+        mask = 0
+        for rating, rating_mask in self.mask_by_rating.items():
+            if low <= rating <= high:
+                mask |= rating_mask
+        return mask
+
+    def tags_mask(self, query_tags):
+        """Problems for which every query tag is a substring of some tag, like
+        `Problem.tag_matches`."""
+        mask = self.all_mask
+        for query_tag in query_tags:
+            query_mask = 0
+            for tag, tag_mask in self.mask_by_tag.items():
+                if query_tag in tag:
+                    query_mask |= tag_mask
+            mask &= query_mask
+        return mask
+
+    def names_mask(self, names):
+        """Problems with any of the given names."""
+        return make_mask(self.ordinal_by_name[name] for name in names
+                         if name in self.ordinal_by_name)
+
+    def contests_mask(self, contest_ids):
+        """Problems from any of the given contests."""
+        mask = 0
+        for contest_id in contest_ids:
+            mask |= self.mask_by_contest.get(contest_id, 0)
+        return mask
+
+    def problems_in(self, mask):
+        """Problems in the mask, oldest contest first."""
+        ordinals = mask_ordinals(mask & self.all_mask)
+        ordinals = ordinals[np.argsort(self.time_rank[ordinals], kind='stable')]
+        return [self.problem_by_ordinal[ordinal] for ordinal in ordinals.tolist()]
@@ -1,7 +1,40 @@
+import sys
+
+import numpy as np
 from disnake.ext import commands
 
+from tle.util import codeforces_api as cf
 from tle.util.ranklist.rating_calculator import CodeforcesRatingCalculator
-from tle.util.handledict import HandleDict
+
+# Stands for None in integer arrays of fields that are never negative.
+_NONE = -1
+
+
+def _id_key(id_):
+    # Handles are case insensitive, team ids are ints.
+    return id_.lower() if isinstance(id_, str) else id_
+
+
+def _optional(value):
+    return _NONE if value is None else value
+
+
+def _from_optional(value):
+    value = int(value)
+    return None if value == _NONE else value
+
+
+def _optional_array(values, dtype):
+    return np.array([_optional(value) for value in values], dtype=dtype)
+
+
+def _encode(values):
+    """Returns codes for the values, which take few distinct values, and the value of each
+    code."""
+    value_codes = {}
+    codes = np.array([value_codes.setdefault(value, len(value_codes)) for value in values],
+                     dtype=np.int8)
+    return codes, tuple(value_codes)
 
 
 class RanklistError(commands.CommandError):
@@ -28,25 +61,108 @@ class DeltasNotPresentError(RanklistError):
 
 
 class Ranklist:
+    """Standings of a contest with rating deltas.
+
+    The standings are kept column-wise: handles are interned, rank, points and penalty are NumPy
+    arrays, the problem results are matrices with one row per party, and the party fields are
+    arrays or, for the rarely set ones, dicts by row. `RanklistRow`s are only built when asked
+    for.
+    """
+
     def __init__(self, contest, problems, standings, fetch_time, *, is_rated):
         self.contest = contest
         self.problems = problems
-        self.standings = standings
         self.fetch_time = fetch_time
 
         self.is_rated = is_rated
 
-        self.standing_by_id = HandleDict()
-        for row in self.standings:
-            if row.party.ghost:
-                # Apparently ghosts don't have team ID.
-                id_ = row.party.teamName
-            else:
-                id_ = row.party.teamId or row.party.members[0].handle
-            self.standing_by_id[id_] = row
+        self._store_standings(standings)
 
         self.delta_by_handle = None
         self.deltas_status = None
+        self.calculator = None
+
+    def _store_standings(self, standings):
+        self._ids = []
+        # Lowercase id -> row, in standings order.
+        self._row_by_id = {}
+        # Member handles of the rows whose members are not just their id, like teams.
+        self._members_by_row = {}
+        self._team_name_by_row = {}
+        for i, row in enumerate(standings):
+            party = row.party
+            handles = tuple(sys.intern(member.handle) for member in party.members)
+            if party.ghost:
+                # Apparently ghosts don't have team ID.
+                id_ = party.teamName
+            else:
+                id_ = party.teamId or handles[0]
+            self._ids.append(id_)
+            self._row_by_id[_id_key(id_)] = i
+            if handles != (id_,):
+                self._members_by_row[i] = handles
+            if party.teamName is not None:
+                self._team_name_by_row[i] = party.teamName
+
+        parties = [row.party for row in standings]
+        self._party_contest_ids = _optional_array([party.contestId for party in parties],
+                                                  np.int32)
+        self._participant_types, self._participant_type_values = _encode(
+            [party.participantType for party in parties])
+        self._team_ids = _optional_array([party.teamId for party in parties], np.int32)
+        self._ghosts = np.array([bool(party.ghost) for party in parties], dtype=bool)
+        self._rooms = _optional_array([party.room for party in parties], np.int32)
+        self._start_times = _optional_array([party.startTimeSeconds for party in parties],
+                                            np.int64)
+
+        self._ranks = np.array([row.rank for row in standings], dtype=np.int32)
+        self._points = np.array([row.points for row in standings], dtype=np.float64)
+        self._penalties = np.array([row.penalty for row in standings], dtype=np.int64)
+
+        self._result_counts = np.array([len(row.problemResults) for row in standings],
+                                       dtype=np.int32)
+        shape = (len(standings), int(self._result_counts.max(initial=0)))
+        self._result_points = np.zeros(shape, dtype=np.float64)
+        self._result_penalties = np.full(shape, _NONE, dtype=np.int32)
+        self._result_rejected = np.zeros(shape, dtype=np.int32)
+        self._result_types = np.zeros(shape, dtype=np.int8)
+        self._result_times = np.full(shape, _NONE, dtype=np.int32)
+        result_type_codes = {}
+        for i, row in enumerate(standings):
+            for j, result in enumerate(row.problemResults):
+                self._result_points[i, j] = result.points
+                self._result_penalties[i, j] = _optional(result.penalty)
+                self._result_rejected[i, j] = result.rejectedAttemptCount
+                self._result_types[i, j] = result_type_codes.setdefault(result.type,
+                                                                        len(result_type_codes))
+                self._result_times[i, j] = _optional(result.bestSubmissionTimeSeconds)
+        self._result_type_values = tuple(result_type_codes)
+
+    def _make_row(self, i):
+        members = self._members_by_row.get(i, (self._ids[i],))
+        party = cf.Party(contestId=_from_optional(self._party_contest_ids[i]),
+                         members=[cf.Member(handle) for handle in members],
+                         participantType=self._participant_type_values[self._participant_types[i]],
+                         teamId=_from_optional(self._team_ids[i]),
+                         teamName=self._team_name_by_row.get(i),
+                         ghost=bool(self._ghosts[i]),
+                         room=_from_optional(self._rooms[i]),
+                         startTimeSeconds=_from_optional(self._start_times[i]))
+        problem_results = [
+            cf.ProblemResult(points=float(self._result_points[i, j]),
+                             penalty=_from_optional(self._result_penalties[i, j]),
+                             rejectedAttemptCount=int(self._result_rejected[i, j]),
+                             type=self._result_type_values[self._result_types[i, j]],
+                             bestSubmissionTimeSeconds=_from_optional(self._result_times[i, j]))
+            for j in range(self._result_counts[i])]
+        return cf.RanklistRow(party=party, rank=int(self._ranks[i]),
+                              points=float(self._points[i]), penalty=int(self._penalties[i]),
+                              problemResults=problem_results)
+
+    def _iter_ids(self):
+        """Yields the id and row of every party in standings order."""
+        for i in self._row_by_id.values():
+            yield self._ids[i], i
 
     def set_deltas(self, delta_by_handle):
         if not self.is_rated:
@@ -54,24 +170,53 @@ class Ranklist:
         self.delta_by_handle = delta_by_handle.copy()
         self.deltas_status = 'Final'
 
-    def predict(self, current_rating):
+    def predict(self, current_rating, previous=None):
+        """Predict rating changes. If `previous` is an earlier ranklist of the same contest, the
+        work done for its prediction is reused where possible."""
         if not self.is_rated:
             raise ContestNotRatedError(self.contest)
-        standings = [(id_, row.points, row.penalty, current_rating[id_])
-                     for id_, row in self.standing_by_id.items() if id_ in current_rating]
+        standings = [(id_, float(self._points[i]), int(self._penalties[i]), current_rating[id_])
+                     for id_, i in self._iter_ids() if id_ in current_rating]
         if standings:
-            self.delta_by_handle = CodeforcesRatingCalculator(standings).calculate_rating_changes()
+            previous_calculator = previous.calculator if previous is not None else None
+            self.calculator = CodeforcesRatingCalculator(standings, previous_calculator)
+            self.delta_by_handle = self.calculator.calculate_rating_changes()
+        self.deltas_status = 'Predicted'
+
+    def predict_virtual(self, current_rating, virtual_rating):
+        """Predict the delta of each virtual participant in `virtual_rating` as if they alone had
+        taken part with the contestants in `current_rating`.
+
+        The calculator for the contestants is built once and the delta of each virtual
+        participant is worked out from it.
+        """
+        if not self.is_rated:
+            raise ContestNotRatedError(self.contest)
+        standings = []
+        virtual_standings = []
+        for id_, i in self._iter_ids():
+            points, penalty = float(self._points[i]), int(self._penalties[i])
+            if id_ in virtual_rating:
+                virtual_standings.append((len(standings), id_, points, penalty,
+                                          virtual_rating[id_]))
+            elif id_ in current_rating:
+                standings.append((id_, points, penalty, current_rating[id_]))
+        calculator = CodeforcesRatingCalculator(standings)
+        self.delta_by_handle = {}
+        for index, id_, points, penalty, rating in virtual_standings:
+            self.delta_by_handle[id_] = calculator.delta_with_contestant(index, points, penalty,
+                                                                        rating)
         self.deltas_status = 'Predicted'
 
     def get_delta(self, handle):
         if not self.is_rated:
             raise ContestNotRatedError(self.contest)
-        if handle not in self.standing_by_id:
+        if _id_key(handle) not in self._row_by_id:
             raise HandleNotPresentError(self.contest, handle)
         return self.delta_by_handle.get(handle)
 
     def get_standing_row(self, handle):
         try:
-            return self.standing_by_id[handle]
+            return self._make_row(self._row_by_id[_id_key(handle)])
         except KeyError:
             raise HandleNotPresentError(self.contest, handle)
@@ -4,8 +4,6 @@ by Mike Mirzayanov (mirzayanovmr@gmail.com) at https://codeforces.com/contest/1/
 Updated to use the current rating formula.
 """
 
-from dataclasses import dataclass
-
 import numpy as np
 from numpy.fft import fft, ifft
 
@@ -14,37 +12,112 @@ def intdiv(x, y):
     return -(-x // y) if x < 0 else x // y
 
 
-@dataclass
-class Contestant:
-    party: str
-    points: float
-    penalty: int
-    rating: int
-    need_rating: int = 0
-    delta: int = 0
-    rank: float = 0.0
-    seed: float = 0.0
+def _intdiv_array(x, y):
+    """Elementwise `intdiv`, rounding towards zero."""
+    return np.where(x < 0, -(-x // y), x // y)
 
 
 class CodeforcesRatingCalculator:
-    def __init__(self, standings):
-        """Calculate Codeforces rating changes and seeds given contest and user information."""
-        self.contestants = [Contestant(handle, points, penalty, rating)
-                            for handle, points, penalty, rating in standings]
-        self._precalc_seed()
+    _GUESS_RADIUS = 16
+
+    def __init__(self, standings, previous=None):
+        """Calculate Codeforces rating changes and seeds given contest and user information.
+
+        All contestants are processed together as arrays. The results are identical to
+        processing them one at a time.
+
+        `previous` may be the calculator for an earlier snapshot of the same contest. Its seed
+        table is reused if the contestants' ratings are unchanged, and the performance rating
+        search starts from its results.
+        """
+        parties, points, penalties, ratings = zip(*standings) if standings else ((),) * 4
+        parties = list(parties)
+        ratings = np.array(ratings, dtype=np.int64)
+        seed = need_ratings = None
+        if previous is not None:
+            if np.array_equal(np.sort(ratings), np.sort(previous.ratings)):
+                self.elo_win_prob = previous.elo_win_prob
+                seed = previous.seed
+            need_rating_by_party = dict(zip(previous.parties, previous.need_ratings.tolist()))
+            need_ratings = np.array([need_rating_by_party.get(party, rating)
+                                     for party, rating in zip(parties, ratings.tolist())],
+                                    dtype=np.int64)
+        self._load(parties, np.array(points, dtype=float), np.array(penalties, dtype=np.int64),
+                   ratings, seed, need_ratings)
+
+    def _load(self, parties, points, penalties, ratings, seed=None, need_ratings=None):
+        self.parties = parties
+        self.points = points
+        self.penalties = penalties
+        self.ratings = ratings
+        # How much of the work was carried over from an earlier calculation.
+        self.seed_reused = seed is not None
+        self.search_reused_fraction = 0.0
+        if seed is None:
+            self._precalc_seed()
+        else:
+            self.seed = seed
         self._reassign_ranks()
-        self._process()
+        self._process(need_ratings)
         self._update_delta()
 
+    def delta_with_contestant(self, index, points, penalty, rating):
+        """Return the delta of one more contestant inserted at position `index` of the
+        standings, as if the calculator had been given the standings with them.
+
+        Nothing is computed again from scratch. The contestant's win probabilities are added to
+        the seed table, the contestants ranked at or behind them move down one rank, and the
+        performance ratings found here are only searched for again where they no longer fit.
+        """
+        n = len(self.ratings)
+        calc = object.__new__(CodeforcesRatingCalculator)
+        calc.elo_win_prob = self.elo_win_prob
+        calc.seed = self.seed + np.roll(self.elo_win_prob, rating)
+
+        # Ranks are the number of contestants with the same or a better result.
+        behind = ((self.points < points) |
+                  ((self.points == points) & (self.penalties >= penalty)))
+        ahead = ((self.points > points) |
+                 ((self.points == points) & (self.penalties <= penalty)))
+        ranks = self.ranks + behind
+        rank = np.array([int(ahead.sum()) + 1])
+
+        mid_ranks = np.power(ranks * calc.get_seed(self.ratings, self.ratings), 0.5)
+        need_ratings = calc._refit_ratings(mid_ranks, self.ratings, self.need_ratings)
+        me = np.array([rating])
+        need_rating = calc._rank_to_rating(np.power(rank * calc.get_seed(me, me), 0.5), me)
+        deltas = _intdiv_array(need_ratings - self.ratings, 2)
+        delta = int(_intdiv_array(need_rating - me, 2)[0])
+
+        total = n + 1
+        correction = intdiv(-(int(deltas.sum()) + delta), total) - 1
+        # The contestant's place in `order`, which is by decreasing rating and then by rank,
+        # with earlier standings first among ties.
+        first = ((rating > self.ratings) |
+                 ((rating == self.ratings) &
+                  ((points > self.points) |
+                   ((points == self.points) &
+                    ((penalty < self.penalties) |
+                     ((penalty == self.penalties) & (index <= np.arange(n))))))))
+        position = n - int(first.sum())
+        zero_sum_count = min(4 * round(total ** 0.5), total)
+        if position < zero_sum_count:
+            top_sum = int(deltas[self.order[:zero_sum_count - 1]].sum()) + delta
+        else:
+            top_sum = int(deltas[self.order[:zero_sum_count]].sum())
+        delta_sum = -(top_sum + correction * zero_sum_count)
+        return delta + correction + min(0, max(-10, intdiv(delta_sum, zero_sum_count)))
+
     def calculate_rating_changes(self):
         """Return a mapping between contestants and their corresponding delta."""
-        return {contestant.party: contestant.delta for contestant in self.contestants}
+        return {self.parties[i]: delta
+                for i, delta in zip(self.order.tolist(), self.deltas[self.order].tolist())}
 
-    def get_seed(self, rating, me=None):
-        """Get seed given a rating and user."""
+    def get_seed(self, rating, me_rating=None):
+        """Get seed given a rating and the rating of the user. Both may be arrays."""
         seed = self.seed[rating]
-        if me:
-            seed -= self.elo_win_prob[rating - me.rating]
+        if me_rating is not None:
+            seed = seed - self.elo_win_prob[rating - me_rating]
         return seed
 
     def _precalc_seed(self):
@@ -55,55 +128,92 @@ class CodeforcesRatingCalculator:
 
         # Compute the rating histogram.
         count = np.zeros(2 * MAX)
-        for a in self.contestants:
-            count[a.rating] += 1
+        np.add.at(count, self.ratings, 1)
 
         # Precompute the seed for all possible ratings using FFT.
         self.seed = 1 + ifft(fft(count) * fft(self.elo_win_prob)).real
 
     def _reassign_ranks(self):
         """Find the rank of each contestant."""
-        contestants = self.contestants
-        contestants.sort(key=lambda o: (-o.points, o.penalty))
-        points = penalty = rank = None
-        for i in reversed(range(len(contestants))):
-            if contestants[i].points != points or contestants[i].penalty != penalty:
-                rank = i + 1
-                points = contestants[i].points
-                penalty = contestants[i].penalty
-            contestants[i].rank = rank
-
-    def _process(self):
+        # Stable sort by (-points, penalty), same as sorting the contestants themselves.
+        by_rank = np.lexsort((self.penalties, -self.points))
+        points = self.points[by_rank]
+        penalties = self.penalties[by_rank]
+        n = len(by_rank)
+
+        # Tied contestants all get the position of the last one in the tie.
+        group_end = np.ones(n, dtype=bool)
+        group_end[:-1] = (points[1:] != points[:-1]) | (penalties[1:] != penalties[:-1])
+        end_positions = np.flatnonzero(group_end)
+        group_of = np.searchsorted(end_positions, np.arange(n))
+
+        self.ranks = np.empty(n, dtype=np.int64)
+        self.ranks[by_rank] = end_positions[group_of] + 1
+        self.by_rank = by_rank
+
+    def _process(self, need_ratings=None):
         """Process and assign approximate delta for each contestant."""
-        for a in self.contestants:
-            a.seed = self.get_seed(a.rating, a)
-            mid_rank = (a.rank * a.seed) ** 0.5
-            a.need_rating = self._rank_to_rating(mid_rank, a)
-            a.delta = intdiv(a.need_rating - a.rating, 2)
-
-    def _rank_to_rating(self, rank, me):
-        """Binary Search to find the performance rating for a given rank."""
-        left, right = 1, 8000
-        while right - left > 1:
+        self.seeds = self.get_seed(self.ratings, self.ratings)
+        # np.power rather than ** so that the result matches the scalar computation exactly.
+        mid_ranks = np.power(self.ranks * self.seeds, 0.5)
+        self.need_ratings = self._rank_to_rating(mid_ranks, self.ratings, need_ratings)
+        self.deltas = _intdiv_array(self.need_ratings - self.ratings, 2)
+
+    def _rank_to_rating(self, ranks, me_ratings, guesses=None):
+        """Binary Search to find the performance rating for a given rank.
+
+        All searches run in lockstep, searches that have converged are left untouched. If
+        `guesses` are given, a search starts from a narrow range around its guess if the answer
+        is known to lie within it.
+        """
+        left = np.ones(len(ranks), dtype=np.int64)
+        right = np.full(len(ranks), 8000, dtype=np.int64)
+        if guesses is not None:
+            near_left = np.clip(guesses - self._GUESS_RADIUS, 1, 8000)
+            near_right = np.clip(guesses + self._GUESS_RADIUS, 1, 8000)
+            valid = ((near_left == 1) | (self.get_seed(near_left, me_ratings) >= ranks)) & \
+                    ((near_right == 8000) | (self.get_seed(near_right, me_ratings) < ranks)) & \
+                    (near_left < near_right)
+            left = np.where(valid, near_left, left)
+            right = np.where(valid, near_right, right)
+            if len(ranks):
+                self.search_reused_fraction = float(valid.mean())
+        while True:
+            active = right - left > 1
+            if not active.any():
+                return left
             mid = (left + right) // 2
-            if self.get_seed(mid, me) < rank:
-                right = mid
-            else:
-                left = mid
-        return left
+            below = self.get_seed(mid, me_ratings) < ranks
+            right = np.where(active & below, mid, right)
+            left = np.where(active & ~below, mid, left)
+
+    def _refit_ratings(self, ranks, me_ratings, need_ratings):
+        """Same as `_rank_to_rating` given the performance ratings for slightly different seeds
+        or ranks. The searches only run again where the old rating is no longer the answer."""
+        seed_at = self.get_seed(need_ratings, me_ratings)
+        seed_above = self.get_seed(need_ratings + 1, me_ratings)
+        stale = ~(((need_ratings == 1) | (seed_at >= ranks)) &
+                  ((need_ratings + 1 == 8000) | (seed_above < ranks)))
+        if stale.any():
+            need_ratings = need_ratings.copy()
+            need_ratings[stale] = self._rank_to_rating(ranks[stale], me_ratings[stale],
+                                                       need_ratings[stale])
+        return need_ratings
 
     def _update_delta(self):
         """Update the delta of each contestant."""
-        contestants = self.contestants
-        n = len(contestants)
+        n = len(self.ratings)
+        if n == 0:
+            self.order = self.by_rank
+            return
 
-        contestants.sort(key=lambda o: -o.rating)
-        correction = intdiv(-sum(c.delta for c in contestants), n) - 1
-        for contestant in contestants:
-            contestant.delta += correction
+        # Stable sort of the rank order by decreasing rating.
+        order = self.by_rank[np.argsort(-self.ratings[self.by_rank], kind='stable')]
+        correction = intdiv(-int(self.deltas.sum()), n) - 1
+        self.deltas += correction
 
         zero_sum_count = min(4 * round(n ** 0.5), n)
-        delta_sum = -sum(contestants[i].delta for i in range(zero_sum_count))
+        delta_sum = -int(self.deltas[order[:zero_sum_count]].sum())
         correction = min(0, max(-10, intdiv(delta_sum, zero_sum_count)))
-        for contestant in contestants:
-            contestant.delta += correction
+        self.deltas += correction
+        self.order = order
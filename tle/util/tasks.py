@@ -4,6 +4,7 @@ import logging
 from disnake.ext import commands
 
 import tle.util.codeforces_common as cf_common
+from tle.util import codeforces_api as cf
 
 
 class TaskError(commands.CommandError):
@@ -148,6 +149,9 @@ class Task:
             await asyncio.sleep(0)  # To ensure cancellation if called from within the task itself.
 
     async def _task(self):
+        # API requests from periodic runs should not hold up requests from commands. Manual
+        # triggers run in the caller's context and keep its priority.
+        cf.set_request_priority(cf.RequestPriority.BACKGROUND)
         arg = None
         if self._waiter.run_first:
             arg = await self._waiter.wait(self.instance)